@@ -1,11 +1,17 @@
+import argparse
 import os
+import time
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
 
 def batch_finger_extraction(dataset_dir, api_url, output_json='finger_extraction_results.json'):
     results = []
     for filename in os.listdir(dataset_dir):
-        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
             file_path = os.path.join(dataset_dir, filename)
             with open(file_path, 'rb') as f:
                 files = {'image': (filename, f, 'image/jpeg')}
@@ -26,9 +32,198 @@ def batch_finger_extraction(dataset_dir, api_url, output_json='finger_extraction
         json.dump(results, f, indent=2)
     print(f"Results saved to {output_json}")
 
+def load_processed(output_jsonl):
+    """Return filenames already processed successfully in a previous run."""
+    processed = set()
+    if not os.path.exists(output_jsonl):
+        return processed
+    with open(output_jsonl) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written line from an interrupted run
+            if 'num_fingers' in record:
+                processed.add(record['filename'])
+    return processed
+
+def ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def make_session(concurrency):
+    """Shared keep-alive session sized for the number of in-flight requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def extract_one(session, api_url, dataset_dir, filename, timeout, max_retries):
+    file_path = os.path.join(dataset_dir, filename)
+    start = time.perf_counter()
+    record = {'filename': filename}
+    try:
+        # Inside the try, so an unreadable or vanished file becomes an exception record
+        with open(file_path, 'rb') as f:
+            image_bytes = f.read()
+        for attempt in range(max_retries + 1):
+            # Only the count is recorded, so skip the crops and overlays
+            response = session.post(
+                api_url,
+                params={'outputs': 'count'},
+                files={'image': (filename, image_bytes, 'image/jpeg')},
+                timeout=timeout
+            )
+            # The API answers 503 + Retry-After when its worker pool is saturated
+            if response.status_code != 503 or attempt == max_retries:
+                break
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+        if response.ok:
+            record['num_fingers'] = response.json()['num_fingers']
+        else:
+            record['error'] = response.status_code
+    except Exception as e:
+        record['exception'] = str(e)
+    record['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+def extract_one_job(session, api_url, dataset_dir, filename, timeout, max_retries, priority='low', poll_wait=30):
+    """Submit the image to the job API, then long-poll the job until it finishes."""
+    file_path = os.path.join(dataset_dir, filename)
+    start = time.perf_counter()
+    record = {'filename': filename}
+    try:
+        with open(file_path, 'rb') as f:
+            image_bytes = f.read()
+        for attempt in range(max_retries + 1):
+            response = session.post(
+                api_url,
+                params={'outputs': 'count', 'priority': priority},
+                files={'image': (filename, image_bytes, 'image/jpeg')},
+                timeout=timeout
+            )
+            # 503 + Retry-After when the job queue is full
+            if response.status_code != 503 or attempt == max_retries:
+                break
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+        if response.status_code != 202:
+            record['error'] = response.status_code
+        else:
+            job_url = requests.compat.urljoin(api_url, response.headers['Location'])
+            while True:
+                response = session.get(job_url, params={'wait': poll_wait}, timeout=poll_wait + timeout)
+                if not response.ok:
+                    record['error'] = response.status_code
+                    break
+                data = response.json()
+                status = data['job']['status']
+                if status == 'done':
+                    record['num_fingers'] = data['num_fingers']
+                    break
+                if status == 'failed':
+                    record['exception'] = data['job'].get('error', 'job failed')
+                    break
+    except Exception as e:
+        record['exception'] = str(e)
+    record['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+def batch_finger_extraction_concurrent(dataset_dir, api_url, output_jsonl='finger_extraction_results.jsonl',
+                                       concurrency=8, resume=True, timeout=60, max_retries=3, jobs=False,
+                                       priority='low'):
+    """
+    Run finger extraction over a dataset with several requests in flight.
+
+    Results are appended to a JSONL file as they arrive. With resume enabled,
+    files already processed successfully in that file are skipped, so an
+    interrupted run can simply be restarted. With jobs enabled, api_url is the
+    job submission endpoint and each image is queued with the given priority,
+    so interactive requests are served first.
+    """
+    filenames = sorted(f for f in os.listdir(dataset_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    processed = load_processed(output_jsonl) if resume else set()
+    pending = [f for f in filenames if f not in processed]
+    print(f"{len(filenames)} images, {len(filenames) - len(pending)} already processed, {len(pending)} to go")
+
+    session = make_session(concurrency)
+    latencies = []
+    failures = 0
+    start = time.perf_counter()
+    with open(output_jsonl, 'a' if resume else 'w') as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if out.tell() and not ends_with_newline(output_jsonl):
+            out.write('\n')  # Terminate a line cut off by an interrupted run
+        in_flight = set()
+        remaining = iter(pending)
+
+        def submit_next():
+            filename = next(remaining, None)
+            if filename is not None:
+                if jobs:
+                    future = executor.submit(
+                        extract_one_job, session, api_url, dataset_dir, filename, timeout, max_retries, priority
+                    )
+                else:
+                    future = executor.submit(
+                        extract_one, session, api_url, dataset_dir, filename, timeout, max_retries
+                    )
+                in_flight.add(future)
+
+        for _ in range(concurrency):
+            submit_next()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                record = future.result()
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                if 'num_fingers' in record:
+                    latencies.append(record['latency_ms'])
+                    print(f"{record['filename']}: {record['num_fingers']} fingers detected")
+                else:
+                    failures += 1
+                    print(f"{record['filename']}: {record.get('error') or record.get('exception')}")
+                submit_next()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    completed = len(latencies) + failures
+    print(f"\nProcessed {completed} images in {elapsed:.1f}s "
+          f"({completed / elapsed if elapsed else 0:.1f} images/sec), {failures} failed")
+    if latencies:
+        print(f"Latency ms: p50={percentile(latencies, 50):.0f} p95={percentile(latencies, 95):.0f} "
+              f"p99={percentile(latencies, 99):.0f} max={latencies[-1]:.0f}")
+    print(f"Results streamed to {output_jsonl}")
+
 if __name__ == "__main__":
-    # Update this path to the location of your 11K Hands dataset images
-    DATASET_DIR = 'datasets/11khands/images'
-    # Update this URL if your backend is running elsewhere
-    API_URL = 'http://localhost:8000/api/v1/fingerprint/extract-fingers'
-    batch_finger_extraction(DATASET_DIR, API_URL)
+    parser = argparse.ArgumentParser(description="Run finger extraction over a dataset of hand images")
+    # Update these defaults to the location of your 11K Hands dataset images and your backend
+    parser.add_argument('--dataset-dir', default='datasets/11khands/images')
+    parser.add_argument('--api-url', default='http://localhost:8000/api/v1/fingerprint/extract-fingers')
+    parser.add_argument('--output', default='finger_extraction_results.jsonl', help="JSONL file results are streamed to")
+    parser.add_argument('--concurrency', type=int, default=8, help="Maximum requests in flight")
+    parser.add_argument('--no-resume', action='store_true', help="Reprocess every image and overwrite the output")
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--serial', action='store_true', help="Original one-request-at-a-time mode writing a JSON file")
+    parser.add_argument('--jobs', action='store_true',
+                        help="Queue images through the job API instead of holding a request open per image")
+    parser.add_argument('--priority', default='low', choices=('high', 'normal', 'low'), help="Job priority with --jobs")
+    args = parser.parse_args()
+    if args.jobs and args.api_url == parser.get_default('api_url'):
+        args.api_url = 'http://localhost:8000/api/v1/jobs/extract-fingers'
+    if args.serial:
+        batch_finger_extraction(args.dataset_dir, args.api_url)
+    else:
+        batch_finger_extraction_concurrent(
+            args.dataset_dir, args.api_url, args.output,
+            concurrency=args.concurrency, resume=not args.no_resume, timeout=args.timeout,
+            jobs=args.jobs, priority=args.priority
+        )
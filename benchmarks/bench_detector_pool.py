@@ -0,0 +1,90 @@
+"""
+Compare concurrent /detect-faces throughput with one locked detector and
+with the per-thread detector pool.
+
+Each thread count runs the same number of FaceDetector.process_image calls
+on synthetic scenes, once through a single detector guarded by a lock (how
+every request was served before the pool) and once through a DetectorPool
+of that many detectors. Throughput only scales with threads on a machine
+with that many free cores.
+
+    python benchmarks/bench_detector_pool.py
+    python benchmarks/bench_detector_pool.py --threads 1,2,4,8 --requests 200 --max-side 1024
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from face_detection.core import FaceDetector  # noqa: E402
+from face_detection.core.detector_pool import DetectorPool  # noqa: E402
+from synthetic import synthetic_faces  # noqa: E402
+
+
+def run(fn, images, threads, requests):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(fn, images[:threads]))  # warm-up
+        start = time.perf_counter()
+        results = list(executor.map(fn, (images[i % len(images)] for i in range(requests))))
+    return requests / (time.perf_counter() - start), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", default="1,2,4,8", help="Comma-separated thread counts")
+    parser.add_argument("--requests", type=int, default=100, help="Detections per run")
+    parser.add_argument("--max-side", type=int, default=640, help="Detection copy longest side")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    # Parallelism comes from the request threads, not from OpenCV's own
+    cv2.setNumThreads(1)
+    images = [
+        cv2.imencode(".jpg", synthetic_faces(1280, 960, faces, seed=seed)[0])[1].tobytes()
+        for seed, faces in enumerate((1, 2, 4, 1))
+    ]
+    shared = FaceDetector(max_side=args.max_side)
+    lock = threading.Lock()
+
+    def locked(data):
+        with lock:
+            return shared.process_image(data, encode_base64=False)["face_locations"]
+
+    rows = []
+    for threads in (int(t) for t in args.threads.split(",")):
+        pool = DetectorPool(threads, max_side=args.max_side)
+        pool.fill()
+
+        def pooled(data):
+            with pool.acquire() as detector:
+                return detector.process_image(data, encode_base64=False)["face_locations"]
+
+        locked_rps, locked_faces = run(locked, images, threads, args.requests)
+        pooled_rps, pooled_faces = run(pooled, images, threads, args.requests)
+        rows.append({
+            "threads": threads,
+            "locked_rps": round(locked_rps, 1),
+            "pooled_rps": round(pooled_rps, 1),
+            "speedup": round(pooled_rps / locked_rps, 2),
+            "same_faces": locked_faces == pooled_faces,
+        })
+
+    print(f"{'threads':>7} {'locked req/s':>12} {'pooled req/s':>12} {'speedup':>7} {'same':>5}")
+    for r in rows:
+        print(f"{r['threads']:7d} {r['locked_rps']:12.1f} {r['pooled_rps']:12.1f} {r['speedup']:7.2f} "
+              f"{str(r['same_faces']):>5}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
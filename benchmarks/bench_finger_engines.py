@@ -0,0 +1,102 @@
+"""
+Compare the contour and connected-components finger segmentation engines.
+
+Runs both engines over synthetic hand silhouettes (optionally sprinkled
+with speckle noise, which produces hundreds of tiny contours) or over a
+directory of real hand photos, for a count-only request and for the full
+default artifact set. Reports latency and speedup, and checks that both
+engines return the same finger count, the same boxes in the same order and
+byte-identical image artifacts, including the finger line overlays.
+The exit status is 1 if they differ on any image.
+
+    python benchmarks/bench_finger_engines.py
+    python benchmarks/bench_finger_engines.py --images datasets/11khands/images --limit 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from face_detection.core.fingers import DEFAULT_OUTPUTS, ENGINES, extract_fingers  # noqa: E402
+from synthetic import synthetic_hand  # noqa: E402
+
+
+def load_images(images_dir, limit):
+    if not images_dir:
+        images = []
+        for width, height in ((800, 600), (1600, 1200), (4000, 3000)):
+            for noise in (0, 3000):
+                img, _ = synthetic_hand(width, height, noise)
+                images.append((f"hand_{width}x{height}_noise{noise}", img))
+        return images
+    images = []
+    for name in sorted(os.listdir(images_dir))[:limit]:
+        if name.lower().endswith((".jpg", ".jpeg", ".png")):
+            img = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+            if img is not None:
+                images.append((name, img))
+    return images
+
+
+def time_call(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of hand photos (default: synthetic silhouettes)")
+    parser.add_argument("--limit", type=int, default=20, help="Images taken from --images")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    rows = []
+    for name, img in load_images(args.images, args.limit):
+        data = cv2.imencode(".png", img)[1].tobytes()
+        for label, outputs in (("count", ("count", "boxes")), ("full", DEFAULT_OUTPUTS + ("boxes",))):
+            results = {}
+            for engine in ENGINES:
+                ms, result = time_call(lambda: extract_fingers(data, outputs, engine=engine), args.repeat)
+                results[engine] = (ms, result)
+            (contour_ms, contour), (cc_ms, cc) = results["contour"], results["components"]
+            rows.append({
+                "image": name,
+                "shape": list(img.shape[:2]),
+                "outputs": label,
+                "contour_ms": round(contour_ms, 2),
+                "components_ms": round(cc_ms, 2),
+                "speedup": round(contour_ms / cc_ms, 2) if cc_ms else None,
+                "contour_fingers": contour["num_fingers"],
+                "components_fingers": cc["num_fingers"],
+                "same_boxes": cc["boxes"] == contour["boxes"],
+                "same_keys": sorted(contour) == sorted(cc),
+                # Image artifacts (crops, line overlays, contour image) are compared byte for byte
+                "same_images": all(cc.get(key) == contour.get(key) for key in ("fingers", "finger_lines", "contour_img")),
+            })
+
+    print(f"{'image':32} {'outputs':7} {'contour ms':>10} {'cc ms':>8} {'speedup':>7} {'fingers':>9} {'boxes':>5} {'images':>6}")
+    for r in rows:
+        print(f"{r['image'][:32]:32} {r['outputs']:7} {r['contour_ms']:10.2f} {r['components_ms']:8.2f} "
+              f"{r['speedup']:7.2f} {r['contour_fingers']:4d}/{r['components_fingers']:<4d} {str(r['same_boxes']):>5} {str(r['same_images']):>6}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results saved to {args.output}")
+    mismatches = [r for r in rows if not (r["same_boxes"] and r["same_keys"] and r["same_images"])]
+    if mismatches:
+        print(f"Engines disagree on {len(mismatches)} of {len(rows)} runs")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
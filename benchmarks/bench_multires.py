@@ -0,0 +1,148 @@
+"""
+Latency/accuracy trade-off of detecting faces on a downscaled copy.
+
+Runs the Haar cascade (FaceDetector) and, when installed, the dlib HOG
+pipeline at several DETECT_MAX_SIDE values and compares the boxes with the
+full-resolution result (and the known ground truth for synthetic images).
+
+    python benchmarks/bench_multires.py
+    python benchmarks/bench_multires.py --images path/to/photos --max-sides 0,1600,1024,640
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from face_detection.core import FaceDetector  # noqa: E402
+
+
+def synthetic_photo(width=4000, height=3000, face_size=600, seed=0):
+    """Paste the test face pattern into a large textured canvas."""
+    return FaceDetector.create_test_scene(width, height, num_faces=1, face_size=face_size, seed=seed)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def match_rate(found, reference, threshold=0.5):
+    """Fraction of reference boxes matched by a found box with IoU >= threshold."""
+    if not reference:
+        return 1.0 if not found else 0.0
+    matched = sum(1 for r in reference if any(iou(r, f) >= threshold for f in found))
+    return matched / len(reference)
+
+
+def time_call(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def load_images(images_dir):
+    if not images_dir:
+        return [("synthetic_%d" % size,) + synthetic_photo(face_size=size) for size in (300, 600, 1200)]
+    images = []
+    for name in sorted(os.listdir(images_dir)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png")):
+            img = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+            if img is not None:
+                images.append((name, img, None))
+    return images
+
+
+def bench_haar(images, max_sides, repeat):
+    rows = []
+    for name, img, truth in images:
+        baseline = None
+        for max_side in max_sides:
+            detector = FaceDetector(max_side=max_side)
+            ms, (faces, scale) = time_call(lambda: detector.detect_faces_scaled(img), repeat)
+            if baseline is None:
+                baseline = faces
+            rows.append({
+                "pipeline": "haar",
+                "image": name,
+                "shape": list(img.shape[:2]),
+                "max_side": max_side,
+                "scale": round(scale, 4),
+                "latency_ms": round(ms, 2),
+                "faces": len(faces),
+                "agreement_with_full_res": match_rate(faces, baseline),
+                "ground_truth_recall": match_rate(faces, truth) if truth else None,
+            })
+    return rows
+
+
+def bench_dlib(images, max_sides, repeat):
+    try:
+        from face_detection.core.faces import detect_and_encode
+    except ImportError:
+        print("face_recognition not installed, skipping dlib pipeline")
+        return []
+    rows = []
+    for name, img, truth in images:
+        data = cv2.imencode(".jpg", img)[1].tobytes()
+        baseline = None
+        for max_side in max_sides:
+            ms, (locations, encodings, scale) = time_call(lambda: detect_and_encode(data, max_side), repeat)
+            boxes = [(left, top, right - left, bottom - top) for top, right, bottom, left in locations]
+            if baseline is None:
+                baseline = (boxes, encodings)
+            distance = None
+            if len(encodings) and len(baseline[1]):
+                distance = float(np.linalg.norm(np.asarray(encodings[0]) - np.asarray(baseline[1][0])))
+            rows.append({
+                "pipeline": "dlib",
+                "image": name,
+                "shape": list(img.shape[:2]),
+                "max_side": max_side,
+                "scale": round(scale, 4),
+                "latency_ms": round(ms, 2),
+                "faces": len(boxes),
+                "agreement_with_full_res": match_rate(boxes, baseline[0]),
+                "encoding_distance_to_full_res": distance,
+                "ground_truth_recall": match_rate(boxes, truth) if truth else None,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of real photos (default: synthetic 12MP images)")
+    parser.add_argument("--max-sides", default="0,2048,1024,640", help="Comma-separated DETECT_MAX_SIDE values; 0 = full resolution")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    max_sides = [int(v) for v in args.max_sides.split(",")]
+    images = load_images(args.images)
+    rows = bench_haar(images, max_sides, args.repeat) + bench_dlib(images, max_sides, args.repeat)
+
+    print(f"{'pipeline':8} {'image':24} {'max_side':>8} {'scale':>7} {'ms':>9} {'faces':>5} {'agree':>6} {'recall':>6}")
+    for r in rows:
+        recall = "-" if r["ground_truth_recall"] is None else f"{r['ground_truth_recall']:.2f}"
+        print(f"{r['pipeline']:8} {r['image'][:24]:24} {r['max_side']:8d} {r['scale']:7.3f} "
+              f"{r['latency_ms']:9.2f} {r['faces']:5d} {r['agreement_with_full_res']:6.2f} {recall:>6}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Benchmark suite for the detection, encoding and finger extraction hot paths.
+
+Every case runs on synthetic images generated offline (see synthetic.py) and
+is timed stage by stage (decode, detect, encode, JPEG/base64 output, ...).
+The suite reports per-stage latency, single-core throughput and peak Python
+memory (tracemalloc, which includes numpy buffers), and writes the results
+as JSON. Given a baseline file it exits with status 1 when a case got slower
+or used more memory than the baseline allows.
+
+    python benchmarks/bench_suite.py --output bench.json
+    python benchmarks/bench_suite.py --baseline bench.json --threshold 0.15
+    python benchmarks/bench_suite.py --filter fingers --quick
+"""
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from face_detection.core import FaceDetector  # noqa: E402
+from face_detection.core.config import settings  # noqa: E402
+from face_detection.core.fingers import ENGINES, DEFAULT_OUTPUTS, segment, render_artifacts  # noqa: E402
+from face_detection.core.ingest import decode_image, downscale_image  # noqa: E402
+from synthetic import FACE_SCENES, HAND_SCENES, synthetic_faces, synthetic_hand  # noqa: E402
+
+# Scenes larger than this many pixels are skipped with --quick
+QUICK_MAX_PIXELS = 2_500_000
+
+
+class StageTimer:
+    """Accumulates wall time per named stage over repeated runs."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._current: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[name] = self._current.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def commit(self) -> None:
+        """Close one run: record its stage times and their total."""
+        self._current["total"] = sum(self._current.values())
+        for name, ms in self._current.items():
+            self.samples.setdefault(name, []).append(ms)
+        self._current = {}
+
+    def discard(self) -> None:
+        self._current = {}
+
+
+def detector_case(data: bytes, detector: FaceDetector) -> Callable[[StageTimer], None]:
+    """FaceDetector.process_image, split into its stages."""
+    def run(t: StageTimer) -> None:
+        with t.stage("decode"):
+            img = decode_image(data)
+        with t.stage("detect"):
+            faces, _ = detector.detect_faces_scaled(img)
+        with t.stage("draw"):
+            result = detector.draw_faces(img, faces)
+        with t.stage("jpeg"):
+            buffer = cv2.imencode(".jpg", result)[1]
+        with t.stage("base64"):
+            base64.b64encode(buffer).decode("utf-8")
+    return run
+
+
+def dlib_case(data: bytes, max_side: int) -> Callable[[StageTimer], None]:
+    """The face_recognition path behind /api/v1/detect-face (core.faces.detect_and_encode)."""
+    import face_recognition
+    from face_detection.core.faces import DETECTION_MODEL, ENCODING_MODEL, NUM_JITTERS, UPSAMPLE_TIMES
+
+    def run(t: StageTimer) -> None:
+        with t.stage("decode"):
+            img = decode_image(data, rgb=True)
+        with t.stage("detect"):
+            small, scale = downscale_image(img, max_side)
+            locations = face_recognition.face_locations(small, UPSAMPLE_TIMES, DETECTION_MODEL)
+            if scale != 1.0:
+                locations = [tuple(round(v / scale) for v in loc) for loc in locations]
+        with t.stage("encode"):
+            encodings = face_recognition.face_encodings(img, locations, NUM_JITTERS, ENCODING_MODEL)
+        with t.stage("json"):
+            json.dumps([e.tolist() for e in encodings])
+    return run
+
+
+def fingers_case(data: bytes, engine: str) -> Callable[[StageTimer], None]:
+    """Finger extraction with the default artifacts, as /fingerprint/extract-fingers returns them."""
+    def run(t: StageTimer) -> None:
+        with t.stage("decode"):
+            img = decode_image(data)
+        with t.stage("segment"):
+            segmentation = segment(img, engine=engine)
+        with t.stage("jpeg"):
+            artifacts = render_artifacts(img, segmentation, DEFAULT_OUTPUTS)
+        with t.stage("base64"):
+            for value in artifacts.values():
+                for item in value if isinstance(value, list) else [value]:
+                    base64.b64encode(item).decode("utf-8")
+    return run
+
+
+def build_cases(quick: bool) -> Dict[str, Callable[[StageTimer], None]]:
+    cases = {}
+    detector = FaceDetector(max_side=settings.DETECT_MAX_SIDE)
+    have_dlib = importlib.util.find_spec("face_recognition") is not None
+    if not have_dlib:
+        print("face_recognition not installed, skipping dlib cases")
+    for width, height, num_faces in FACE_SCENES:
+        if quick and width * height > QUICK_MAX_PIXELS:
+            continue
+        img, _ = synthetic_faces(width, height, num_faces)
+        data = cv2.imencode(".jpg", img)[1].tobytes()
+        scene = f"{width}x{height}_{num_faces}faces"
+        cases[f"detector/{scene}"] = detector_case(data, detector)
+        if have_dlib:
+            cases[f"dlib/{scene}"] = dlib_case(data, settings.DETECT_MAX_SIDE)
+    for width, height, noise in HAND_SCENES:
+        if quick and width * height > QUICK_MAX_PIXELS:
+            continue
+        img, _ = synthetic_hand(width, height, noise)
+        data = cv2.imencode(".jpg", img)[1].tobytes()
+        for engine in ENGINES:
+            cases[f"fingers/{engine}/{width}x{height}_noise{noise}"] = fingers_case(data, engine)
+    return cases
+
+
+def run_case(fn: Callable[[StageTimer], None], repeat: int, warmup: int = 1) -> Dict:
+    timer = StageTimer()
+    for _ in range(warmup):
+        fn(timer)
+        timer.discard()
+    for _ in range(repeat):
+        fn(timer)
+        timer.commit()
+    # Separate run for memory, since tracing slows everything down
+    tracemalloc.start()
+    fn(timer)
+    timer.discard()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stages = {}
+    for name, values in timer.samples.items():
+        values = np.asarray(values)
+        stages[name] = {
+            "p50_ms": round(float(np.percentile(values, 50)), 3),
+            "mean_ms": round(float(values.mean()), 3),
+            "min_ms": round(float(values.min()), 3),
+        }
+    total = stages.pop("total")
+    return {
+        "stages": stages,
+        "total_ms": total,
+        "throughput_per_s": round(1000 / total["p50_ms"], 2) if total["p50_ms"] else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Return a message for every case slower or bigger than baseline * (1 + threshold)."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        checks = (
+            ("latency", result["total_ms"]["p50_ms"], base["total_ms"]["p50_ms"], "ms"),
+            ("memory", result["peak_memory_bytes"], base["peak_memory_bytes"], "bytes"),
+        )
+        for label, value, reference, unit in checks:
+            if reference and value > reference * (1 + threshold):
+                regressions.append(
+                    f"{name}: {label} {value:.1f} {unit} vs baseline {reference:.1f} {unit} "
+                    f"(+{(value / reference - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this string")
+    parser.add_argument("--quick", action="store_true", help=f"Skip scenes above {QUICK_MAX_PIXELS} pixels")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed relative slowdown/memory growth before failing (default 0.15)")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    cases = {name: fn for name, fn in build_cases(args.quick).items() if args.filter in name}
+    results = {}
+    print(f"{'case':44} {'p50 ms':>9} {'img/s':>8} {'peak MB':>8}  stages (p50 ms)")
+    for name, fn in cases.items():
+        r = results[name] = run_case(fn, args.repeat)
+        stages = " ".join(f"{stage}={s['p50_ms']:.1f}" for stage, s in r["stages"].items())
+        print(f"{name:44} {r['total_ms']['p50_ms']:9.2f} {r['throughput_per_s']:8.1f} "
+              f"{r['peak_memory_bytes'] / 1e6:8.1f}  {stages}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "repeat": args.repeat,
+            "detect_max_side": settings.DETECT_MAX_SIDE,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions above {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
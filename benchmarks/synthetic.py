@@ -0,0 +1,48 @@
+"""
+Synthetic benchmark inputs generated offline, so results do not depend on
+downloading datasets.
+"""
+import cv2
+import numpy as np
+
+from face_detection.core import FaceDetector
+
+# (width, height, faces) scenes used by the benchmark suite
+FACE_SCENES = [(640, 480, 1), (1920, 1080, 1), (1920, 1080, 4), (4000, 3000, 1), (4000, 3000, 4)]
+# (width, height, noise specks) hands used by the benchmark suite
+HAND_SCENES = [(800, 600, 0), (1600, 1200, 0), (1600, 1200, 3000), (4000, 3000, 0)]
+
+
+def synthetic_faces(width=640, height=480, num_faces=1, seed=0):
+    """Textured photo with ``num_faces`` test face patterns; returns (image, boxes)."""
+    return FaceDetector.create_test_scene(width, height, num_faces, seed=seed)
+
+
+def synthetic_hand(width=1600, height=1200, noise=0, seed=0):
+    """
+    Draw a dark hand silhouette on a light background.
+
+    Fingers are separated from the palm by a small gap so each one is its own
+    region; ``noise`` dark specks large enough to survive the segmentation
+    blur are scattered over the image, each becoming a small contour.
+
+    Returns:
+        Tuple of (BGR image, number of fingers drawn)
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 225, np.uint8)
+    s = min(width, height) / 1200
+    palm_center = (int(width * 0.5), int(height * 0.72))
+    cv2.ellipse(img, palm_center, (int(230 * s), int(190 * s)), 0, 0, 360, (70, 60, 55), -1)
+    finger_width = int(70 * s)
+    for i, (dx, length) in enumerate([(-190, 330), (-65, 400), (60, 420), (185, 360)]):
+        x = palm_center[0] + int(dx * s)
+        top = palm_center[1] - int(200 * s) - int(length * s)
+        cv2.rectangle(img, (x - finger_width // 2, top), (x + finger_width // 2, palm_center[1] - int(215 * s)), (70, 60, 55), -1)
+    # Thumb as a rotated ellipse to the side of the palm
+    cv2.ellipse(img, (palm_center[0] - int(330 * s), palm_center[1] - int(120 * s)),
+                (int(45 * s), int(150 * s)), -35, 0, 360, (70, 60, 55), -1)
+    for _ in range(noise):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(img, center, int(rng.integers(3, 9) * s) + 1, (40, 40, 40), -1)
+    return img, 6
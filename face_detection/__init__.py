@@ -2,4 +2,9 @@
 Face Detection API - A FastAPI-based face detection and analysis service.
 """
 
+import time
+
+# Reference point for the import and time-to-first-request timings in /ready
+STARTED_AT = time.perf_counter()
+
 __version__ = "0.1.0" 
\ No newline at end of file
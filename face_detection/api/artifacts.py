@@ -0,0 +1,195 @@
+import base64
+import json
+import secrets
+from typing import Any, Dict, List, Optional, Union
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from ..core.artifacts import artifact_store
+from ..core.config import settings
+from ..core.metrics import stage
+
+try:
+    import msgpack
+except ImportError:  # msgpack responses are optional
+    msgpack = None
+
+router = APIRouter()
+
+JSON = "application/json"
+MULTIPART = "multipart/mixed"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+Artifact = Union[bytes, List[bytes]]
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick the response media type from an Accept header.
+
+    JSON is used unless the client prefers multipart/mixed or msgpack (the
+    latter only when the msgpack package is installed).
+
+    Args:
+        accept: Value of the Accept header
+
+    Returns:
+        One of application/json, multipart/mixed or application/msgpack
+    """
+    if not accept:
+        return JSON
+    ranges = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranges.append((-q, position, media_type.lower()))
+    for _, _, media_type in sorted(ranges):
+        if media_type in (JSON, "application/*", "*/*"):
+            return JSON
+        if media_type == MULTIPART:
+            return MULTIPART
+        if media_type in MSGPACK_TYPES and msgpack is not None:
+            return MSGPACK_TYPES[0]
+    return JSON
+
+
+def _store_refs(request: Request, artifacts: Dict[str, Artifact], media_type: str) -> Dict[str, Any]:
+    def ref(data: bytes) -> Dict[str, str]:
+        artifact_id = artifact_store.put(data, media_type)
+        return {
+            "id": artifact_id,
+            "url": str(request.url_for("get_artifact", artifact_id=artifact_id).path),
+            "media_type": media_type,
+        }
+    return {
+        name: [ref(item) for item in value] if isinstance(value, list) else ref(value)
+        for name, value in artifacts.items()
+    }
+
+
+def _multipart(metadata: Dict[str, Any], artifacts: Dict[str, Artifact], media_type: str) -> Response:
+    parts = []
+    refs: Dict[str, Any] = {}
+    for name, value in artifacts.items():
+        items = value if isinstance(value, list) else [value]
+        cids = [f"{name}.{i}" for i in range(len(items))]
+        refs[name] = [f"cid:{cid}" for cid in cids] if isinstance(value, list) else f"cid:{cids[0]}"
+        parts += zip(cids, items)
+    boundary = secrets.token_hex(16)
+    head = json.dumps(jsonable_encoder({**metadata, **refs})).encode()
+    chunks = [
+        f"--{boundary}\r\nContent-Type: {JSON}\r\nContent-ID: <metadata>\r\n\r\n".encode(),
+        head,
+        b"\r\n",
+    ]
+    for cid, data in parts:
+        chunks += [
+            f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-ID: <{cid}>\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n".encode(),
+            data,
+            b"\r\n",
+        ]
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return Response(b"".join(chunks), media_type=f'{MULTIPART}; boundary="{boundary}"')
+
+
+def artifact_response(
+    request: Request,
+    metadata: Dict[str, Any],
+    artifacts: Dict[str, Artifact],
+    media_type: str = "image/jpeg",
+    mode: str = "inline",
+) -> Response:
+    """
+    Build a response carrying metadata plus binary image artifacts.
+
+    The format follows the Accept header:
+
+    - ``application/json`` (default): artifacts are base64 strings
+    - ``multipart/mixed``: a JSON metadata part followed by one raw part per
+      artifact; artifacts are referenced from the metadata as ``cid:<name>.<i>``
+    - ``application/msgpack``: one msgpack map with artifacts as raw bytes
+
+    With ``mode="ref"`` the artifacts are put in the artifact store instead
+    and replaced by ``{"id", "url", "media_type"}`` references that can be
+    fetched from ``GET /api/v1/artifacts/{id}`` until they expire.
+
+    Args:
+        request: Incoming request (for the Accept header and artifact URLs)
+        metadata: JSON-serializable fields of the response
+        artifacts: Artifact name to bytes or list of bytes
+        media_type: Content type of the artifacts
+        mode: "inline" or "ref"
+
+    Returns:
+        The negotiated response
+
+    Raises:
+        HTTPException: 400 for ``mode="ref"`` with several server workers,
+            since a reference could be fetched from a process that never stored it;
+            413 for ``mode="ref"`` when the artifacts do not fit in the store,
+            since they would be evicted before the client could fetch them
+    """
+    if mode == "ref" and settings.SERVER_WORKERS > 1:
+        raise HTTPException(
+            status_code=400,
+            detail="artifacts=ref is not available with several server workers; use inline artifacts",
+        )
+    if mode == "ref":
+        size = sum(
+            sum(len(item) for item in value) if isinstance(value, list) else len(value)
+            for value in artifacts.values()
+        )
+        if size > artifact_store.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Artifacts ({size} bytes) exceed the artifact store ({artifact_store.max_bytes} bytes); "
+                       "use inline artifacts",
+            )
+    with stage("serialize"):
+        return _build_response(request, metadata, artifacts, media_type, mode)
+
+
+def _build_response(request: Request, metadata: Dict[str, Any], artifacts: Dict[str, Artifact],
+                    media_type: str, mode: str) -> Response:
+    response_type = negotiate(request.headers.get("accept"))
+    if mode == "ref":
+        body = jsonable_encoder({**metadata, **_store_refs(request, artifacts, media_type)})
+        if response_type == MSGPACK_TYPES[0]:
+            return Response(msgpack.packb(body), media_type=response_type)
+        return JSONResponse(body)
+    if response_type == MULTIPART:
+        return _multipart(metadata, artifacts, media_type)
+    if response_type == MSGPACK_TYPES[0]:
+        return Response(msgpack.packb({**jsonable_encoder(metadata), **artifacts}), media_type=response_type)
+    encoded = {
+        name: [base64.b64encode(item).decode('utf-8') for item in value] if isinstance(value, list)
+        else base64.b64encode(value).decode('utf-8')
+        for name, value in artifacts.items()
+    }
+    return JSONResponse(jsonable_encoder({**metadata, **encoded}))
+
+
+@router.get("/artifacts/stats")
+def artifact_stats() -> Dict:
+    """Artifact store size and hit/miss counters"""
+    return artifact_store.stats()
+
+
+@router.get("/artifacts/{artifact_id}", name="get_artifact")
+def get_artifact(artifact_id: str) -> Response:
+    """Download an artifact returned by reference"""
+    entry = artifact_store.get(artifact_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+    data, media_type = entry
+    return Response(data, media_type=media_type, headers={"Cache-Control": f"private, max-age={artifact_store.ttl}, immutable"})
@@ -0,0 +1,171 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+import asyncio
+import time
+import cv2
+from typing import Optional
+from ..core import FaceDetector
+from ..core.config import settings
+from ..core.detector_pool import DetectorPool
+from ..core.ingest import content_key, read_upload, ImageTooLargeError
+from ..core.metrics import stage
+from ..core.singleflight import SingleFlight
+from ..core.tracking import FaceTracker, tracking_frames, tracking_streams
+from .artifacts import artifact_response
+
+router = APIRouter()
+
+# A Haar cascade is not safe to share between threads, so each thread borrows its own detector
+detector_pool = DetectorPool(
+    settings.DETECT_POOL_SIZE,
+    max_side=settings.DETECT_MAX_SIDE,
+    scale_factor=settings.DETECT_SCALE_FACTOR,
+    min_neighbors=settings.DETECT_MIN_NEIGHBORS,
+    min_size=settings.DETECT_MIN_SIZE,
+)
+
+# Identical uploads in flight at the same time share one detection
+detect_flight = SingleFlight("detect_faces")
+
+ARTIFACT_MODES = "^(inline|ref)$"
+
+def detection_response(request: Request, result: dict, artifacts: str) -> Response:
+    metadata = {key: value for key, value in result.items() if key != "processed_image"}
+    return artifact_response(request, metadata, {"processed_image": result["processed_image"]}, mode=artifacts)
+
+def process_image_pooled(image_data: bytes) -> dict:
+    with detector_pool.acquire() as detector:
+        return detector.process_image(image_data, encode_base64=False)
+
+@router.post("/detect-faces")
+async def detect_faces(
+    request: Request,
+    file: UploadFile = File(...),
+    artifacts: str = Query("inline", pattern=ARTIFACT_MODES, description="inline, or ref to return an artifact id"),
+) -> Response:
+    """
+    Detect faces in an uploaded image.
+    
+    Args:
+        file: Image file to process
+        artifacts: "inline" or "ref" to return the processed image as an artifact id
+        
+    Returns:
+        Detection results; the format follows the Accept header
+    """
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    try:
+        image_data = await read_upload(file)
+        # Off the event loop; concurrent identical uploads share the result
+        key = content_key(image_data, max_side=detector_pool.max_side)
+        with stage("detect_faces"):
+            result = await detect_flight.do(key, lambda: run_in_threadpool(process_image_pooled, image_data))
+        return detection_response(request, result, artifacts)
+    except (ImageTooLargeError, HTTPException):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/test")
+async def test(
+    request: Request,
+    artifacts: str = Query("inline", pattern=ARTIFACT_MODES),
+) -> Response:
+    """
+    Test endpoint that creates and processes a test face pattern.
+    
+    Returns:
+        Test detection results; the format follows the Accept header
+    """
+    try:
+        test_image = FaceDetector.create_test_face()
+        _, buffer = cv2.imencode('.jpg', test_image)
+        image_data = buffer.tobytes()
+        result = await run_in_threadpool(process_image_pooled, image_data)
+        return detection_response(request, result, artifacts)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def receive_frames(websocket: WebSocket, mailbox: "asyncio.Queue[Optional[bytes]]") -> Optional[int]:
+    """
+    Keep only the newest frame waiting; older ones are dropped, never queued.
+
+    Returns:
+        Close code to send, or None if the client went away
+    """
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return None
+            frame = message.get("bytes")
+            if frame is None:
+                await websocket.send_json({"error": "Frames must be sent as binary messages"})
+                continue
+            if len(frame) > settings.MAX_FILE_SIZE:
+                return 1009
+            if mailbox.full():
+                mailbox.get_nowait()
+                tracking_frames.inc("dropped")
+            mailbox.put_nowait(frame)
+    finally:
+        # Wake the processing loop, discarding a frame it has not started
+        if mailbox.full():
+            mailbox.get_nowait()
+        mailbox.put_nowait(None)
+
+@router.websocket("/ws/track-faces")
+async def track_faces(
+    websocket: WebSocket,
+    detect_every: int = Query(settings.TRACK_DETECT_EVERY, ge=1, le=300),
+) -> None:
+    """
+    Track faces over a stream of camera frames.
+    
+    Each binary message is one encoded frame (JPEG, PNG, ...). Every processed
+    frame gets a JSON reply with the face boxes and their track ids; frames
+    arriving while one is processed replace each other, so a slow stream
+    skips frames instead of falling behind.
+    
+    Args:
+        detect_every: Run a full detection every this many frames
+    """
+    await websocket.accept()
+    tracker = FaceTracker(
+        detector_pool, detect_every, settings.TRACK_MAX_SIDE, settings.TRACK_ROI_MARGIN, settings.TRACK_MIN_SCORE
+    )
+    mailbox: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=1)
+    receiver = asyncio.ensure_future(receive_frames(websocket, mailbox))
+    tracking_streams.inc()
+    sequence = 0
+    try:
+        while True:
+            frame = await mailbox.get()
+            if frame is None:
+                close_code = await receiver
+                if close_code is not None:
+                    await websocket.close(code=close_code, reason="Frame too large")
+                break
+            start = time.perf_counter()
+            try:
+                result = await run_in_threadpool(tracker.update, frame)
+            except ValueError as e:
+                tracking_frames.inc("invalid")
+                await websocket.send_json({"frame": sequence, "error": str(e)})
+            else:
+                await websocket.send_json({
+                    "frame": sequence,
+                    **result,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+                })
+            sequence += 1
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tracking_streams.dec()
+        receiver.cancel()
@@ -1,62 +1,52 @@
-import cv2
-import numpy as np
-import tempfile
-import os
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+from typing import List, Optional
 from PIL import Image
+from ..core.config import settings
+from ..core.executor import process_pool, PoolSaturatedError
+from ..core.ingest import content_key, read_upload
+from ..core.metrics import stage
+from ..core.singleflight import SingleFlight
+from ..core.fingers import extract_fingers, parse_outputs, IMAGE_FORMATS, MIN_CONTOUR_AREA
+from .artifacts import artifact_response
 
 router = APIRouter()
 
-def extract_finger_regions_and_lines(image_bytes: bytes, min_contour_area=1500):
-    # Read image from bytes
-    npimg = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (7, 7), 0)
-    _, thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    finger_imgs = []
-    finger_line_imgs = []
-    contour_draw = img.copy()
-    cv2.drawContours(contour_draw, contours, -1, (0, 255, 0), 2)
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        if area > min_contour_area:
-            x, y, w, h = cv2.boundingRect(cnt)
-            finger_crop = img[y:y+h, x:x+w]
-            # Try to detect fingerprint-like lines using edge detection
-            finger_gray = cv2.cvtColor(finger_crop, cv2.COLOR_BGR2GRAY)
-            finger_blur = cv2.GaussianBlur(finger_gray, (3, 3), 0)
-            edges = cv2.Canny(finger_blur, 50, 150)
-            # Overlay detected edges in red on the finger crop
-            finger_lines = cv2.cvtColor(finger_gray, cv2.COLOR_GRAY2BGR)
-            finger_lines[edges > 0] = [0, 0, 255]
-            _, buf1 = cv2.imencode('.jpg', finger_crop)
-            _, buf2 = cv2.imencode('.jpg', finger_lines)
-            finger_imgs.append(buf1.tobytes())
-            finger_line_imgs.append(buf2.tobytes())
-    # Also return the overall contour image
-    _, contour_buf = cv2.imencode('.jpg', contour_draw)
-    return finger_imgs, finger_line_imgs, contour_buf.tobytes()
+# Identical uploads with the same options in flight at the same time share one extraction
+fingers_flight = SingleFlight("extract_fingers")
 
 @router.post("/fingerprint/extract-fingers")
-async def extract_fingers_api(image: UploadFile = File(...)):
+async def extract_fingers_api(
+    request: Request,
+    image: UploadFile = File(...),
+    outputs: Optional[str] = Query(None, description="Comma-separated subset of count,boxes,crops,lines,contour (default: count,crops,lines,contour)"),
+    image_format: str = Query("jpeg", alias="format", description="Encoding of image artifacts: jpeg, png or webp"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="JPEG/WebP quality"),
+    artifacts: str = Query("inline", pattern="^(inline|ref)$", description="inline, or ref to return artifact ids"),
+) -> Response:
     if not image.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
-    image_bytes = await image.read()
     try:
-        fingers, finger_lines, contour_img = extract_finger_regions_and_lines(image_bytes)
-        import base64
-        fingers_b64 = [base64.b64encode(f).decode('utf-8') for f in fingers]
-        finger_lines_b64 = [base64.b64encode(f).decode('utf-8') for f in finger_lines]
-        contour_b64 = base64.b64encode(contour_img).decode('utf-8')
-        return {
-            "num_fingers": len(fingers_b64),
-            "fingers": fingers_b64,
-            "finger_lines": finger_lines_b64,
-            "contour_img": contour_b64
-        }
+        selected = parse_outputs(outputs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMAGE_FORMATS)}")
+    image_bytes = await read_upload(image)
+    try:
+        flight_key = content_key(
+            image_bytes, outputs=",".join(sorted(selected)), min_contour_area=MIN_CONTOUR_AREA,
+            format=image_format, quality=quality, engine=settings.FINGER_ENGINE
+        )
+        with stage("extract_fingers"):
+            result = await fingers_flight.do(flight_key, lambda: process_pool.run(
+                extract_fingers, image_bytes, selected, MIN_CONTOUR_AREA, image_format, quality,
+                settings.FINGER_ENGINE
+            ))
+        images = {key: result[key] for key in ("fingers", "finger_lines", "contour_img") if key in result}
+        metadata = {key: value for key, value in result.items() if key not in images}
+        return artifact_response(request, metadata, images, media_type=f"image/{image_format}", mode=artifacts)
+    except (PoolSaturatedError, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting fingers: {str(e)}")
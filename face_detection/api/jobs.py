@@ -0,0 +1,148 @@
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+
+from ..core import faces
+from ..core.config import settings
+from ..core.executor import process_pool
+from ..core.fingers import extract_fingers, parse_outputs, IMAGE_FORMATS, MIN_CONTOUR_AREA
+from ..core.ingest import read_upload
+from ..core.jobs import job_queue, job_runner, JobFailedError, JobResult, QueueFullError, PRIORITIES
+from .artifacts import artifact_response
+
+router = APIRouter()
+
+PRIORITY_PATTERN = f"^({'|'.join(PRIORITIES)})$"
+FINGER_ARTIFACTS = ("fingers", "finger_lines", "contour_img")
+
+
+async def run_extract_fingers(params: Dict[str, Any], inputs: Dict[str, bytes]) -> JobResult:
+    result = await process_pool.run(
+        extract_fingers, inputs["image"], tuple(params["outputs"]), MIN_CONTOUR_AREA, params["format"],
+        params["quality"], settings.FINGER_ENGINE
+    )
+    images = {key: result[key] for key in FINGER_ARTIFACTS if key in result}
+    metadata = {key: value for key, value in result.items() if key not in images}
+    return metadata, images, f"image/{params['format']}"
+
+
+async def run_verify_faces(params: Dict[str, Any], inputs: Dict[str, bytes]) -> JobResult:
+    try:
+        result = await faces.verify_faces(inputs["image1"], inputs["image2"])
+    except faces.FaceNotFoundError as e:
+        raise JobFailedError(str(e))
+    return result, {}, "application/octet-stream"
+
+
+job_runner.register("extract_fingers", run_extract_fingers)
+job_runner.register("verify_faces", run_verify_faces)
+
+
+@router.on_event("startup")
+def start_job_runner() -> None:
+    job_runner.start()
+
+
+@router.on_event("shutdown")
+async def stop_job_runner() -> None:
+    # Jobs interrupted here go back to the queue
+    await job_runner.stop()
+    job_queue.close()
+
+
+async def submit(request: Request, kind: str, params: Dict[str, Any], inputs: Dict[str, bytes], priority: str) -> JSONResponse:
+    try:
+        job_id = await job_runner.submit(kind, params, inputs, PRIORITIES[priority])
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    url = str(request.url_for("get_job", job_id=job_id).path)
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "priority": priority, "url": url},
+        headers={"Location": url},
+    )
+
+
+@router.post("/jobs/extract-fingers", status_code=202)
+async def submit_extract_fingers(
+    request: Request,
+    image: UploadFile = File(...),
+    outputs: Optional[str] = Query(None, description="Comma-separated subset of count,boxes,crops,lines,contour"),
+    image_format: str = Query("jpeg", alias="format", description="Encoding of image artifacts: jpeg, png or webp"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="JPEG/WebP quality"),
+    priority: str = Query("normal", pattern=PRIORITY_PATTERN, description="high, normal or low"),
+) -> JSONResponse:
+    """
+    Queue finger extraction; the result is fetched from GET /api/v1/jobs/{job_id}.
+    """
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    try:
+        selected = parse_outputs(outputs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMAGE_FORMATS)}")
+    image_bytes = await read_upload(image)
+    params = {"outputs": list(selected), "format": image_format, "quality": quality}
+    return await submit(request, "extract_fingers", params, {"image": image_bytes}, priority)
+
+
+@router.post("/jobs/verify-faces", status_code=202)
+async def submit_verify_faces(
+    request: Request,
+    image1: UploadFile = File(...),
+    image2: UploadFile = File(...),
+    priority: str = Query("normal", pattern=PRIORITY_PATTERN, description="high, normal or low"),
+) -> JSONResponse:
+    """
+    Queue a face verification; the result is fetched from GET /api/v1/jobs/{job_id}.
+    """
+    for image in (image1, image2):
+        if not image.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+    inputs = {"image1": await read_upload(image1), "image2": await read_upload(image2)}
+    return await submit(request, "verify_faces", {}, inputs, priority)
+
+
+@router.get("/jobs/stats")
+def job_stats() -> Dict:
+    """Queue depth by status and age of the oldest queued job"""
+    return job_queue.stats()
+
+
+@router.get("/jobs/{job_id}", name="get_job")
+async def get_job(
+    request: Request,
+    job_id: str,
+    wait: float = Query(0.0, ge=0, le=settings.JOB_MAX_WAIT, description="Seconds to wait for the job to finish"),
+    artifacts: str = Query("inline", pattern="^(inline|ref)$", description="inline, or ref to return artifact ids"),
+) -> Response:
+    """
+    Poll a job, or long-poll with ``wait``.
+
+    Until the job finishes the response only has the ``job`` status. Once
+    done it also carries the result in the same shape as the synchronous
+    endpoint, negotiated through the Accept header like it.
+    """
+    job = await job_runner.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    result = job.pop("result", None)
+    if job["status"] != "done":
+        return JSONResponse({"job": job})
+    metadata, images, media_type = await run_in_threadpool(job_queue.result, {**job, "result": result})
+    return artifact_response(request, {"job": job, **metadata}, images, media_type=media_type, mode=artifacts)
+
+
+@router.delete("/jobs/{job_id}")
+def delete_job(job_id: str) -> Dict:
+    """Cancel a queued job or discard a finished one"""
+    if not job_queue.delete(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found or expired")
+        raise HTTPException(status_code=409, detail="Job is running")
+    return {"deleted": job_id}
@@ -1,10 +1,21 @@
-import tempfile
+import asyncio
 import os
-import requests
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Dict
+import uuid
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
 from PIL import Image
 from dotenv import load_dotenv
+from ..core.config import settings
+from ..core.facepp import FaceppClient
+from ..core.ingest import read_upload
+from ..core.metrics import metrics, stage
+from ..core.face_index import face_index
+from ..core.faces import get_faces, FaceNotFoundError
+from ..core.preflight import assess_image, record_preflight, PREFLIGHT_MODES, RETAKE_MESSAGES
+from ..core.session_store import create_session_store
+from ..core.verification import create_verification_backend
+from .detection import detector_pool
 
 router = APIRouter()
 
@@ -12,134 +23,276 @@ router = APIRouter()
 load_dotenv()
 FACEPP_API_KEY = os.getenv("FACEPP_API_KEY")
 FACEPP_API_SECRET = os.getenv("FACEPP_API_SECRET")
-FACEPP_DETECT_URL = "https://api-us.faceplusplus.com/facepp/v3/detect"
-FACEPP_COMPARE_URL = "https://api-us.faceplusplus.com/facepp/v3/compare"
 
-if not FACEPP_API_KEY or not FACEPP_API_SECRET:
-    raise RuntimeError("Face++ API credentials not set in environment variables!")
+# Shared Face++ client (pooled connections, adaptive concurrency limiting)
+facepp_client = FaceppClient(
+    FACEPP_API_KEY,
+    FACEPP_API_SECRET,
+    max_connections=settings.FACEPP_MAX_CONNECTIONS,
+    timeout=settings.FACEPP_TIMEOUT,
+    initial_concurrency=settings.FACEPP_INITIAL_CONCURRENCY,
+    max_concurrency=settings.FACEPP_MAX_CONCURRENCY,
+    max_queue=settings.FACEPP_MAX_QUEUE,
+    max_retries=settings.FACEPP_MAX_RETRIES,
+)
 
-# In-memory store for KYC sessions (for demo)
-kyc_sessions = {}
+metrics.gauge(
+    "facepp_queue_depth", "Face++ requests waiting for a concurrency slot",
+    fn=lambda: facepp_client.stats()["queue_depth"]
+)
+metrics.gauge(
+    "facepp_concurrency_limit", "Current adaptive Face++ concurrency limit",
+    fn=lambda: facepp_client.stats()["concurrency_limit"]
+)
 
-@router.post("/kyc/upload-document")
+# Face verification: Face++, local dlib encodings or both (see KYC_VERIFICATION_BACKEND)
+verification_backend = create_verification_backend(facepp_client)
+
+if settings.PREFLIGHT_MODE not in PREFLIGHT_MODES:
+    raise ValueError(f"Unknown PREFLIGHT_MODE {settings.PREFLIGHT_MODE!r}; choose from {', '.join(PREFLIGHT_MODES)}")
+
+# The enrollment index lives in each process, so with several server workers
+# every worker would only check the selfies it happened to receive
+if settings.KYC_DUPLICATE_CHECK and settings.SERVER_WORKERS > 1:
+    raise ValueError("KYC_DUPLICATE_CHECK needs a single server worker: the enrollment index is per process")
+
+# KYC session store (in-memory or SQLite, see SESSION_BACKEND)
+session_store = create_session_store()
+
+def require_facepp_credentials() -> None:
+    """Reject Face++-backed requests when credentials are missing, instead of failing at import"""
+    if settings.KYC_VERIFICATION_BACKEND == "local":
+        return
+    if not FACEPP_API_KEY or not FACEPP_API_SECRET:
+        raise HTTPException(status_code=500, detail="Face++ API credentials not set in environment variables!")
+
+def require_single_process_index() -> None:
+    """Reject enrollment index requests that another worker's index would answer differently"""
+    if settings.SERVER_WORKERS > 1:
+        raise HTTPException(
+            status_code=400,
+            detail="The enrollment index is per process and not available with several server workers",
+        )
+
+async def preflight(content: bytes, kind: str, facepp_calls: int) -> Optional[Dict]:
+    """
+    Run the local quality checks before an image is sent to Face++.
+
+    With PREFLIGHT_MODE="enforce" a failing image is rejected with 422 and
+    the reasons to retake it; with "report" it is only counted.
+
+    Args:
+        content: Uploaded image
+        kind: "document" or "selfie"
+        facepp_calls: Face++ calls the request makes for this image
+
+    Returns:
+        The check report, or None when pre-flight is off
+    """
+    if settings.PREFLIGHT_MODE == "off":
+        return None
+    with stage("preflight"):
+        report = await run_in_threadpool(assess_image, content, kind, detector_pool)
+    enforce = settings.PREFLIGHT_MODE == "enforce"
+    record_preflight(kind, report, enforce, facepp_calls)
+    if enforce and not report["passed"]:
+        raise HTTPException(status_code=422, detail={
+            "message": f"{kind.capitalize()} image failed quality checks, please retake it",
+            "retake": True,
+            "reasons": [{"code": reason, "message": RETAKE_MESSAGES[reason]} for reason in report["reasons"]],
+            "checks": report["checks"],
+        })
+    return report
+
+@router.on_event("shutdown")
+async def close_facepp_client() -> None:
+    await facepp_client.aclose()
+
+@router.on_event("shutdown")
+def save_face_index() -> None:
+    if settings.FACE_INDEX_PATH and settings.SERVER_WORKERS == 1:
+        face_index.save(settings.FACE_INDEX_PATH)
+
+@router.on_event("shutdown")
+def close_session_store() -> None:
+    session_store.close()
+
+@router.post("/kyc/upload-document", dependencies=[Depends(require_facepp_credentials)])
 async def upload_document(document: UploadFile = File(...)) -> Dict:
     """
-    Upload a document image (ID/passport), extract face using Face++ and store face_token.
+    Upload a document image (ID/passport), find its face and start a session.
+
+    With Face++ in use the face_token is stored (and is the session id); with
+    local verification the document's face encoding is stored.
     """
     if not document.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-        content = await document.read()
-        temp_file.write(content)
-        temp_file_path = temp_file.name
-
-    # Send to Face++ for face detection (use more accurate model and return more debug info)
-    with open(temp_file_path, 'rb') as img_file:
-        resp = requests.post(
-            FACEPP_DETECT_URL,
-            data={
-                'api_key': FACEPP_API_KEY,
-                'api_secret': FACEPP_API_SECRET,
-                'return_landmark': 1,
-                'return_attributes': 'none',
-                'model': 'detection_02',
-            },
-            files={'image_file': img_file}
-        )
-    os.unlink(temp_file_path)
-    if resp.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Face++ error: {resp.text}")
-    data = resp.json()
-    faces = data.get('faces', [])
-    if not faces:
-        raise HTTPException(status_code=400, detail="No face found in document")
-    face_token = faces[0]['face_token']
+    content = await read_upload(document)
+    facepp_calls = 0 if settings.KYC_VERIFICATION_BACKEND == "local" else 1
+    preflight_report = await preflight(content, "document", facepp_calls)
+
+    try:
+        enrollment = await verification_backend.enroll(content)
+    except FaceNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # Store session
-    session_id = face_token
-    kyc_sessions[session_id] = {
-        "document_face_token": face_token,
-        "document_detect_response": data,  # Store full detect response for debugging
-    }
+    session_id = enrollment.get("session_id") or uuid.uuid4().hex
+    with stage("session_store"):
+        await run_in_threadpool(session_store.put, session_id, enrollment["session"])
+        for name, payload in enrollment["debug"].items():
+            await run_in_threadpool(session_store.put_debug, session_id, name, payload)
 
-    return {
+    response = {
         "session_id": session_id,
         "face_found": True,
-        "detect_debug": data  # Return full Face++ detect response for debugging
+        "backend": verification_backend.name,
     }
+    if "document_detect_response" in enrollment["debug"]:
+        response["detect_debug"] = enrollment["debug"]["document_detect_response"]  # Full Face++ detect response
+    if preflight_report is not None:
+        response["preflight"] = preflight_report
+    return response
 
-@router.post("/kyc/upload-selfie")
-async def upload_selfie(session_id: str, selfie: UploadFile = File(...)) -> Dict:
+async def check_duplicate_identity(session_id: str, encoding_task: asyncio.Task,
+                                   enroll: bool) -> List[Dict]:
     """
-    Upload a live selfie and verify against document face using Face++.
+    Search enrolled faces for other sessions with the same identity.
+
+    The selfie is enrolled under ``session_id`` when ``enroll`` is set and no
+    duplicate was found.
     """
-    if session_id not in kyc_sessions:
+    _, encodings, _ = await encoding_task
+    if not len(encodings):
+        return []
+    # Off the event loop: a large index scans many rows, and add() may retrain the partitions
+    matches = await run_in_threadpool(face_index.search, encodings[0], 5)
+    duplicates = [
+        {"session_id": match_id, "distance": distance}
+        for match_id, distance in matches
+        if match_id != session_id and distance <= settings.KYC_DUPLICATE_THRESHOLD
+    ]
+    if enroll and not duplicates:
+        await run_in_threadpool(face_index.add, session_id, encodings[0])
+    return duplicates
+
+@router.post("/kyc/upload-selfie", dependencies=[Depends(require_facepp_credentials)])
+async def upload_selfie(session_id: str, selfie: UploadFile = File(...), landmarks: bool = False) -> Dict:
+    """
+    Upload a live selfie and verify it against the document face.
+
+    With Face++ (KYC_SELFIE_MODE="compare", the default) the selfie is sent
+    straight to the compare call in a single round trip. With
+    KYC_SELFIE_MODE="detect", or when ``landmarks`` is requested, the selfie
+    is detected first and the landmarks are returned alongside the
+    comparison. The hybrid backend decides most selfies locally and only
+    sends ambiguous ones to Face++.
+    """
+    with stage("session_store"):
+        session = await run_in_threadpool(session_store.get, session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     if not selfie.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-        content = await selfie.read()
-        temp_file.write(content)
-        temp_file_path = temp_file.name
-
-    # Detect face in selfie to get face_token (use more accurate model)
-    with open(temp_file_path, 'rb') as img_file:
-        resp = requests.post(
-            FACEPP_DETECT_URL,
-            data={
-                'api_key': FACEPP_API_KEY,
-                'api_secret': FACEPP_API_SECRET,
-                'return_landmark': 1,
-                'return_attributes': 'none',
-                'model': 'detection_02',
-            },
-            files={'image_file': img_file}
-        )
-    os.unlink(temp_file_path)
-    if resp.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Face++ error: {resp.text}")
-    data = resp.json()
-    faces = data.get('faces', [])
-    if not faces:
-        raise HTTPException(status_code=400, detail="No face found in selfie")
-    selfie_face_token = faces[0]['face_token']
-
-    # Compare document and selfie face_token
-    resp = requests.post(
-        FACEPP_COMPARE_URL,
-        data={
-            'api_key': FACEPP_API_KEY,
-            'api_secret': FACEPP_API_SECRET,
-            'face_token1': kyc_sessions[session_id]["document_face_token"],
-            'face_token2': selfie_face_token
-        }
-    )
-    if resp.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Face++ compare error: {resp.text}")
-    result = resp.json()
-    confidence = result.get('confidence', 0)
-    # Always use 80 as the match threshold, regardless of Face++ thresholds
-    threshold = 80
-    verified = confidence >= threshold
+    content = await read_upload(selfie)
+    detect_first = landmarks or settings.KYC_SELFIE_MODE == "detect"
+    # Hybrid calls Face++ only for ambiguous selfies, so only remote counts as avoided calls
+    facepp_calls = (2 if detect_first else 1) if settings.KYC_VERIFICATION_BACKEND == "remote" else 0
+    preflight_report = await preflight(content, "selfie", facepp_calls)
+
+    # Compute the local embedding for the duplicate-identity check while Face++ runs
+    encoding_task = None
+    if settings.KYC_DUPLICATE_CHECK:
+        encoding_task = asyncio.create_task(get_faces(content))
+    try:
+        result = await verification_backend.verify(content, session, detect_first)
+    except FaceNotFoundError as e:
+        if encoding_task is not None:
+            encoding_task.cancel()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        if encoding_task is not None:
+            encoding_task.cancel()
+        raise
+
+    verified = result["verified"]
+    compare_debug = result.pop("compare_debug", None)
+    detect_data = result.pop("detect_debug", None)
+
+    duplicates = []
+    if encoding_task is not None:
+        with stage("duplicate_check"):
+            duplicates = await check_duplicate_identity(session_id, encoding_task, enroll=verified)
+        if duplicates:
+            verified = False
 
     # Store selfie result
-    kyc_sessions[session_id]["selfie_face_token"] = selfie_face_token
-    kyc_sessions[session_id]["verified"] = verified
-    kyc_sessions[session_id]["confidence"] = confidence
-    kyc_sessions[session_id]["threshold"] = threshold
-    kyc_sessions[session_id]["compare_debug"] = result  # Store full compare response for debugging
+    session_result = {**result, "verified": bool(verified)}
+    if encoding_task is not None:
+        session_result["duplicate_sessions"] = duplicates
+    with stage("session_store"):
+        if not await run_in_threadpool(session_store.update, session_id, **session_result):
+            raise HTTPException(status_code=404, detail="Session expired")
+        if compare_debug is not None:
+            await run_in_threadpool(session_store.put_debug, session_id, "compare_debug", compare_debug)  # Full compare response for debugging
 
-    return {
-        "verified": bool(verified),
-        "confidence": confidence,
-        "threshold": threshold,
-        "compare_debug": result  # Return full compare response for debugging
-    }
+    response = {key: value for key, value in session_result.items() if key != "selfie_face_token"}
+    if compare_debug is not None:
+        response["compare_debug"] = compare_debug  # Return full compare response for debugging
+    if detect_data is not None:
+        response["detect_debug"] = detect_data  # Includes selfie landmarks
+    if preflight_report is not None:
+        response["preflight"] = preflight_report
+    return response
 
 @router.get("/kyc/session/{session_id}")
 def get_session(session_id: str):
-    if session_id not in kyc_sessions:
+    session = session_store.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    return kyc_sessions[session_id]
+    return {**session, **session_store.get_debug(session_id)}
+
+@router.get("/kyc/facepp/stats")
+def facepp_stats() -> Dict:
+    """Face++ client timings, retry counters and queue depth for monitoring"""
+    return facepp_client.stats()
+
+@router.get("/kyc/verification/stats")
+def verification_stats() -> Dict:
+    """Verification backend in use and the state of the Face++ circuit breaker"""
+    return verification_backend.stats()
+
+@router.post("/kyc/index/search", dependencies=[Depends(require_single_process_index)])
+async def search_face_index(image: UploadFile = File(...), k: int = 5) -> Dict:
+    """
+    Find the enrolled KYC sessions whose faces are closest to the uploaded image.
+    """
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    content = await read_upload(image)
+    _, encodings, _ = await get_faces(content)
+    if not len(encodings):
+        raise HTTPException(status_code=400, detail="No face found in image")
+    matches = await run_in_threadpool(face_index.search, encodings[0], k)
+    return {
+        "matches": [{"session_id": match_id, "distance": distance} for match_id, distance in matches],
+        "threshold": settings.KYC_DUPLICATE_THRESHOLD
+    }
+
+@router.delete("/kyc/index/{session_id}", dependencies=[Depends(require_single_process_index)])
+def remove_from_face_index(session_id: str) -> Dict:
+    if not face_index.remove(session_id):
+        raise HTTPException(status_code=404, detail="Session not enrolled")
+    return {"removed": session_id}
+
+@router.get("/kyc/index/stats")
+def face_index_stats() -> Dict:
+    """Enrollment index size and search mode"""
+    return face_index.stats()
+
+@router.get("/kyc/sessions/stats")
+def session_store_stats() -> Dict:
+    """Session store backend and size"""
+    return session_store.stats()
@@ -1,14 +1,28 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+import asyncio
 import cv2
 import numpy as np
-import face_recognition
-import tempfile
 import os
 from typing import Dict
+from ..core import FaceDetector
 from ..core.config import settings
+from ..core.executor import process_pool, PoolSaturatedError
+from ..core.facepp import FaceppBusyError
+from ..core.verification import BackendUnavailableError, FaceppResponseError
+from ..core.ingest import read_upload, ImageTooLargeError, MaxBodySizeMiddleware
+from ..core.encoding_cache import encoding_cache
+from ..core.fingers import extract_fingers, DEFAULT_OUTPUTS, MIN_CONTOUR_AREA
+from ..core.metrics import metrics, stage, startup, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from ..core.models import models
+from ..core import faces
 from .kyc import router as kyc_router
 from .fingerprint import router as fingerprint_router
+from .detection import router as detection_router, detector_pool, process_image_pooled
+from .artifacts import router as artifacts_router
+from .jobs import router as jobs_router
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -24,9 +38,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized request bodies before they are buffered
+app.add_middleware(MaxBodySizeMiddleware, max_size=settings.MAX_REQUEST_SIZE)
+
+# Outermost, so rejected and failed requests are measured too
+app.add_middleware(MetricsMiddleware, stage_header=settings.METRICS_STAGE_HEADER)
+
+metrics.gauge(
+    "worker_pool_tasks", "Tasks in the worker process pool, by state", ("state",),
+    fn=lambda: {(state,): process_pool.stats()[state] for state in ("running", "queued")}
+)
+
 # Create upload directory
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError) -> JSONResponse:
+    """Tell clients to back off when the worker pool is full"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(FaceppBusyError)
+async def facepp_busy_handler(request: Request, exc: FaceppBusyError) -> JSONResponse:
+    """Tell clients to back off when the Face++ request queue is full"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(BackendUnavailableError)
+async def backend_unavailable_handler(request: Request, exc: BackendUnavailableError) -> JSONResponse:
+    """Tell clients to retry once the verification backend is back, e.g. the Face++ circuit closes"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(FaceppResponseError)
+async def facepp_response_handler(request: Request, exc: FaceppResponseError) -> JSONResponse:
+    """Turn a failed Face++ response into an HTTP error"""
+    if exc.overloaded:
+        return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+    return JSONResponse(status_code=500, content={"detail": str(exc)})
+
+@app.exception_handler(ImageTooLargeError)
+async def image_too_large_handler(request: Request, exc: ImageTooLargeError) -> JSONResponse:
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+WARMUP_PIPELINES = ("detector", "faces", "fingers")
+
+async def warm_up_pipelines(pipelines: list) -> None:
+    """
+    Push a test face through each pipeline so the first real request finds
+    models loaded and worker processes started.
+    """
+    test_image = cv2.imencode(".jpg", FaceDetector.create_test_face())[1].tobytes()
+
+    async def detector() -> None:
+        # Load every pooled cascade now rather than during the first burst of requests
+        await run_in_threadpool(detector_pool.fill)
+        await run_in_threadpool(process_image_pooled, test_image)
+
+    async def face_encodings() -> None:
+        # One task per worker, so every worker process loads the dlib models
+        await asyncio.gather(*(
+            process_pool.run(faces.warm_up, test_image, settings.DETECT_MAX_SIDE)
+            for _ in range(process_pool.workers)
+        ))
+
+    async def fingers() -> None:
+        await process_pool.run(
+            extract_fingers, test_image, DEFAULT_OUTPUTS, MIN_CONTOUR_AREA, "jpeg", None, settings.FINGER_ENGINE
+        )
+
+    steps = {"detector": detector, "faces": face_encodings, "fingers": fingers}
+    for name in pipelines:
+        await models.warm_up(name, steps[name])
+
+@app.on_event("startup")
+async def start_warm_up() -> None:
+    pipelines = [name.strip() for name in settings.WARMUP_PIPELINES.split(",") if name.strip()]
+    unknown = set(pipelines) - set(WARMUP_PIPELINES)
+    if unknown:
+        raise ValueError(f"Unknown WARMUP_PIPELINES {sorted(unknown)}; choose from {', '.join(WARMUP_PIPELINES)}")
+    models.expect_warmups(pipelines)
+    # In the background, so the server accepts connections (and /ready) meanwhile
+    app.state.warmup_task = asyncio.create_task(warm_up_pipelines(pipelines))
+
+@app.on_event("shutdown")
+async def shutdown_process_pool() -> None:
+    await faces.faces_batcher.stop()
+    process_pool.shutdown()
+
 def validate_image_file(file: UploadFile) -> None:
     """Validate the uploaded image file"""
     if not file.content_type.startswith('image/'):
@@ -47,39 +155,31 @@ async def detect_face(image: UploadFile = File(...)) -> Dict:
     try:
         validate_image_file(image)
         
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            content = await image.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        # Load the image
-        image = face_recognition.load_image_file(temp_file_path)
-        
-        # Find all face locations in the image
-        face_locations = face_recognition.face_locations(image)
-        
-        # Clean up temporary file
-        os.unlink(temp_file_path)
+        content = await read_upload(image)
+
+        # Find faces and compute encodings (cached, otherwise in a worker process)
+        with stage("get_faces"):
+            face_locations, face_encodings, scale = await faces.get_faces(content)
         
         if not face_locations:
             return {
                 "status": "success",
                 "face_detected": False,
-                "message": "No face detected in the image"
+                "message": "No face detected in the image",
+                "scale": scale
             }
         
-        # Get face encodings
-        face_encodings = face_recognition.face_encodings(image, face_locations)
-        
         return {
             "status": "success",
             "face_detected": True,
             "face_count": len(face_locations),
             "face_locations": face_locations,
-            "face_encodings": [encoding.tolist() for encoding in face_encodings]
+            "face_encodings": [encoding.tolist() for encoding in face_encodings],
+            "scale": scale
         }
 
+    except (PoolSaturatedError, ImageTooLargeError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -95,60 +195,52 @@ async def verify_faces(
         validate_image_file(image1)
         validate_image_file(image2)
         
-        # Save both uploaded files temporarily
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file1:
-            content1 = await image1.read()
-            temp_file1.write(content1)
-            temp_file1_path = temp_file1.name
-
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file2:
-            content2 = await image2.read()
-            temp_file2.write(content2)
-            temp_file2_path = temp_file2.name
-
-        # Load the images
-        image1 = face_recognition.load_image_file(temp_file1_path)
-        image2 = face_recognition.load_image_file(temp_file2_path)
-        
-        # Get face encodings
-        face_encodings1 = face_recognition.face_encodings(image1)
-        face_encodings2 = face_recognition.face_encodings(image2)
-        
-        # Clean up temporary files
-        os.unlink(temp_file1_path)
-        os.unlink(temp_file2_path)
-        
-        if not face_encodings1 or not face_encodings2:
-            raise HTTPException(
-                status_code=400,
-                detail="Could not find faces in one or both images"
-            )
-        
-        # Compare faces
-        results = face_recognition.compare_faces(
-            [face_encodings1[0]],  # Compare first face from first image
-            face_encodings2[0]     # with first face from second image
-        )
-        
-        # Calculate face distance
-        face_distance = face_recognition.face_distance(
-            [face_encodings1[0]],
-            face_encodings2[0]
-        )[0]
+        content1 = await read_upload(image1)
+        content2 = await read_upload(image2)
+
+        # Get face encodings (cached, otherwise in worker processes) and compare the first faces
+        with stage("verify"):
+            result = await faces.verify_faces(content1, content2)
         
-        return {
-            "status": "success",
-            "verified": results[0],
-            "distance": float(face_distance),
-            "threshold": 0.6  # Standard threshold for face recognition
-        }
+        return {"status": "success", **result}
 
+    except faces.FaceNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (PoolSaturatedError, ImageTooLargeError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 app.include_router(kyc_router, prefix="/api/v1")
 app.include_router(fingerprint_router, prefix="/api/v1")
+app.include_router(artifacts_router, prefix="/api/v1")
+app.include_router(jobs_router, prefix="/api/v1")
+app.include_router(detection_router)
+
+@app.get(f"{settings.API_V1_STR}/cache/stats")
+def cache_stats() -> Dict:
+    """Face encoding cache hit/miss counters and memory usage"""
+    return encoding_cache.stats()
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics() -> Response:
+    """Latency, stage, pool and process metrics in the Prometheus text format"""
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/ready", include_in_schema=False)
+def ready() -> JSONResponse:
+    """
+    Readiness probe: 200 once every startup warm-up succeeded, 503 before.
+
+    Also reports which models are loaded in this process, how many pooled
+    face detectors exist, how long each warm-up took, the import time and the
+    time to the first successful request.
+    """
+    status = {**models.status(), "detector_pool": detector_pool.stats(), "startup": startup.stats()}
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 @app.get("/")
 async def root():
-    return {"message": "Face Detection API is running"} 
\ No newline at end of file
+    return {"message": "Face Detection API is running"}
+
+startup.record_import()
@@ -1 +1,4 @@
 """Core package initialization."""
+from .detector import FaceDetector
+
+__all__ = ["FaceDetector"]
@@ -0,0 +1,99 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import settings
+
+
+class ArtifactStore:
+    """
+    Short-lived store for image artifacts fetched lazily by id.
+
+    Endpoints can return artifact ids instead of inlining image bytes; the
+    client then downloads only the artifacts it actually displays. Entries
+    expire after ``ttl`` seconds and the oldest are evicted once the total
+    size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, ttl: int = 300, max_bytes: int = 128 * 1024 * 1024):
+        """
+        Args:
+            ttl: Seconds an artifact stays available
+            max_bytes: Memory budget for stored artifacts
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, bytes, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"stored": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+    def put(self, data: bytes, media_type: str) -> str:
+        """
+        Store an artifact.
+
+        Args:
+            data: Artifact bytes
+            media_type: Content type served with the artifact
+
+        Returns:
+            Unguessable artifact id
+        """
+        artifact_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._entries[artifact_id] = (time.monotonic() + self.ttl, data, media_type)
+            self._bytes += len(data)
+            self._counters["stored"] += 1
+            self._evict()
+        return artifact_id
+
+    def get(self, artifact_id: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Look up an artifact.
+
+        Args:
+            artifact_id: Id returned by put()
+
+        Returns:
+            Tuple of (bytes, media type), or None if unknown or expired
+        """
+        with self._lock:
+            entry = self._entries.get(artifact_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(artifact_id)
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            return entry[1], entry[2]
+
+    def _remove(self, artifact_id: str) -> None:
+        _, data, _ = self._entries.pop(artifact_id)
+        self._bytes -= len(data)
+
+    def _evict(self) -> None:
+        # Entries are in insertion order, which is also expiry order
+        now = time.monotonic()
+        while self._entries:
+            artifact_id, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at >= now and self._bytes <= self.max_bytes:
+                break
+            self._remove(artifact_id)
+            if expires_at >= now:
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry count, memory usage and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                **self._counters,
+            }
+
+
+artifact_store = ArtifactStore(ttl=settings.ARTIFACT_TTL, max_bytes=settings.ARTIFACT_MAX_BYTES)
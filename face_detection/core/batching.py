@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+from .executor import PoolSaturatedError
+from .metrics import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BATCH_SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+
+batch_sizes = metrics.histogram(
+    "batch_size", "Items per batch run by a micro-batcher", ("batcher",), buckets=BATCH_SIZE_BUCKETS
+)
+batch_queue_wait = metrics.histogram(
+    "batch_queue_wait_seconds", "Time an item waited to be put in a batch", ("batcher",)
+)
+batch_run_time = metrics.histogram(
+    "batch_run_seconds", "Time to process one batch", ("batcher",)
+)
+batch_item_latency = metrics.histogram(
+    "batch_item_latency_seconds", "Time from submitting an item to receiving its result", ("batcher",)
+)
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Groups items submitted by concurrent requests into batches.
+
+    As soon as one of the ``max_concurrency`` batch slots is free, the items
+    waiting (up to ``max_batch``) are dispatched as a batch. While every slot
+    is busy, new items keep accumulating, so batches grow with load instead
+    of requests queueing one by one, and an idle batcher adds no latency.
+    ``max_wait`` optionally holds a batch with a free slot for up to that
+    many seconds to let it fill, trading latency for fuller batches.
+
+    ``fn`` receives the list of items and returns one result per item, in
+    order. An exception instance in the returned list fails only that item;
+    an exception raised by ``fn`` fails the whole batch. With ``max_queue``
+    set, submissions beyond that many waiting items fail fast with
+    PoolSaturatedError, like the process pool's own backlog.
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[T]], Awaitable[List[Any]]], max_batch: int = 8,
+                 max_wait: float = 0.0, max_concurrency: int = 1, max_queue: int = 0, retry_after: int = 1):
+        """
+        Args:
+            name: Batcher name used in metrics
+            fn: Coroutine function processing a batch
+            max_batch: Largest batch
+            max_wait: Longest time in seconds the oldest item waits for the batch to fill while
+                a slot is free (0 dispatches immediately)
+            max_concurrency: Batches processed at the same time
+            max_queue: Items allowed to wait for a batch (0 = unbounded)
+            retry_after: Seconds suggested to clients when the queue is full
+        """
+        self.name = name
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._queue: Deque[Tuple[T, "asyncio.Future[R]", float]] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional["asyncio.Task[None]"] = None
+        self._running: Set["asyncio.Task[None]"] = set()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._collector = loop.create_task(self._collect())
+        return loop
+
+    async def submit(self, item: T) -> R:
+        """
+        Add an item to the next batch and wait for its result.
+
+        Args:
+            item: Input for ``fn``
+
+        Returns:
+            The item's result
+
+        Raises:
+            PoolSaturatedError: If max_queue items are already waiting
+        """
+        if self.max_queue and len(self._queue) >= self.max_queue:
+            raise PoolSaturatedError(self.retry_after)
+        loop = self._ensure_started()
+        future: "asyncio.Future[R]" = loop.create_future()
+        self._queue.append((item, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future
+
+    async def _collect(self) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            # Items keep arriving while every slot is busy
+            await self._slots.acquire()
+            while self.max_wait and len(self._queue) < self.max_batch:
+                remaining = self._queue[0][2] + self.max_wait - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch = []
+            while self._queue and len(batch) < self.max_batch:
+                entry = self._queue.popleft()
+                if not entry[1].done():  # skip callers that went away
+                    batch.append(entry)
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _dispatch(self, batch: List[Tuple[T, "asyncio.Future[R]", float]]) -> None:
+        try:
+            start = time.perf_counter()
+            batch_sizes.observe(len(batch), self.name)
+            for _, _, submitted in batch:
+                batch_queue_wait.observe(start - submitted, self.name)
+            try:
+                results = await self.fn([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            end = time.perf_counter()
+            batch_run_time.observe(end - start, self.name)
+            for (_, future, submitted), result in zip(batch, results):
+                batch_item_latency.observe(end - submitted, self.name)
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "queued": len(self._queue),
+            "running_batches": len(self._running),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    async def stop(self) -> None:
+        """Stop collecting; items still queued fail with CancelledError."""
+        if self._collector is not None:
+            self._collector.cancel()
+            self._collector = None
+        for _, future, _ in self._queue:
+            future.cancel()
+        self._queue.clear()
@@ -8,11 +8,107 @@ class Settings(BaseSettings):
     
     # Face Detection Settings
     FACE_DETECTION_THRESHOLD: float = 0.6
+    DETECT_MAX_SIDE: int = 0  # detect on a copy downscaled to this longest side (0 = full resolution)
+    DETECT_POOL_SIZE: int = 0  # Haar cascades run in parallel per server process (0 = one per CPU core)
+    DETECT_SCALE_FACTOR: float = 1.1  # cascade scaleFactor: lower finds more faces, slower
+    DETECT_MIN_NEIGHBORS: int = 4  # cascade minNeighbors: higher gives fewer false positives
+    DETECT_MIN_SIZE: int = 0  # smallest face searched for by /detect-faces, in pixels of the detection copy
     
     # File Settings
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 5 * 1024 * 1024  # 5MB
+    MAX_REQUEST_SIZE: int = 11 * 1024 * 1024  # two files plus multipart overhead
     ALLOWED_EXTENSIONS: set = {"jpg", "jpeg", "png"}
+
+    # Finger Extraction Settings
+    FINGER_ENGINE: str = "contour"  # "contour" (per-contour loop) or "components" (vectorized connected components)
+
+    # Server Settings
+    SERVER_WORKERS: int = 1  # server processes sharing the port, set by face_detection.serve
+
+    # Worker Pool Settings
+    WORKER_PROCESSES: int = 0  # 0 = one per CPU core
+    WORKER_MAX_QUEUE: int = 32
+    WORKER_RETRY_AFTER: int = 1  # seconds
+
+    # Encoding Cache Settings
+    ENCODING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 64MB
+    ENCODING_CACHE_DIR: str = ""  # empty disables the on-disk tier
+
+    # Embedding Batch Settings
+    EMBED_BATCH_MAX: int = 8  # faces encoded per batched dlib pass (1 disables batching)
+    EMBED_BATCH_WAIT_MS: float = 0.0  # optional wait for a batch to fill when a worker is free
+
+    # Artifact Store Settings
+    ARTIFACT_TTL: int = 300  # seconds an image artifact can be fetched by id
+    ARTIFACT_MAX_BYTES: int = 128 * 1024 * 1024  # 128MB
+
+    # Startup Settings
+    WARMUP_PIPELINES: str = "detector,faces,fingers"  # run a test face through these at startup (empty disables)
+
+    # Metrics Settings
+    METRICS_STAGE_HEADER: bool = False  # add a Server-Timing header with the per-stage breakdown to every response
+
+    # Face++ Client Settings
+    FACEPP_BASE_URL: str = "https://api-us.faceplusplus.com"  # point at facepp_mock.py for load tests
+    FACEPP_MAX_CONNECTIONS: int = 20  # keep-alive connections to the Face++ host
+    FACEPP_TIMEOUT: float = 10.0  # seconds
+    FACEPP_INITIAL_CONCURRENCY: int = 4
+    FACEPP_MAX_CONCURRENCY: int = 20
+    FACEPP_MAX_QUEUE: int = 100  # requests waiting for a concurrency slot
+    FACEPP_MAX_RETRIES: int = 3  # retries on CONCURRENCY_LIMIT_EXCEEDED
+    FACEPP_BREAKER_FAILURES: int = 5  # consecutive failures that open the Face++ circuit
+    FACEPP_BREAKER_RESET: float = 30.0  # seconds the circuit stays open before a trial call
+
+    # KYC Settings
+    KYC_VERIFICATION_BACKEND: str = "remote"  # "remote" (Face++), "local" (dlib) or "hybrid" (local, Face++ when ambiguous)
+    KYC_LOCAL_FALLBACK: bool = False  # remote: also enroll locally (dlib in the worker pool on every upload) and verify locally while Face++ is unavailable
+    KYC_LOCAL_THRESHOLD: float = 0.5  # dlib encoding distance accepted by local verification
+    KYC_HYBRID_ACCEPT_DISTANCE: float = 0.4  # hybrid: verified locally at or below this distance
+    KYC_HYBRID_REJECT_DISTANCE: float = 0.6  # hybrid: rejected locally above this distance; in between asks Face++
+    KYC_SELFIE_MODE: str = "compare"  # "compare" (single round trip) or "detect" (detect + compare)
+    KYC_DUPLICATE_CHECK: bool = False  # search enrolled faces for the same person during upload-selfie
+    KYC_DUPLICATE_THRESHOLD: float = 0.5  # dlib encoding distance treated as the same identity
+
+    # Pre-flight Settings (local quality checks before Face++ calls)
+    PREFLIGHT_MODE: str = "enforce"  # "enforce" (reject), "report" (count only) or "off"
+    PREFLIGHT_MAX_SIDE: int = 320  # checks run on a grayscale copy downscaled to this longest side
+    PREFLIGHT_MIN_SIDE: int = 320  # minimum shorter side of the original image, in pixels
+    PREFLIGHT_MIN_SHARPNESS: float = 20.0  # Laplacian variance of the downscaled copy
+    PREFLIGHT_MIN_BRIGHTNESS: float = 40.0  # mean gray level, 0-255
+    PREFLIGHT_MAX_BRIGHTNESS: float = 220.0
+    PREFLIGHT_MAX_CLIPPED: float = 0.5  # fraction of blown-out pixels
+    PREFLIGHT_MIN_FACE_DOCUMENT: float = 0.1  # face width as a fraction of the image's shorter side
+    PREFLIGHT_MIN_FACE_SELFIE: float = 0.2
+
+    # Tracking Settings (WebSocket face tracking)
+    TRACK_DETECT_EVERY: int = 10  # full cascade detection every this many frames; template matching in between
+    TRACK_MAX_SIDE: int = 320  # frames are processed downscaled to this longest side
+    TRACK_ROI_MARGIN: float = 0.5  # search window around a tracked face, as a fraction of its size per side
+    TRACK_MIN_SCORE: float = 0.6  # lowest template match score before a face counts as lost
+
+    # Session Store Settings
+    SESSION_BACKEND: str = "memory"  # "memory" (single process) or "sqlite" (shared by all workers)
+    SESSION_TTL: int = 3600  # seconds since the last write
+    SESSION_MAX_ENTRIES: int = 10000  # memory backend only
+    SESSION_DB_PATH: str = "kyc_sessions.db"
+    SESSION_SWEEP_INTERVAL: float = 60.0  # seconds between expiry sweeps (sqlite backend)
+    SESSION_STORE_DEBUG: bool = True  # keep raw Face++ responses with each session
+
+    # Job Queue Settings
+    JOB_DB_PATH: str = "kyc_jobs.db"
+    JOB_CONCURRENCY: int = 2  # jobs run at once per server process (the work itself runs in the worker pool)
+    JOB_POLL_INTERVAL: float = 0.5  # seconds between checks for jobs submitted by other processes
+    JOB_RESULT_TTL: int = 3600  # seconds a finished job's result can be fetched
+    JOB_LEASE: int = 300  # seconds before a job claimed by a crashed process is retried
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_MAX_QUEUED: int = 1000
+    JOB_MAX_WAIT: float = 30.0  # longest long-poll a client may request, in seconds
+
+    # Face Index Settings
+    FACE_INDEX_PATH: str = ""  # directory the enrollment index is loaded from and saved to
+    FACE_INDEX_IVF_THRESHOLD: int = 50000  # switch to partitioned search above this size
+    FACE_INDEX_NPROBE: int = 8
     
     model_config = SettingsConfigDict(case_sensitive=True)
 
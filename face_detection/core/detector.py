@@ -0,0 +1,215 @@
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple, Dict, Any
+import base64
+from io import BytesIO
+from PIL import Image
+from .ingest import downscaled_size
+from .metrics import stage
+from .models import models
+
+class FaceDetector:
+    """Core face detection and analysis functionality."""
+    
+    def __init__(self, max_side: int = 0, scale_factor: float = 1.1, min_neighbors: int = 4,
+                 min_size: int = 0, cascade: Optional[cv2.CascadeClassifier] = None):
+        """
+        Initialize the face detector.
+        
+        Without ``cascade``, the Haar cascade is loaded from the model registry
+        on first use and shared with every other such detector in the process.
+        A detector owning its cascade also keeps its grayscale buffers between
+        calls, so it must only be used by one thread at a time.
+        
+        Args:
+            max_side: Run detection on a copy downscaled to this longest side
+                (0 detects on the full-resolution image)
+            scale_factor: Cascade scaleFactor, the size step between scanned scales
+            min_neighbors: Cascade minNeighbors, overlapping hits needed to keep a face
+            min_size: Smallest face searched for, in pixels of the detection copy (0 = cascade minimum)
+            cascade: Cascade owned by this detector
+        """
+        self.max_side = max_side
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._cascade = cascade
+        self._buffers: Dict[str, np.ndarray] = {}
+    
+    @property
+    def face_cascade(self) -> cv2.CascadeClassifier:
+        if self._cascade is not None:
+            return self._cascade
+        return models.get("haar_cascade")
+    
+    def _buffer(self, name: str, shape: Tuple[int, ...]) -> Optional[np.ndarray]:
+        """Reusable uint8 array of the given shape, if this detector owns its cascade."""
+        if self._cascade is None:
+            return None
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buffer
+    
+    def detect_gray(self, gray: np.ndarray, min_size: Optional[int] = None) -> List[Tuple[int, int, int, int]]:
+        """
+        Run the cascade on a grayscale image as is.
+        
+        Args:
+            gray: Grayscale image
+            min_size: Smallest face searched for, in pixels (defaults to the detector's)
+            
+        Returns:
+            List of face coordinates (x, y, width, height)
+        """
+        min_size = self.min_size if min_size is None else min_size
+        faces = self.face_cascade.detectMultiScale(
+            gray, self.scale_factor, self.min_neighbors, minSize=(min_size, min_size)
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+    
+    def detect_faces(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Detect faces in an image.
+        
+        Args:
+            image: Input image as numpy array
+            
+        Returns:
+            List of face coordinates (x, y, width, height)
+        """
+        faces, _ = self.detect_faces_scaled(image)
+        return faces
+    
+    def detect_faces_scaled(self, image: np.ndarray) -> Tuple[List[Tuple[int, int, int, int]], float]:
+        """
+        Detect faces on a downscaled copy and map them back to full resolution.
+        
+        Args:
+            image: Input image as numpy array
+            
+        Returns:
+            Tuple of (face coordinates in full-resolution pixels, scale used)
+        """
+        height, width = image.shape[:2]
+        size, scale = downscaled_size(width, height, self.max_side)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", (height, width)))
+        if scale != 1.0:
+            gray = cv2.resize(gray, size, dst=self._buffer("small", size[::-1]), interpolation=cv2.INTER_AREA)
+        faces = np.array(self.detect_gray(gray), dtype=float).reshape(-1, 4)
+        if scale != 1.0:
+            faces = np.round(faces / scale)
+        return faces.astype(int).tolist(), scale
+    
+    def draw_faces(self, image: np.ndarray, faces: List[Tuple[int, int, int, int]]) -> np.ndarray:
+        """
+        Draw rectangles around detected faces.
+        
+        Args:
+            image: Input image as numpy array
+            faces: List of face coordinates
+            
+        Returns:
+            Image with face rectangles drawn
+        """
+        result = image.copy()
+        for (x, y, w, h) in faces:
+            cv2.rectangle(result, (x, y), (x+w, y+h), (255, 0, 0), 2)
+        return result
+    
+    def process_image(self, image_data: bytes, encode_base64: bool = True) -> Dict[str, Any]:
+        """
+        Process an image and detect faces.
+        
+        Args:
+            image_data: Image data as bytes
+            encode_base64: Return processed_image as a base64 string instead of raw JPEG bytes
+            
+        Returns:
+            Dictionary containing detection results
+        """
+        # Convert bytes to numpy array
+        with stage("decode"):
+            nparr = np.frombuffer(image_data, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        # Detect faces
+        with stage("detect"):
+            faces, scale = self.detect_faces_scaled(img)
+        
+        # Draw faces on image
+        with stage("draw"):
+            result_img = self.draw_faces(img, faces)
+        
+        with stage("encode_jpeg"):
+            _, buffer = cv2.imencode('.jpg', result_img)
+            processed_image = buffer.tobytes()
+            if encode_base64:
+                processed_image = base64.b64encode(processed_image).decode('utf-8')
+        
+        return {
+            "faces_detected": len(faces),
+            "face_locations": faces,
+            "scale": scale,
+            "processed_image": processed_image
+        }
+    
+    @staticmethod
+    def create_test_face() -> np.ndarray:
+        """
+        Create a test face pattern for testing.
+        
+        Returns:
+            Test image as numpy array
+        """
+        img = np.zeros((200, 200, 3), dtype=np.uint8)
+        img[:] = (255, 255, 255)  # White background
+        
+        # Draw a circle for the face
+        cv2.circle(img, (100, 100), 60, (200, 200, 200), -1)
+        
+        # Draw eyes
+        cv2.circle(img, (70, 80), 10, (0, 0, 0), -1)  # Left eye
+        cv2.circle(img, (130, 80), 10, (0, 0, 0), -1)  # Right eye
+        
+        # Draw mouth
+        cv2.ellipse(img, (100, 130), (30, 20), 0, 0, 180, (0, 0, 0), 2)
+        
+        return img
+    
+    @staticmethod
+    def create_test_scene(width: int = 640, height: int = 480, num_faces: int = 1,
+                          face_size: int = 0, seed: int = 0) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+        """
+        Create a synthetic photo containing several test face patterns.
+        
+        Faces are laid out on a grid over a smooth textured background so they
+        never overlap.
+        
+        Args:
+            width: Image width
+            height: Image height
+            num_faces: Number of test faces to paste
+            face_size: Side of each face in pixels (0 sizes them to fill the grid)
+            seed: Random seed for the background texture
+            
+        Returns:
+            Tuple of (image, ground-truth face boxes as (x, y, width, height))
+        """
+        rng = np.random.default_rng(seed)
+        texture = rng.integers(90, 170, size=(max(1, height // 8), max(1, width // 8), 3), dtype=np.uint8)
+        img = cv2.resize(texture, (width, height), interpolation=cv2.INTER_LINEAR)
+        if num_faces == 0:
+            return img, []
+        cols = min(num_faces, int(np.ceil(np.sqrt(num_faces * width / height))))
+        rows = int(np.ceil(num_faces / cols))
+        cell_w, cell_h = width // cols, height // rows
+        size = face_size or int(min(cell_w, cell_h) * 0.8)
+        face = cv2.resize(FaceDetector.create_test_face(), (size, size))
+        boxes = []
+        for i in range(num_faces):
+            x = (i % cols) * cell_w + (cell_w - size) // 2
+            y = (i // cols) * cell_h + (cell_h - size) // 2
+            img[y:y + size, x:x + size] = face
+            boxes.append((x, y, size, size))
+        return img, boxes 
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Per-thread Haar cascade detectors.
+
+A cv2.CascadeClassifier must not be used by two threads at once, so a
+single shared detector serialises every request behind a lock even though
+OpenCV releases the GIL while it runs. DetectorPool keeps up to ``size``
+FaceDetectors, each with its own cascade and grayscale buffers, and lends
+one to each thread for the duration of a detection, so that many
+detections run in parallel.
+"""
+import contextlib
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+from .detector import FaceDetector
+from .metrics import metrics
+from .models import load_haar_cascade
+
+detector_pool_in_use = metrics.gauge("detector_pool_in_use", "Pooled face detectors lent to a thread")
+detector_pool_wait = metrics.histogram(
+    "detector_pool_wait_seconds", "Time a thread waited for a free face detector"
+)
+
+
+class DetectorPool:
+    """
+    Bounded pool of FaceDetectors sharing the same parameters.
+
+    Detectors are created on first demand, up to ``size``; threads asking
+    for one while all are lent out wait for one to come back.
+    """
+
+    def __init__(self, size: int = 0, max_side: int = 0, scale_factor: float = 1.1,
+                 min_neighbors: int = 4, min_size: int = 0):
+        """
+        Args:
+            size: Most detectors (0 means one per CPU core)
+            max_side: Detection copy longest side (0 = full resolution)
+            scale_factor: Cascade scaleFactor
+            min_neighbors: Cascade minNeighbors
+            min_size: Smallest face searched for, in pixels of the detection copy
+        """
+        self.size = size or os.cpu_count() or 1
+        self.max_side = max_side
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._idle: List[FaceDetector] = []
+        self._created = 0
+        self._available = threading.Condition()
+
+    def _create(self) -> FaceDetector:
+        return FaceDetector(
+            max_side=self.max_side, scale_factor=self.scale_factor, min_neighbors=self.min_neighbors,
+            min_size=self.min_size, cascade=load_haar_cascade(),
+        )
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[FaceDetector]:
+        """
+        Borrow a detector for the calling thread, waiting if all are in use.
+
+        Yields:
+            A detector no other thread uses until the block exits
+        """
+        start = time.perf_counter()
+        detector = None
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            if self._idle:
+                detector = self._idle.pop()  # most recently used, its buffers are warm
+            else:
+                self._created += 1
+        if detector is None:
+            try:
+                detector = self._create()
+            except Exception:
+                with self._available:
+                    self._created -= 1
+                    self._available.notify()
+                raise
+        detector_pool_wait.observe(time.perf_counter() - start)
+        detector_pool_in_use.inc()
+        try:
+            yield detector
+        finally:
+            detector_pool_in_use.dec()
+            with self._available:
+                self._idle.append(detector)
+                self._available.notify()
+
+    def fill(self) -> None:
+        """Create every detector up front so no request pays for loading a cascade."""
+        while True:
+            with self._available:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                detector = self._create()
+            except Exception:
+                with self._available:
+                    self._created -= 1
+                raise
+            with self._available:
+                self._idle.append(detector)
+                self._available.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._available:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+                "scale_factor": self.scale_factor,
+                "min_neighbors": self.min_neighbors,
+                "min_size": self.min_size,
+                "max_side": self.max_side,
+            }
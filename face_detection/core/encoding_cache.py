@@ -0,0 +1,171 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+
+# Rough per-entry bookkeeping cost (key, tuple, array headers)
+ENTRY_OVERHEAD = 256
+
+
+class EncodingCache:
+    """
+    Content-addressed cache of face locations and encodings.
+
+    Entries are keyed by a hash of the image bytes plus the model parameters
+    used to compute them, and stored as compact int32/float32 arrays along
+    with the detection scale. The memory tier is an LRU bounded by
+    ``max_bytes``; an optional on-disk tier keeps entries across restarts and
+    is shared by all worker processes.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None):
+        """
+        Args:
+            max_bytes: Memory budget for cached arrays
+            disk_dir: Directory for the on-disk tier (None disables it)
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, np.ndarray, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """
+        Look up cached (locations, encodings, scale) in memory, then on disk.
+
+        Args:
+            key: Key from ingest.content_key
+
+        Returns:
+            Tuple of (N x 4 int32 locations, N x 128 float32 encodings, scale) or None
+        """
+        entry = self.get_memory(key)
+        if entry is None:
+            entry = self.load(key)
+        return entry
+
+    def get_memory(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """
+        Look up the memory tier only; cheap enough to call from the event loop.
+
+        A None result is not counted as a miss until ``load`` has checked the disk tier.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+            return entry
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """
+        Look up the disk tier and keep a hit in memory.
+
+        Reads a file, so async callers run it in a thread.
+        """
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._insert(key, entry)
+        return entry
+
+    def put(self, key: str, locations: Any, encodings: Any,
+            scale: float = 1.0) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Store face locations and encodings.
+
+        Writes the disk tier when enabled, so async callers run it in a thread.
+
+        Args:
+            key: Key from ingest.content_key
+            locations: Face locations as (top, right, bottom, left) tuples
+            encodings: 128-d face encodings
+            scale: Downscale factor used for detection
+
+        Returns:
+            The compact entry that was stored
+        """
+        entry = (
+            np.asarray(locations, dtype=np.int32).reshape(-1, 4),
+            np.asarray(encodings, dtype=np.float32).reshape(-1, 128),
+            float(scale),
+        )
+        with self._lock:
+            self._insert(key, entry)
+        self._save(key, entry)
+        return entry
+
+    def _insert(self, key: str, entry: Tuple[np.ndarray, np.ndarray, float]) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._entry_size(old)
+        self._entries[key] = entry
+        self._bytes += self._entry_size(entry)
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._entry_size(evicted)
+            self._counters["evictions"] += 1
+
+    @staticmethod
+    def _entry_size(entry: Tuple[np.ndarray, np.ndarray, float]) -> int:
+        return entry[0].nbytes + entry[1].nbytes + ENTRY_OVERHEAD
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".npz")
+
+    def _load(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return data["locations"], data["encodings"], float(data["scale"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save(self, key: str, entry: Tuple[np.ndarray, np.ndarray, float]) -> None:
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, locations=entry[0], encodings=entry[1], scale=entry[2])
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and memory usage."""
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.disk_dir),
+            }
+
+    def clear(self) -> None:
+        """Drop all in-memory entries."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+encoding_cache = EncodingCache(
+    max_bytes=settings.ENCODING_CACHE_MAX_BYTES,
+    disk_dir=settings.ENCODING_CACHE_DIR or None,
+)
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the process pool backlog is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy, please retry later")
+        self.retry_after = retry_after
+
+
+class ProcessPool:
+    """
+    Process pool for CPU-bound image work with a bounded backlog.
+
+    At most ``workers + max_queue`` tasks are accepted at once. Further
+    submissions fail fast with PoolSaturatedError instead of queueing
+    without limit, which keeps tail latency bounded under load.
+    """
+
+    def __init__(self, workers: int = 0, max_queue: int = 32, retry_after: int = 1):
+        """
+        Args:
+            workers: Number of worker processes (0 means one per CPU core)
+            max_queue: Number of tasks allowed to wait for a free worker
+            retry_after: Seconds suggested to clients when saturated
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Run a picklable function in a worker process.
+
+        Args:
+            fn: Module-level function to execute
+            *args: Positional arguments passed to the function
+
+        Returns:
+            The function's return value
+
+        Raises:
+            PoolSaturatedError: If the backlog is full
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                raise PoolSaturatedError(self.retry_after)
+            self._pending += 1
+        try:
+            executor = self._get_executor()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return current pool utilisation."""
+        pending = self._pending
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": min(pending, self.workers),
+            "queued": max(0, pending - self.workers),
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+process_pool = ProcessPool(
+    workers=settings.WORKER_PROCESSES,
+    max_queue=settings.WORKER_MAX_QUEUE,
+    retry_after=settings.WORKER_RETRY_AFTER,
+)
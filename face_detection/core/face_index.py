@@ -0,0 +1,324 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray, batch: int = 8192) -> np.ndarray:
+    """Index of the nearest centroid for every row, computed in bounded-memory batches."""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), batch):
+        # ||x||^2 is constant per row, so it does not change the argmin
+        dist = centroid_norms[None, :] - 2 * data[start:start + batch] @ centroids.T
+        labels[start:start + batch] = dist.argmin(axis=1)
+    return labels
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Train k-means centroids with Lloyd's algorithm.
+
+    Args:
+        data: N x D float32 training vectors
+        k: Number of centroids
+        iterations: Number of refinement passes
+        seed: Random seed for the initial centroids
+
+    Returns:
+        k x D float32 centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return centroids
+
+
+def _save_array(path: str, name: str, array: np.ndarray) -> None:
+    tmp_path = os.path.join(path, name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, os.path.join(path, name))
+
+
+class FaceIndex:
+    """
+    1:N nearest-neighbour index over face embeddings.
+
+    Embeddings live in one contiguous float32 matrix with precomputed squared
+    norms, so a flat search is a single matrix-vector product. Once the index
+    holds ``ivf_threshold`` vectors it trains coarse k-means partitions
+    (IVF) and only scans the ``nprobe`` partitions closest to the query.
+    Removal swaps the last row into the freed slot to keep storage dense.
+    """
+
+    def __init__(self, dim: int = 128, ivf_threshold: int = 50000, nprobe: int = 8):
+        """
+        Args:
+            dim: Embedding dimension
+            ivf_threshold: Number of vectors at which partitioned search kicks in
+            nprobe: Partitions scanned per query in partitioned mode
+        """
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self._trained_size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._vectors)
+        if size <= capacity and self._vectors.flags.writeable:
+            return
+        new_capacity = max(size, capacity * 2, 1024)
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        norms = np.empty(new_capacity, dtype=np.float32)
+        assign = np.empty(new_capacity, dtype=np.int32)
+        n = len(self._ids)
+        vectors[:n] = self._vectors[:n]
+        norms[:n] = self._norms[:n]
+        assign[:n] = self._assign[:n]
+        self._vectors, self._norms, self._assign = vectors, norms, assign
+
+    def add(self, face_id: str, embedding: Any) -> None:
+        """
+        Add or replace the embedding stored for an id.
+
+        Args:
+            face_id: Identifier (e.g. KYC session id)
+            embedding: Face embedding of length ``dim``
+        """
+        vector = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            if face_id in self._rows:
+                self.remove(face_id)
+            row = len(self._ids)
+            self._reserve(row + 1)
+            self._vectors[row] = vector
+            self._norms[row] = vector @ vector
+            self._ids.append(face_id)
+            self._rows[face_id] = row
+            if self._centroids is not None:
+                self._assign_rows(np.array([row]))
+            size = row + 1
+            # Train once the threshold is reached, retrain each time the index quadruples
+            if size >= self.ivf_threshold and (not self._trained_size or size >= 4 * self._trained_size):
+                self.train()
+
+    def remove(self, face_id: str) -> bool:
+        """
+        Remove an id from the index.
+
+        Args:
+            face_id: Identifier to remove
+
+        Returns:
+            True if the id was present
+        """
+        with self._lock:
+            row = self._rows.pop(face_id, None)
+            if row is None:
+                return False
+            last = len(self._ids) - 1
+            if self._centroids is not None:
+                self._lists[self._assign[row]].remove(row)
+                self._list_arrays.pop(int(self._assign[row]), None)
+            if row != last:
+                moved_id = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._norms[row] = self._norms[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+                if self._centroids is not None:
+                    moved_list = self._lists[self._assign[last]]
+                    moved_list[moved_list.index(last)] = row
+                    self._list_arrays.pop(int(self._assign[last]), None)
+                    self._assign[row] = self._assign[last]
+            self._ids.pop()
+            return True
+
+    def train(self, nlist: Optional[int] = None, sample_size: Optional[int] = None) -> None:
+        """
+        Train the coarse partitions and assign every stored vector.
+
+        Args:
+            nlist: Number of partitions (defaults to about sqrt(n))
+            sample_size: Vectors used for k-means (defaults to 32 per partition)
+        """
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return
+            nlist = min(nlist or int(max(1, np.sqrt(n))), n)
+            sample_size = sample_size or 32 * nlist
+            data = self._vectors[:n]
+            if n > sample_size:
+                sample = np.random.default_rng(0).choice(n, size=sample_size, replace=False)
+                data = data[sample]
+            self._centroids = kmeans(np.ascontiguousarray(data), nlist)
+            labels = _nearest(self._vectors[:n], self._centroids)
+            self._assign[:n] = labels
+            self._lists = [[] for _ in range(nlist)]
+            self._list_arrays = {}
+            for row, label in enumerate(labels.tolist()):
+                self._lists[label].append(row)
+            self._trained_size = n
+
+    def _assign_rows(self, rows: np.ndarray) -> None:
+        labels = _nearest(self._vectors[rows], self._centroids)
+        self._assign[rows] = labels
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            self._lists[label].append(row)
+            self._list_arrays.pop(label, None)
+
+    def _list_rows(self, label: int) -> np.ndarray:
+        # Partitions change rarely compared to searches, so cache them as arrays
+        rows = self._list_arrays.get(label)
+        if rows is None:
+            rows = self._list_arrays[label] = np.array(self._lists[label], dtype=np.int64)
+        return rows
+
+    def search(self, embedding: Any, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Find the k nearest stored embeddings by Euclidean distance.
+
+        Args:
+            embedding: Query embedding of length ``dim``
+            k: Number of neighbours to return
+
+        Returns:
+            List of (id, distance) sorted by increasing distance
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return []
+            if self._centroids is None:
+                rows = None
+                vectors, norms = self._vectors[:n], self._norms[:n]
+            else:
+                centroid_dist = np.einsum("ij,ij->i", self._centroids, self._centroids) - 2 * self._centroids @ query
+                probe = np.argsort(centroid_dist)[:self.nprobe]
+                rows = np.concatenate([self._list_rows(label) for label in probe.tolist()])
+                if len(rows) == 0:
+                    return []
+                vectors, norms = self._vectors[rows], self._norms[rows]
+            # ||v - q||^2 = ||v||^2 + ||q||^2 - 2 v.q
+            dist = norms + query @ query - 2 * (vectors @ query)
+            k = min(k, len(dist))
+            top = np.argpartition(dist, k - 1)[:k]
+            top = top[np.argsort(dist[top])]
+            found = top if rows is None else rows[top]
+            return [
+                (self._ids[row], float(np.sqrt(max(d, 0.0))))
+                for row, d in zip(found.tolist(), dist[top].tolist())
+            ]
+
+    def save(self, path: str) -> None:
+        """
+        Save the index as .npy files that can be memory-mapped on load.
+
+        Each file is written next to its final path and renamed over it, so
+        saving an index loaded from the same directory never truncates the
+        files its arrays are still mapped from.
+
+        Args:
+            path: Directory to write to
+        """
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            n = len(self._ids)
+            _save_array(path, "vectors.npy", self._vectors[:n])
+            _save_array(path, "norms.npy", self._norms[:n])
+            if self._centroids is not None:
+                _save_array(path, "centroids.npy", self._centroids)
+                _save_array(path, "assign.npy", self._assign[:n])
+            meta = {
+                "dim": self.dim,
+                "ids": self._ids,
+                "trained_size": self._trained_size,
+                "partitioned": self._centroids is not None,
+            }
+            tmp_path = os.path.join(path, "meta.json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs: Any) -> "FaceIndex":
+        """
+        Load an index saved with save().
+
+        With ``mmap`` the embedding matrix is mapped copy-on-write, so pages
+        are read lazily and shared between processes until modified.
+
+        Args:
+            path: Directory written by save()
+            mmap: Memory-map the arrays instead of reading them eagerly
+            **kwargs: Extra constructor arguments (ivf_threshold, nprobe)
+
+        Returns:
+            The loaded index
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        mode = "c" if mmap else None
+        index = cls(dim=meta["dim"], **kwargs)
+        index._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        index._norms = np.load(os.path.join(path, "norms.npy"), mmap_mode=mode)
+        index._ids = meta["ids"]
+        index._rows = {face_id: row for row, face_id in enumerate(index._ids)}
+        index._trained_size = meta["trained_size"]
+        index._assign = np.zeros(len(index._ids), dtype=np.int32)
+        if meta["partitioned"]:
+            index._centroids = np.load(os.path.join(path, "centroids.npy"))
+            index._assign = np.load(os.path.join(path, "assign.npy"))
+            index._lists = [[] for _ in range(len(index._centroids))]
+            for row, label in enumerate(index._assign.tolist()):
+                index._lists[label].append(row)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        """Return index size and search mode."""
+        with self._lock:
+            return {
+                "size": len(self._ids),
+                "dim": self.dim,
+                "partitioned": self._centroids is not None,
+                "partitions": len(self._lists),
+                "nprobe": self.nprobe,
+                "memory_bytes": int(self._vectors.nbytes + self._norms.nbytes),
+            }
+
+
+def load_face_index() -> FaceIndex:
+    """Create the enrollment index, loading it from FACE_INDEX_PATH if saved there."""
+    path = settings.FACE_INDEX_PATH
+    kwargs = {"ivf_threshold": settings.FACE_INDEX_IVF_THRESHOLD, "nprobe": settings.FACE_INDEX_NPROBE}
+    if path and os.path.exists(os.path.join(path, "meta.json")):
+        return FaceIndex.load(path, **kwargs)
+    return FaceIndex(**kwargs)
+
+
+face_index = load_face_index()
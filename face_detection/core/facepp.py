@@ -0,0 +1,189 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+CONCURRENCY_ERROR = "CONCURRENCY_LIMIT_EXCEEDED"
+
+
+class FaceppBusyError(Exception):
+    """Raised when the client-side Face++ queue is full or Face++ stays overloaded."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limiter using additive increase / multiplicative decrease.
+
+    The limit grows by roughly one slot per window of successful calls and is
+    cut by ``decrease`` whenever the upstream reports it is overloaded. Callers
+    above the limit wait in a bounded queue.
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 20,
+                 decrease: float = 0.5, max_queue: int = 100):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """Wait for a free slot, failing fast if the queue is full."""
+        async with self._cond:
+            if self.in_flight >= int(self.limit) and self.waiting >= self.max_queue:
+                raise FaceppBusyError("Face++ request queue is full")
+            self.waiting += 1
+            try:
+                await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def release(self, overloaded: bool = False) -> None:
+        """Free a slot and adapt the limit to the call's outcome."""
+        async with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class FaceppClient:
+    """
+    Shared async client for the Face++ REST API.
+
+    Keeps TLS connections alive between calls, limits the number of
+    connections to the Face++ host, queues requests behind an AIMD limiter
+    and retries with jittered exponential backoff when Face++ answers
+    CONCURRENCY_LIMIT_EXCEEDED.
+    """
+
+    def __init__(self, api_key: str, api_secret: str, max_connections: int = 20,
+                 timeout: float = 10.0, initial_concurrency: int = 4,
+                 max_concurrency: int = 20, max_queue: int = 100,
+                 max_retries: int = 3, backoff_base: float = 0.2, backoff_max: float = 2.0):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._http: Optional[httpx.AsyncClient] = None
+        self._limiter: Optional[AIMDLimiter] = None
+        self._counters = {"requests": 0, "retries": 0, "concurrency_errors": 0, "rejected": 0}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._limiter = AIMDLimiter(
+                initial=self.initial_concurrency,
+                max_limit=self.max_concurrency,
+                max_queue=self.max_queue,
+            )
+        return self._http
+
+    async def post(self, url: str, data: Dict[str, Any],
+                   files: Optional[Dict[str, Any]] = None, name: str = "call") -> httpx.Response:
+        """
+        POST to a Face++ endpoint with credentials added.
+
+        Args:
+            url: Face++ endpoint URL
+            data: Form fields for the call
+            files: Multipart files as raw bytes (must be replayable for retries)
+            name: Label used for timing statistics
+
+        Returns:
+            The final Face++ response
+
+        Raises:
+            FaceppBusyError: If the client-side queue is full
+        """
+        http = self._get_http()
+        limiter = self._limiter
+        form = {"api_key": self.api_key, "api_secret": self.api_secret, **data}
+        self._counters["requests"] += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                await limiter.acquire()
+            except FaceppBusyError:
+                self._counters["rejected"] += 1
+                raise
+            overloaded = False
+            start = time.perf_counter()
+            try:
+                resp = await http.post(url, data=form, files=files)
+                overloaded = resp.status_code != 200 and CONCURRENCY_ERROR in resp.text
+            finally:
+                self._record(name, time.perf_counter() - start)
+                await limiter.release(overloaded)
+            if not overloaded:
+                return resp
+            self._counters["concurrency_errors"] += 1
+            if attempt < self.max_retries:
+                self._counters["retries"] += 1
+                # Full jitter keeps retrying clients from synchronising
+                cap = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, cap))
+        return resp
+
+    async def detect(self, url: str, image: bytes, **params: Any) -> httpx.Response:
+        """Run Face++ detect on raw image bytes."""
+        return await self.post(url, params, files={"image_file": image}, name="detect")
+
+    async def compare(self, url: str, files: Optional[Dict[str, bytes]] = None,
+                      **params: Any) -> httpx.Response:
+        """Run Face++ compare with face tokens and/or raw image bytes."""
+        return await self.post(url, params, files=files or None, name="compare")
+
+    def _record(self, name: str, elapsed: float) -> None:
+        t = self._timings.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        ms = elapsed * 1000
+        t["count"] += 1
+        t["total_ms"] += ms
+        t["max_ms"] = max(t["max_ms"], ms)
+        t["last_ms"] = ms
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call counters, per-call timings and limiter state."""
+        limiter = self._limiter
+        timings = {
+            name: {**t, "avg_ms": t["total_ms"] / t["count"]}
+            for name, t in self._timings.items()
+        }
+        return {
+            **self._counters,
+            "timings": timings,
+            "concurrency_limit": int(limiter.limit) if limiter else self.initial_concurrency,
+            "in_flight": limiter.in_flight if limiter else 0,
+            "queue_depth": limiter.waiting if limiter else 0,
+        }
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._limiter = None
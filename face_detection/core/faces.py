@@ -0,0 +1,242 @@
+import asyncio
+import numpy as np
+from typing import Any, Dict, List, Tuple
+from .config import settings
+from .ingest import content_key, decode_image, downscale_image
+from .executor import process_pool
+from .encoding_cache import encoding_cache
+from .models import models
+from .batching import MicroBatcher
+from .singleflight import SingleFlight
+
+# dlib parameters; part of the encoding cache key
+DETECTION_MODEL = "hog"
+UPSAMPLE_TIMES = 1
+NUM_JITTERS = 1
+ENCODING_MODEL = "large"
+
+# Encoding distance below which two faces are considered the same person
+MATCH_THRESHOLD = 0.6
+
+# Concurrent misses for the same image and parameters share one computation
+faces_flight = SingleFlight("faces")
+
+
+async def run_encode_batch(chips: List[np.ndarray]) -> List[np.ndarray]:
+    return await process_pool.run(encode_chips, chips)
+
+
+# Aligned face crops from concurrent requests are encoded in one batched dlib pass per worker process
+faces_batcher = MicroBatcher(
+    "faces",
+    run_encode_batch,
+    max_batch=settings.EMBED_BATCH_MAX,
+    max_wait=settings.EMBED_BATCH_WAIT_MS / 1000,
+    max_concurrency=process_pool.workers,
+    max_queue=(process_pool.workers + process_pool.max_queue) * settings.EMBED_BATCH_MAX,
+    retry_after=process_pool.retry_after,
+)
+
+
+def detect(image_data: bytes, max_side: int = 0) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]], float]:
+    """
+    Decode an image and find its faces with dlib.
+
+    With ``max_side`` set, HOG detection runs on a downscaled copy and the
+    boxes are mapped back to full resolution.
+
+    Args:
+        image_data: Encoded image bytes
+        max_side: Longest side of the detection copy (0 detects at full resolution)
+
+    Returns:
+        Tuple of (full-resolution RGB image, face_locations, scale used for detection)
+    """
+    face_recognition = models.get("face_recognition")
+    image = decode_image(image_data, rgb=True)
+    small, scale = downscale_image(image, max_side)
+    face_locations = face_recognition.face_locations(
+        small, number_of_times_to_upsample=UPSAMPLE_TIMES, model=DETECTION_MODEL
+    )
+    if face_locations and scale != 1.0:
+        height, width = image.shape[:2]
+        face_locations = [
+            (
+                max(0, round(top / scale)),
+                min(width, round(right / scale)),
+                min(height, round(bottom / scale)),
+                max(0, round(left / scale)),
+            )
+            for top, right, bottom, left in face_locations
+        ]
+    return image, face_locations, scale
+
+
+def detect_and_encode(image_data: bytes, max_side: int = 0) -> Tuple[List[Tuple[int, int, int, int]], List[np.ndarray], float]:
+    """
+    Find all faces in an image and compute their encodings.
+
+    Encodings are always computed from the full-resolution pixels inside
+    each box, whatever resolution detection ran at.
+
+    Args:
+        image_data: Encoded image bytes
+        max_side: Longest side of the detection copy (0 detects at full resolution)
+
+    Returns:
+        Tuple of (face_locations, face_encodings, scale used for detection)
+    """
+    image, face_locations, scale = detect(image_data, max_side)
+    if not face_locations:
+        return [], [], scale
+    # face_encodings only samples the pixels inside each box, so passing the
+    # full image encodes full-resolution face crops without copying them
+    face_encodings = models.get("face_recognition").face_encodings(
+        image, face_locations, num_jitters=NUM_JITTERS, model=ENCODING_MODEL
+    )
+    return face_locations, face_encodings, scale
+
+
+def align(image: np.ndarray, face_locations: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+    """
+    Cut the aligned face chips dlib's encoder computes descriptors from.
+
+    The chips are the 150x150 crops, rotated and scaled from the 68-point
+    landmarks, that ``face_encodings`` cuts internally, so encoding them
+    gives the same descriptors. The shape predictor is the
+    face_recognition_models file ``face_encodings`` uses with the large model.
+
+    Args:
+        image: Full-resolution RGB image
+        face_locations: Face boxes in the image
+
+    Returns:
+        One 150x150 RGB chip per box
+    """
+    import dlib
+
+    predictor = models.get("shape_predictor")
+    shapes = dlib.full_object_detections()
+    for top, right, bottom, left in face_locations:
+        shapes.append(predictor(image, dlib.rectangle(left, top, right, bottom)))
+    return [np.asarray(chip) for chip in dlib.get_face_chips(image, shapes, size=150, padding=0.25)]
+
+
+def detect_and_align(image_data: bytes, max_side: int = 0) -> Tuple[List[Tuple[int, int, int, int]], List[np.ndarray], float]:
+    """
+    Find all faces in an image and cut their aligned chips for ``encode_chips``.
+
+    Args:
+        image_data: Encoded image bytes
+        max_side: Longest side of the detection copy (0 detects at full resolution)
+
+    Returns:
+        Tuple of (face_locations, face chips, scale used for detection)
+    """
+    image, face_locations, scale = detect(image_data, max_side)
+    if not face_locations:
+        return [], [], scale
+    return face_locations, align(image, face_locations), scale
+
+
+def encode_chips(chips: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Compute the encodings of aligned face chips, possibly from several
+    requests, with one batched network pass.
+
+    Args:
+        chips: Chips cut by ``align``
+
+    Returns:
+        One encoding per chip
+    """
+    encoder = models.get("face_encoder")
+    return [np.array(descriptor) for descriptor in encoder.compute_face_descriptor(chips, NUM_JITTERS)]
+
+
+def face_distance(encoding1: np.ndarray, encoding2: np.ndarray) -> float:
+    """
+    Euclidean distance between two face encodings.
+
+    Same as ``face_recognition.face_distance``, without importing dlib in the
+    server process.
+    """
+    return float(np.linalg.norm(np.asarray(encoding1) - np.asarray(encoding2)))
+
+
+class FaceNotFoundError(ValueError):
+    """Raised when an image that must contain a face has none."""
+
+
+async def verify_faces(image1: bytes, image2: bytes) -> Dict[str, Any]:
+    """
+    Check whether the first face of each image belongs to the same person.
+
+    Args:
+        image1: Encoded image bytes
+        image2: Encoded image bytes
+
+    Returns:
+        Dict with verified, distance and threshold
+
+    Raises:
+        FaceNotFoundError: If either image has no face
+    """
+    (_, encodings1, _), (_, encodings2, _) = await asyncio.gather(get_faces(image1), get_faces(image2))
+    if not len(encodings1) or not len(encodings2):
+        raise FaceNotFoundError("Could not find faces in one or both images")
+    distance = face_distance(encodings1[0], encodings2[0])
+    return {"verified": distance <= MATCH_THRESHOLD, "distance": distance, "threshold": MATCH_THRESHOLD}
+
+
+def warm_up(image_data: bytes, max_side: int = 0) -> int:
+    """
+    Load the dlib models in this process and run one image through them.
+
+    Returns:
+        Number of faces found
+    """
+    locations, _, _ = detect_and_encode(image_data, max_side)
+    return len(locations)
+
+
+async def get_faces(image_data: bytes) -> Tuple[List[Tuple[int, int, int, int]], np.ndarray, float]:
+    """
+    Return face locations and encodings, from the cache when possible.
+
+    Misses are computed in the process pool and stored in the encoding cache;
+    concurrent misses for the same key share one computation. Each image is
+    detected in its own pool task, and the faces of images detected at the
+    same time are encoded as one batch.
+
+    Args:
+        image_data: Encoded image bytes
+
+    Returns:
+        Tuple of (face_locations, N x 128 float32 encodings, detection scale)
+    """
+    max_side = settings.DETECT_MAX_SIDE
+    key = content_key(
+        image_data,
+        detection_model=DETECTION_MODEL,
+        upsample=UPSAMPLE_TIMES,
+        jitters=NUM_JITTERS,
+        encoding_model=ENCODING_MODEL,
+        max_side=max_side,
+    )
+    # Only the memory tier is checked inline; the disk tier does file I/O
+    entry = encoding_cache.get_memory(key)
+    if entry is None:
+        entry = await asyncio.to_thread(encoding_cache.load, key)
+    if entry is None:
+        async def compute():
+            if settings.EMBED_BATCH_MAX > 1:
+                locations, chips, scale = await process_pool.run(detect_and_align, image_data, max_side)
+                encodings = await asyncio.gather(*(faces_batcher.submit(chip) for chip in chips))
+                result = (locations, list(encodings), scale)
+            else:
+                result = await process_pool.run(detect_and_encode, image_data, max_side)
+            return await asyncio.to_thread(encoding_cache.put, key, *result)
+        entry = await faces_flight.do(key, compute)
+    locations, encodings, scale = entry
+    return [tuple(loc) for loc in locations.tolist()], encodings, scale
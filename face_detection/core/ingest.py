@@ -0,0 +1,245 @@
+import hashlib
+import json
+from io import BytesIO
+from typing import Any, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .config import settings
+from .metrics import observe_image_size, stage
+
+CHUNK_SIZE = 64 * 1024
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+class ImageTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File too large. Maximum size is {max_size} bytes")
+        self.max_size = max_size
+
+
+async def read_upload(file: Any, max_size: Optional[int] = None) -> bytes:
+    """
+    Read an uploaded file into memory, enforcing the size limit while reading.
+
+    Args:
+        file: FastAPI UploadFile
+        max_size: Maximum allowed size in bytes (defaults to settings.MAX_FILE_SIZE)
+
+    Returns:
+        The file contents
+
+    Raises:
+        ImageTooLargeError: If the file is larger than max_size
+    """
+    max_size = max_size or settings.MAX_FILE_SIZE
+    if getattr(file, "size", None) is not None and file.size > max_size:
+        raise ImageTooLargeError(max_size)
+    chunks = []
+    total = 0
+    with stage("read_upload"):
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_size:
+                raise ImageTooLargeError(max_size)
+            chunks.append(chunk)
+    observe_image_size(total)
+    return b"".join(chunks)
+
+
+def content_key(data: bytes, **params: Any) -> str:
+    """
+    Build a key from request content and the parameters that shape the result.
+
+    Used both for the encoding cache and for coalescing identical requests.
+
+    Args:
+        data: Uploaded bytes
+        **params: Parameters that influence the result
+
+    Returns:
+        Hex digest identifying the computation
+    """
+    h = hashlib.sha256(data)
+    for name in sorted(params):
+        h.update(f"|{name}={params[name]}".encode())
+    return h.hexdigest()
+
+
+def decode_image(image_data: bytes, rgb: bool = False) -> np.ndarray:
+    """
+    Decode encoded image bytes straight into a numpy array.
+
+    Args:
+        image_data: Encoded image (JPEG, PNG, ...)
+        rgb: Return RGB channel order (as dlib expects) instead of OpenCV's BGR
+
+    Returns:
+        Decoded image as numpy array
+
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    nparr = np.frombuffer(image_data, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image")
+    if rgb:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img
+
+
+def downscale_image(image: np.ndarray, max_side: int) -> Tuple[np.ndarray, float]:
+    """
+    Shrink an image so its longest side is at most max_side.
+
+    Args:
+        image: Input image as numpy array
+        max_side: Maximum side length in pixels (0 disables downscaling)
+
+    Returns:
+        Tuple of (possibly resized image, scale factor applied)
+    """
+    height, width = image.shape[:2]
+    size, scale = downscaled_size(width, height, max_side)
+    if scale == 1.0:
+        return image, 1.0
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def downscaled_size(width: int, height: int, max_side: int) -> Tuple[Tuple[int, int], float]:
+    """
+    Size an image is shrunk to by downscale_image.
+
+    Args:
+        width: Image width
+        height: Image height
+        max_side: Maximum side length in pixels (0 disables downscaling)
+
+    Returns:
+        Tuple of ((width, height) after downscaling, scale factor applied)
+    """
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return (width, height), 1.0
+    scale = max_side / longest
+    return (max(1, round(width * scale)), max(1, round(height * scale))), scale
+
+
+def decode_gray(image_data: bytes, max_side: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decode an image to grayscale with its longest side at most max_side.
+
+    The original size is read from the header, and JPEGs are decoded at 1/2,
+    1/4 or 1/8 scale when that still leaves at least max_side pixels. OpenCV
+    applies the EXIF orientation while the header size does not, so the
+    returned size is swapped when the decoded image came out rotated.
+
+    Args:
+        image_data: Encoded image
+        max_side: Longest side of the returned copy
+
+    Returns:
+        Tuple of (grayscale image, original (width, height))
+
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    try:
+        width, height = Image.open(BytesIO(image_data)).size
+    except Exception:
+        raise ValueError("Could not decode image")
+    flag, factor = cv2.IMREAD_GRAYSCALE, 1
+    for reduced_factor, reduced_flag in REDUCED_DECODE_FLAGS:
+        if max(width, height) // reduced_factor >= max_side:
+            flag, factor = reduced_flag, reduced_factor
+            break
+    gray = cv2.imdecode(np.frombuffer(image_data, np.uint8), flag)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    decoded_height, decoded_width = gray.shape[:2]
+    as_read = abs(decoded_width - width / factor) + abs(decoded_height - height / factor)
+    transposed = abs(decoded_width - height / factor) + abs(decoded_height - width / factor)
+    if transposed < as_read:
+        width, height = height, width
+    gray, _ = downscale_image(gray, max_side)
+    return gray, (width, height)
+
+
+class MaxBodySizeMiddleware:
+    """
+    ASGI middleware rejecting request bodies above a size limit with 413.
+
+    Requests announcing a larger Content-Length are refused before any of the
+    body is read; chunked bodies are counted while they stream in, so an
+    oversized upload is never fully buffered.
+    """
+
+    def __init__(self, app: Any, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def _reject(self, send: Any) -> None:
+        body = json.dumps({"detail": str(ImageTooLargeError(self.max_size))}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_size:
+                await self._reject(send)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Any:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    exceeded = True
+                    raise ImageTooLargeError(self.max_size)
+            return message
+
+        async def guarded_send(message: Any) -> None:
+            nonlocal response_started
+            if exceeded:
+                # Drop whatever error response the app built for the aborted body
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send)
+
@@ -0,0 +1,485 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from .config import settings
+from .executor import PoolSaturatedError
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Named priorities accepted by the API; higher runs first
+PRIORITIES = {"high": 10, "normal": 5, "low": 0}
+
+# Finished jobs keep these states until their result expires
+FINISHED = ("done", "failed")
+
+Artifact = Union[bytes, List[bytes]]
+# (metadata, artifacts, artifact media type)
+JobResult = Tuple[Dict[str, Any], Dict[str, Artifact], str]
+JobHandler = Callable[[Dict[str, Any], Dict[str, bytes]], Awaitable[JobResult]]
+
+jobs_total = metrics.counter("jobs_total", "Jobs by kind and event", ("kind", "event"))
+job_wait = metrics.histogram("job_queue_wait_seconds", "Time jobs spent queued before a worker picked them up", ("kind",))
+job_run = metrics.histogram("job_run_seconds", "Time to run a job once picked up", ("kind",))
+
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already queued."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full, please retry later")
+        self.retry_after = retry_after
+
+
+class JobFailedError(Exception):
+    """Raised by job handlers for errors that retrying cannot fix."""
+
+
+class JobQueue:
+    """
+    Durable job queue in SQLite, shared by every worker process on a host.
+
+    Jobs carry their input blobs, a kind, JSON parameters and a priority.
+    Workers claim the highest-priority, oldest queued job under a lease;
+    jobs whose lease runs out (the process running them died) are queued
+    again up to ``max_attempts`` times. Finished jobs keep their result and
+    output blobs for ``result_ttl`` seconds.
+    """
+
+    def __init__(self, path: str, result_ttl: int = 3600, lease: int = 300, max_queued: int = 1000,
+                 max_attempts: int = 3, retry_after: int = 5):
+        """
+        Args:
+            path: SQLite database file
+            result_ttl: Seconds a finished job and its result are kept
+            lease: Seconds a claimed job may run before it is considered abandoned
+            max_queued: Queued jobs accepted before submissions are refused
+            max_attempts: Claims allowed per job before it is failed
+            retry_after: Seconds suggested to clients when the queue is full
+        """
+        self.path = path
+        self.retry_after = retry_after
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Opened lazily, so importing the app creates no database and no
+        # connection is ever carried over a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_until REAL,
+                    expires_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority DESC, created_at);
+                CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+                CREATE TABLE IF NOT EXISTS job_blobs (
+                    job_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (job_id, role, name, idx)
+                );
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+    def submit(self, kind: str, params: Dict[str, Any], inputs: Dict[str, bytes], priority: int = 5) -> str:
+        """
+        Queue a job.
+
+        Args:
+            kind: Job kind, selecting the handler that runs it
+            params: JSON-serializable handler parameters
+            inputs: Input blobs by name
+            priority: Higher runs first
+
+        Returns:
+            The job id
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+        """
+        job_id = uuid.uuid4().hex
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFullError(self.retry_after)
+            conn.execute(
+                "INSERT INTO jobs (job_id, kind, priority, status, params, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, priority, json.dumps(params), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO job_blobs (job_id, role, name, idx, data) VALUES (?, 'input', ?, 0, ?)",
+                [(job_id, name, data) for name, data in inputs.items()],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Take the next job to run, or None when the queue is empty.
+
+        Returns:
+            Job row plus ``inputs`` (name -> bytes)
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id, kind, params, created_at FROM jobs WHERE status = 'queued' "
+                "ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job_id, kind, params, created_at = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE job_id = ?",
+                (now, now + self.lease, job_id),
+            )
+            inputs = dict(conn.execute(
+                "SELECT name, data FROM job_blobs WHERE job_id = ? AND role = 'input'", (job_id,)
+            ).fetchall())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "params": json.loads(params),
+            "inputs": inputs,
+            "queued_for": now - created_at,
+        }
+
+    def complete(self, job_id: str, metadata: Dict[str, Any], artifacts: Dict[str, Artifact],
+                 media_type: str) -> None:
+        """Store a job's result, replacing its inputs with its output blobs."""
+        layout = {name: len(value) if isinstance(value, list) else None for name, value in artifacts.items()}
+        blobs = []
+        for name, value in artifacts.items():
+            for idx, data in enumerate(value if isinstance(value, list) else [value]):
+                blobs.append((job_id, name, idx, data))
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM job_blobs WHERE job_id = ?", (job_id,))
+            conn.executemany(
+                "INSERT INTO job_blobs (job_id, role, name, idx, data) VALUES (?, 'output', ?, ?, ?)", blobs
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, finished_at = ?, expires_at = ?, lease_until = NULL "
+                "WHERE job_id = ?",
+                (json.dumps({"metadata": metadata, "artifacts": layout, "media_type": media_type}),
+                 now, now + self.result_ttl, job_id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def fail(self, job_id: str, error: str) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM job_blobs WHERE job_id = ?", (job_id,))
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, expires_at = ?, lease_until = NULL "
+            "WHERE job_id = ?",
+            (error, now, now + self.result_ttl, job_id),
+        )
+
+    def release(self, job_id: str) -> None:
+        """Put a claimed job back in the queue without counting the attempt."""
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, lease_until = NULL, attempts = attempts - 1 "
+            "WHERE job_id = ?",
+            (job_id,),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a job's status, without its blobs.
+
+        Queued jobs include their ``queue_position`` (0 = next to run).
+        """
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT job_id, kind, priority, status, error, attempts, created_at, started_at, finished_at, "
+            "expires_at, result FROM jobs WHERE job_id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (job_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "kind", "priority", "status", "error", "attempts", "created_at", "started_at",
+                "finished_at", "expires_at")
+        job = {key: value for key, value in zip(keys, row) if value is not None}
+        if job["status"] == "queued":
+            job["queue_position"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (job["priority"], job["priority"], job["created_at"]),
+            ).fetchone()[0]
+        if row[-1] is not None:
+            job["result"] = json.loads(row[-1])
+        return job
+
+    def result(self, job: Dict[str, Any]) -> JobResult:
+        """Load the metadata and artifacts of a finished job returned by get()."""
+        result = job["result"]
+        rows = self._conn().execute(
+            "SELECT name, idx, data FROM job_blobs WHERE job_id = ? AND role = 'output' ORDER BY name, idx",
+            (job["job_id"],),
+        ).fetchall()
+        artifacts: Dict[str, Artifact] = {
+            name: [] if count is not None else b"" for name, count in result["artifacts"].items()
+        }
+        for name, _, data in rows:
+            if isinstance(artifacts[name], list):
+                artifacts[name].append(data)
+            else:
+                artifacts[name] = data
+        return result["metadata"], artifacts, result["media_type"]
+
+    def delete(self, job_id: str) -> bool:
+        """Cancel a queued job or drop a finished one; running jobs are left alone."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE job_id = ? AND status != 'running'", (job_id,)
+            ).rowcount
+            if deleted:
+                conn.execute("DELETE FROM job_blobs WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return bool(deleted)
+
+    def sweep(self) -> Dict[str, int]:
+        """Requeue or fail jobs whose lease expired and delete expired results."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Abandoned by its worker too many times', "
+                "finished_at = ?, expires_at = ?, lease_until = NULL "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now + self.result_ttl, now, self.max_attempts),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, lease_until = NULL "
+                "WHERE status = 'running' AND lease_until < ?",
+                (now,),
+            ).rowcount
+            conn.execute(
+                "DELETE FROM job_blobs WHERE job_id IN (SELECT job_id FROM jobs WHERE expires_at < ?)", (now,)
+            )
+            expired = conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,)).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {"requeued": requeued, "failed": failed, "expired": expired}
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in ("queued", "running", *FINISHED)} | dict(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = self._conn().execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            "jobs": self.counts(),
+            "oldest_queued_age_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "max_queued": self.max_queued,
+            "result_ttl": self.result_ttl,
+            "path": self.path,
+        }
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class JobRunner:
+    """
+    Runs queued jobs in this process.
+
+    ``concurrency`` loops claim jobs and await their handlers; handlers hand
+    CPU-bound work to the process pool, so the loops only schedule. Every
+    server worker runs its own runner against the shared queue, and queue
+    calls run in threads so sqlite never blocks the event loop. Jobs
+    submitted in this process start immediately, others within
+    ``poll_interval``.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int = 2, poll_interval: float = 0.5,
+                 sweep_interval: float = 30.0):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Set the coroutine function running jobs of ``kind``."""
+        self.handlers[kind] = handler
+
+    async def submit(self, kind: str, params: Dict[str, Any], inputs: Dict[str, bytes], priority: int) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind {kind}")
+        job_id = await asyncio.to_thread(self.queue.submit, kind, params, inputs, priority)
+        jobs_total.inc(kind, "submitted")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work_loop()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def wait(self, job_id: str, timeout: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        Return a job's status, waiting up to ``timeout`` seconds for it to finish (long-poll).
+
+        Returns:
+            The job as returned by JobQueue.get, or None if it does not exist
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self.queue.get, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                self._finished.pop(job_id, None)
+                return job
+            # Woken at once for jobs finished here; jobs run by other processes are polled
+            event = self._finished.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify(self, job_id: str) -> None:
+        event = self._finished.get(job_id)
+        if event is not None:
+            event.set()
+
+    async def _work_loop(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim)
+            except sqlite3.Error:
+                logger.exception("Could not claim a job")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id, kind = job["job_id"], job["kind"]
+        job_wait.observe(job["queued_for"], kind)
+        start = time.perf_counter()
+        try:
+            metadata, artifacts, media_type = await self.handlers[kind](job["params"], job["inputs"])
+        except PoolSaturatedError as e:
+            # Interactive requests have the pool; try again shortly
+            await asyncio.to_thread(self.queue.release, job_id)
+            jobs_total.inc(kind, "deferred")
+            await asyncio.sleep(e.retry_after)
+            return
+        except asyncio.CancelledError:
+            # Shielded so the job is handed back even though this task is being cancelled
+            await asyncio.shield(asyncio.to_thread(self.queue.release, job_id))
+            raise
+        except Exception as e:
+            if not isinstance(e, JobFailedError):
+                logger.exception("Job %s (%s) failed", job_id, kind)
+            await asyncio.to_thread(self.queue.fail, job_id, str(e) or type(e).__name__)
+            jobs_total.inc(kind, "failed")
+        else:
+            await asyncio.to_thread(self.queue.complete, job_id, metadata, artifacts, media_type)
+            jobs_total.inc(kind, "done")
+        job_run.observe(time.perf_counter() - start, kind)
+        self._notify(job_id)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                swept = await asyncio.to_thread(self.queue.sweep)
+            except sqlite3.Error:
+                continue
+            if swept["requeued"] or swept["failed"]:
+                logger.warning("Jobs with expired leases: %d requeued, %d failed", swept["requeued"], swept["failed"])
+
+
+job_queue = JobQueue(
+    settings.JOB_DB_PATH,
+    result_ttl=settings.JOB_RESULT_TTL,
+    lease=settings.JOB_LEASE,
+    max_queued=settings.JOB_MAX_QUEUED,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+)
+job_runner = JobRunner(
+    job_queue,
+    concurrency=settings.JOB_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+)
+metrics.gauge(
+    "jobs_in_queue", "Jobs in the durable queue by status", ("status",),
+    fn=lambda: {(status,): count for status, count in job_queue.counts().items()}
+)
@@ -0,0 +1,425 @@
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .. import STARTED_AT
+
+# Upper bounds in seconds; wide enough for both local OpenCV work and Face++ round trips
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds in bytes for uploaded images
+SIZE_BUCKETS = (16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Monitoring endpoints that do not count as the first successful request
+PROBE_ENDPOINTS = {"/", "/metrics", "/ready", "unmatched"}
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down.
+
+    With ``fn`` set the gauge is read when metrics are rendered: ``fn``
+    returns either a number or, for labelled gauges, a dict mapping label
+    value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], Any]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.fn = fn
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> Iterator[str]:
+        if self.fn is not None:
+            value = self.fn()
+            values = list(value.items()) if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets, per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [per-bucket counts, sum, count]
+        self._values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of metrics rendered in the Prometheus text format.
+
+    Metrics are created on first use and returned by name afterwards, so any
+    module can declare the metrics it records without a central list.
+    Values are per process: with several server workers, scrape each one or
+    aggregate in Prometheus.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              fn: Optional[Callable[[], Any]] = None) -> Gauge:
+        gauge = self._get_or_create(Gauge, name, documentation, labelnames)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by endpoint", ("method", "endpoint", "status")
+)
+requests_in_flight = metrics.gauge("http_requests_in_flight", "Requests currently being handled")
+stage_duration = metrics.histogram(
+    "request_stage_duration_seconds", "Time spent per request in each stage, by endpoint", ("endpoint", "stage")
+)
+image_size = metrics.histogram(
+    "request_image_bytes", "Size of uploaded images, by endpoint", ("endpoint",), buckets=SIZE_BUCKETS
+)
+
+
+def process_rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+def process_memory(pid: Any = "self") -> Optional[Dict[str, int]]:
+    """
+    Resident memory of a process split by sharing (Linux only).
+
+    ``pss`` counts shared pages divided by the number of processes sharing
+    them, so summing it over the server workers gives their real footprint.
+
+    Args:
+        pid: Process id, or "self"
+
+    Returns:
+        Dict of rss, pss, shared and private bytes, or None where unavailable
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                parts = rest.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[name] = int(parts[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+metrics.gauge("process_resident_memory_bytes", "Resident memory size in bytes", fn=process_rss_bytes)
+metrics.gauge(
+    "process_memory_bytes", "Resident memory by sharing: rss, pss, shared and private", ("kind",),
+    fn=lambda: {(kind,): value for kind, value in (process_memory() or {}).items()}
+)
+metrics.gauge("process_cpu_seconds", "User and system CPU time spent by this process", fn=_cpu_seconds)
+
+
+class StartupTimes:
+    """Import time and time to the first successful request, from package import."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.import_seconds: Optional[float] = None
+        self.first_success_seconds: Optional[float] = None
+
+    def record_import(self) -> None:
+        """Call once the application module has finished importing."""
+        self.import_seconds = time.perf_counter() - self.started
+
+    def record_response(self, status: int) -> None:
+        if self.first_success_seconds is None and status < 400:
+            self.first_success_seconds = time.perf_counter() - self.started
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 1) if seconds is not None else None
+        return {"import_ms": ms(self.import_seconds), "first_success_ms": ms(self.first_success_seconds)}
+
+
+startup = StartupTimes(STARTED_AT)
+metrics.gauge("app_import_seconds", "Time to import the application",
+              fn=lambda: startup.import_seconds or 0.0)
+metrics.gauge("app_first_success_seconds", "Time from import to the first successful response (0 until then)",
+              fn=lambda: startup.first_success_seconds or 0.0)
+
+
+class RequestStages:
+    """Stage timings and image sizes collected while one request is handled."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.image_sizes: List[int] = []
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Format the stages as a Server-Timing header value (milliseconds)."""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestStages]] = ContextVar("request_stages", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a block as one stage of the current request.
+
+    Inside a request the time is added to that request's stages (repeated
+    and concurrent stages of the same name are summed) and recorded per
+    endpoint once the request completes. Outside a request it is recorded
+    immediately under the endpoint "background".
+
+    Args:
+        name: Stage name, e.g. "facepp_compare"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record = _current.get()
+        if record is not None:
+            record.add(name, elapsed)
+        else:
+            stage_duration.observe(elapsed, "background", name)
+
+
+def observe_image_size(size: int) -> None:
+    """Record the size of an uploaded image for the current request."""
+    record = _current.get()
+    if record is not None:
+        record.image_sizes.append(size)
+    else:
+        image_size.observe(size, "background")
+
+
+def _endpoint(scope: Dict[str, Any], root_path: str) -> str:
+    # The router stores the matched route in the scope; use its path template
+    # so path parameters do not create a label value per id. Routes of mounted
+    # routers are relative to the mount, whose prefix ends up in root_path.
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    return scope.get("root_path", "")[len(root_path):] + path
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency, in-flight requests and stages.
+
+    Time spent waiting for the request body is recorded as the
+    "receive_body" stage. With ``stage_header`` set, every response carries
+    a Server-Timing header with the stage breakdown of its request.
+    """
+
+    def __init__(self, app: Any, stage_header: bool = False):
+        self.app = app
+        self.stage_header = stage_header
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root_path = scope.get("root_path", "")
+        record = RequestStages()
+        token = _current.set(record)
+        start = time.perf_counter()
+        status = 500
+
+        async def timed_receive() -> Any:
+            receive_start = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                record.add("receive_body", time.perf_counter() - receive_start)
+            return message
+
+        async def instrumented_send(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.stage_header:
+                    value = record.server_timing(time.perf_counter() - start)
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"server-timing", value.encode())]}
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, timed_receive, instrumented_send)
+        finally:
+            requests_in_flight.dec()
+            _current.reset(token)
+            endpoint = _endpoint(scope, root_path)
+            if endpoint not in PROBE_ENDPOINTS:
+                startup.record_response(status)
+            request_duration.observe(time.perf_counter() - start, scope["method"], endpoint, str(status))
+            for name, seconds in record.stages.items():
+                stage_duration.observe(seconds, endpoint, name)
+            for size in record.image_sizes:
+                image_size.observe(size, endpoint)
@@ -0,0 +1,143 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Lazily loaded models and the state of their warm-up.
+
+    Models are registered with a loader and only loaded the first time they
+    are requested, so importing the API stays cheap and processes that never
+    need a model (e.g. the server process for dlib, which only runs in the
+    worker pool) never pay for it. Each process has its own registry.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._descriptions: Dict[str, str] = {}
+        self._models: Dict[str, Any] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._warmups: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, loader: Callable[[], Any], description: str = "") -> None:
+        """
+        Register a model loader.
+
+        Args:
+            name: Name the model is requested by
+            loader: Zero-argument function returning the loaded model
+            description: What the model is, for the status report
+        """
+        self._loaders[name] = loader
+        self._descriptions[name] = description
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"state": "cold"}
+
+    def get(self, name: str) -> Any:
+        """
+        Return a model, loading it on first use.
+
+        Concurrent first requests wait for a single load.
+
+        Raises:
+            KeyError: If no model of that name is registered
+        """
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name not in self._models:
+                self._status[name] = {"state": "loading"}
+                start = time.perf_counter()
+                try:
+                    model = self._loaders[name]()
+                except Exception as e:
+                    self._status[name] = {"state": "failed", "error": str(e)}
+                    raise
+                self._status[name] = {"state": "ready", "load_ms": round((time.perf_counter() - start) * 1000, 1)}
+                self._models[name] = model
+        return self._models[name]
+
+    def expect_warmups(self, names: Iterable[str]) -> None:
+        """Mark warm-ups as pending, so readiness is reported false until they ran."""
+        for name in names:
+            self._warmups[name] = {"state": "pending"}
+
+    async def warm_up(self, name: str, fn: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Run one warm-up and record its outcome.
+
+        Args:
+            name: Pipeline being warmed up
+            fn: Coroutine function pushing a test input through the pipeline
+
+        Returns:
+            Whether the warm-up succeeded
+        """
+        self._warmups[name] = {"state": "running"}
+        start = time.perf_counter()
+        try:
+            await fn()
+        except Exception as e:
+            logger.exception("Warm-up of %s failed", name)
+            self._warmups[name] = {"state": "failed", "error": str(e)}
+            return False
+        self._warmups[name] = {"state": "ready", "ms": round((time.perf_counter() - start) * 1000, 1)}
+        return True
+
+    @property
+    def ready(self) -> bool:
+        """True once every expected warm-up has succeeded."""
+        return all(w["state"] == "ready" for w in self._warmups.values())
+
+    def status(self) -> Dict[str, Any]:
+        """Return the state of every model and warm-up in this process."""
+        return {
+            "ready": self.ready,
+            "models": {
+                name: {**self._status[name], "description": self._descriptions[name]}
+                for name in self._loaders
+            },
+            "warmup": dict(self._warmups),
+        }
+
+
+def load_haar_cascade() -> cv2.CascadeClassifier:
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    if cascade.empty():
+        raise RuntimeError("Could not load the Haar cascade")
+    return cascade
+
+
+def load_shape_predictor() -> Any:
+    import dlib
+    import face_recognition_models
+    return dlib.shape_predictor(face_recognition_models.pose_predictor_model_location())
+
+
+def load_face_encoder() -> Any:
+    import dlib
+    import face_recognition_models
+    return dlib.face_recognition_model_v1(face_recognition_models.face_recognition_model_location())
+
+
+models = ModelRegistry()
+models.register("haar_cascade", load_haar_cascade, "OpenCV frontal face Haar cascade")
+# face_recognition loads all of its dlib models when imported
+models.register(
+    "face_recognition",
+    lambda: importlib.import_module("face_recognition"),
+    "dlib HOG/CNN face detectors, shape predictors and ResNet face encoder",
+)
+# The same model files, loaded directly for the batched align/encode path
+models.register("shape_predictor", load_shape_predictor, "dlib 68-point shape predictor")
+models.register("face_encoder", load_face_encoder, "dlib ResNet face encoder")
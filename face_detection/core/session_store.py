@@ -0,0 +1,279 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .config import settings
+
+
+class SessionStore:
+    """
+    Interface for KYC session storage.
+
+    Session records hold the small verification state. Raw Face++ debug
+    payloads are stored separately and only when ``store_debug`` is set, so
+    they never inflate the records that every request reads.
+    """
+
+    def __init__(self, ttl: int = 3600, store_debug: bool = True):
+        """
+        Args:
+            ttl: Seconds a session stays valid after its last write
+            store_debug: Keep raw Face++ responses for debugging
+        """
+        self.ttl = ttl
+        self.store_debug = store_debug
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the session record, or None if missing or expired."""
+        raise NotImplementedError
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        """Create or replace a session record."""
+        raise NotImplementedError
+
+    def update(self, session_id: str, **fields: Any) -> bool:
+        """Merge fields into an existing session; returns False if it does not exist."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session and its debug payloads."""
+        raise NotImplementedError
+
+    def put_debug(self, session_id: str, name: str, payload: Any) -> None:
+        """Store a raw debug payload for a session (no-op unless store_debug is set)."""
+        raise NotImplementedError
+
+    def get_debug(self, session_id: str) -> Dict[str, Any]:
+        """Return all debug payloads stored for a session."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Return backend name and entry counts."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release resources held by the store."""
+
+
+class MemorySessionStore(SessionStore):
+    """In-process session store with TTL expiry and LRU eviction above max_entries."""
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 10000, store_debug: bool = True):
+        super().__init__(ttl, store_debug)
+        self.max_entries = max_entries
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._debug: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.time():
+                self._remove(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return dict(data)
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._sessions[session_id] = (time.time() + self.ttl, dict(data))
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_entries:
+                oldest, _ = self._sessions.popitem(last=False)
+                self._debug.pop(oldest, None)
+                self._evictions += 1
+
+    def update(self, session_id: str, **fields: Any) -> bool:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] < time.time():
+                return False
+            data = {**entry[1], **fields}
+            self._sessions[session_id] = (time.time() + self.ttl, data)
+            self._sessions.move_to_end(session_id)
+            return True
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        self._debug.pop(session_id, None)
+
+    def put_debug(self, session_id: str, name: str, payload: Any) -> None:
+        if not self.store_debug:
+            return
+        with self._lock:
+            if session_id in self._sessions:
+                self._debug.setdefault(session_id, {})[name] = payload
+
+    def get_debug(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._debug.get(session_id, {}))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_entries": self.max_entries,
+                "evictions": self._evictions,
+                "ttl": self.ttl,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite-backed session store shared by every worker process on a host.
+
+    The database runs in WAL mode so readers never block the writer, lookups
+    go through the primary key, expiry uses an index on ``expires_at``, and a
+    background thread periodically deletes expired sessions.
+    """
+
+    def __init__(self, path: str, ttl: int = 3600, store_debug: bool = True,
+                 sweep_interval: float = 60.0):
+        super().__init__(ttl, store_debug)
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._closed = threading.Event()
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+            CREATE TABLE IF NOT EXISTS session_debug (
+                session_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (session_id, name)
+            );
+            """
+        )
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?",
+            (session_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(data), time.time() + self.ttl),
+        )
+
+    def update(self, session_id: str, **fields: Any) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+            data = {**json.loads(row[0]), **fields}
+            conn.execute(
+                "UPDATE sessions SET data = ?, expires_at = ? WHERE session_id = ?",
+                (json.dumps(data), time.time() + self.ttl, session_id),
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id: str) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM session_debug WHERE session_id = ?", (session_id,))
+
+    def put_debug(self, session_id: str, name: str, payload: Any) -> None:
+        if not self.store_debug:
+            return
+        self._conn().execute(
+            "INSERT OR REPLACE INTO session_debug (session_id, name, payload) VALUES (?, ?, ?)",
+            (session_id, name, json.dumps(payload)),
+        )
+
+    def get_debug(self, session_id: str) -> Dict[str, Any]:
+        rows = self._conn().execute(
+            "SELECT name, payload FROM session_debug WHERE session_id = ?", (session_id,)
+        ).fetchall()
+        return {name: json.loads(payload) for name, payload in rows}
+
+    def sweep(self) -> int:
+        """Delete expired sessions and their debug payloads; returns the number removed."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "DELETE FROM session_debug WHERE session_id IN "
+            "(SELECT session_id FROM sessions WHERE expires_at < ?)",
+            (now,),
+        )
+        return conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,)).rowcount
+
+    def _sweep_loop(self) -> None:
+        while not self._closed.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        count = self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at >= ?", (time.time(),)
+        ).fetchone()[0]
+        return {"backend": "sqlite", "sessions": count, "path": self.path, "ttl": self.ttl}
+
+    def close(self) -> None:
+        self._closed.set()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by SESSION_BACKEND."""
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(
+            settings.SESSION_DB_PATH,
+            ttl=settings.SESSION_TTL,
+            store_debug=settings.SESSION_STORE_DEBUG,
+            sweep_interval=settings.SESSION_SWEEP_INTERVAL,
+        )
+    if settings.SESSION_BACKEND != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {settings.SESSION_BACKEND}")
+    return MemorySessionStore(
+        ttl=settings.SESSION_TTL,
+        max_entries=settings.SESSION_MAX_ENTRIES,
+        store_debug=settings.SESSION_STORE_DEBUG,
+    )
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from .metrics import metrics
+
+T = TypeVar("T")
+
+coalesced_requests = metrics.counter(
+    "singleflight_requests_total",
+    "Calls through a singleflight group; result=coalesced calls shared an identical in-flight computation",
+    ("group", "result"),
+)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one computation.
+
+    The first call for a key runs the computation; calls with the same key
+    arriving while it is in flight wait for it and receive the same result
+    (or exception). The computation runs in its own task, so a caller that
+    disconnects does not cancel it for the others. Results are shared between
+    callers and must not be mutated.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Group name used in metrics
+        """
+        self.name = name
+        self._calls: Dict[str, "asyncio.Task[Any]"] = {}
+        self._in_flight = metrics.gauge(
+            "singleflight_in_flight", "Distinct computations in flight per singleflight group", ("group",)
+        )
+        self._in_flight.set(0, name)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run ``fn`` unless an identical call is already in flight, then await its result.
+
+        Args:
+            key: Identity of the computation, e.g. from ingest.content_key
+            fn: Coroutine function performing the computation
+
+        Returns:
+            The result of the (possibly shared) computation
+        """
+        task = self._calls.get(key)
+        if task is None:
+            coalesced_requests.inc(self.name, "leader")
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._in_flight.inc(self.name)
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            coalesced_requests.inc(self.name, "coalesced")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        del self._calls[key]
+        self._in_flight.dec(self.name)
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,142 @@
+"""
+Face tracking over a stream of video frames.
+
+Running the Haar cascade over every frame of a camera stream is wasteful:
+faces barely move between frames. FaceTracker runs the full cascade only
+every ``detect_every`` frames. In between, each face is followed by
+matching the patch it was detected in against a window around its last
+position, both shrunk to a few dozen pixels, which costs a small fraction
+of a full detection. A face whose best match scores below ``min_score``
+counts as lost and triggers a full detection on the same frame.
+"""
+import time
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from .detector_pool import DetectorPool
+from .ingest import decode_gray
+from .metrics import metrics
+
+Box = Tuple[int, int, int, int]
+
+# Width in pixels faces are shrunk to for template matching
+TEMPLATE_WIDTH = 32
+
+tracking_frames = metrics.counter(
+    "tracking_frames_total", "Streamed frames by outcome (detect, track, dropped, invalid)", ("result",)
+)
+tracking_frame_time = metrics.histogram(
+    "tracking_frame_seconds", "Time to decode and process one streamed frame", ("mode",)
+)
+tracking_streams = metrics.gauge("tracking_streams", "Open face tracking streams")
+
+
+def iou(a: Box, b: Box) -> float:
+    """Intersection over union of two (x, y, w, h) boxes."""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union else 0.0
+
+
+class FaceTracker:
+    """Per-stream tracking state; not safe to share between streams."""
+
+    def __init__(self, detectors: DetectorPool, detect_every: int = 10, max_side: int = 320,
+                 roi_margin: float = 0.5, min_score: float = 0.6):
+        """
+        Args:
+            detectors: Pool lending the detector for full detections
+            detect_every: Run a full detection every this many frames
+            max_side: Frames are processed downscaled to this longest side
+            roi_margin: Search window around a tracked face, as a fraction of its size per side
+            min_score: Lowest normalized correlation accepted as the same face
+        """
+        self.detectors = detectors
+        self.detect_every = detect_every
+        self.max_side = max_side
+        self.roi_margin = roi_margin
+        self.min_score = min_score
+        self.frames = 0
+        self.tracks: List[Dict[str, Any]] = []  # id, box in downscaled pixels and template
+        self._next_id = 0
+
+    def _detect(self, gray: np.ndarray) -> None:
+        """Full detection; faces overlapping a previous track keep its id."""
+        tracks = []
+        previous = list(self.tracks)
+        with self.detectors.acquire() as detector:
+            boxes = detector.detect_gray(gray, min_size=24)
+        for box in boxes:
+            x, y, w, h = box
+            factor = TEMPLATE_WIDTH / w
+            template = cv2.resize(gray[y:y + h, x:x + w], None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            match = max(previous, key=lambda track: iou(track["box"], box), default=None)
+            if match is not None and iou(match["box"], box) > 0.3:
+                previous.remove(match)
+                track_id = match["id"]
+            else:
+                track_id = self._next_id
+                self._next_id += 1
+            tracks.append({"id": track_id, "box": box, "factor": factor, "template": template})
+        self.tracks = tracks
+
+    def _track(self, gray: np.ndarray) -> bool:
+        """Follow each face near its last position; returns False if one was lost."""
+        height, width = gray.shape[:2]
+        for track in self.tracks:
+            x, y, w, h = track["box"]
+            mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+            factor, template = track["factor"], track["template"]
+            window = cv2.resize(gray[y0:y1, x0:x1], None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+                return False
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (tx, ty) = cv2.minMaxLoc(scores)
+            if score < self.min_score:
+                return False
+            track["box"] = (x0 + round(tx / factor), y0 + round(ty / factor), w, h)
+        return True
+
+    def update(self, image_data: bytes) -> Dict[str, Any]:
+        """
+        Process the next frame.
+
+        Args:
+            image_data: Encoded frame (JPEG, PNG, ...)
+
+        Returns:
+            Dict with mode ("detect" for a full detection, otherwise "track")
+            and faces as id, x, y, w, h in frame pixels
+
+        Raises:
+            ValueError: If the frame cannot be decoded
+        """
+        start = time.perf_counter()
+        gray, (width, height) = decode_gray(image_data, self.max_side)
+        scale = gray.shape[1] / width
+        mode = "track"
+        # New faces are picked up by the periodic detection
+        if self.frames % self.detect_every == 0 or (self.tracks and not self._track(gray)):
+            mode = "detect"
+            self._detect(gray)
+        self.frames += 1
+        tracking_frames.inc(mode)
+        tracking_frame_time.observe(time.perf_counter() - start, mode)
+        return {
+            "mode": mode,
+            "width": width,
+            "height": height,
+            "faces": [
+                {
+                    "id": track["id"],
+                    **dict(zip(("x", "y", "w", "h"), (round(v / scale) for v in track["box"]))),
+                }
+                for track in self.tracks
+            ],
+        }
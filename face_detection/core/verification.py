@@ -0,0 +1,455 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from .config import settings
+from .facepp import FaceppBusyError, FaceppClient, CONCURRENCY_ERROR
+from .faces import FaceNotFoundError, face_distance, get_faces
+from .ingest import content_key
+from .metrics import metrics, stage
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+VERIFICATION_BACKENDS = ("remote", "local", "hybrid")
+
+# Face++ compare confidence treated as a match, regardless of Face++'s own thresholds
+FACEPP_MATCH_THRESHOLD = 80
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+verifications = metrics.counter(
+    "kyc_verifications_total",
+    "Selfie verifications by the backend that decided them and why it did "
+    "(primary, ambiguous = hybrid band sent to Face++, fallback = Face++ unavailable)",
+    ("backend", "path"),
+)
+circuit_state = metrics.gauge("circuit_breaker_state", "0 closed, 1 half-open, 2 open", ("name",))
+circuit_transitions = metrics.counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes", ("name", "state")
+)
+
+
+class BackendUnavailableError(Exception):
+    """Raised when a backend cannot verify a session right now, e.g. the remote circuit is open."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(BackendUnavailableError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class FaceppResponseError(Exception):
+    """Raised when Face++ answers with an error."""
+
+    def __init__(self, label: str, status_code: int, text: str):
+        super().__init__(f"{label}: {text}")
+        self.status_code = status_code
+        self.overloaded = CONCURRENCY_ERROR in text
+
+
+def facepp_unavailable(error: BaseException) -> bool:
+    """
+    Whether a Face++ error means the service cannot be used right now.
+
+    Only an open circuit, overload and transport errors (timeouts, refused
+    connections) qualify. Answers such as bad requests or rejected
+    credentials are real errors that must not be bypassed by falling back to
+    local verification.
+    """
+    if isinstance(error, FaceppResponseError):
+        return error.overloaded
+    return isinstance(error, (BackendUnavailableError, FaceppBusyError, httpx.TransportError))
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast for ``reset_timeout`` seconds. It then half-opens: the
+    next result closes it again on success or reopens it on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            name: Upstream name used in metrics
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = "closed"
+        circuit_state.set(0, name)
+
+    @property
+    def state(self) -> str:
+        if self._state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._transition("half_open")
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        if state != self._state:
+            self._state = state
+            circuit_state.set(CIRCUIT_STATES[state], self.name)
+            circuit_transitions.inc(self.name, state)
+
+    def retry_after(self) -> int:
+        """Seconds until the circuit half-opens."""
+        return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at)) + 1)
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._transition("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition("open")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "state": self.state, "consecutive_failures": self.failures}
+
+
+class VerificationBackend:
+    """
+    Interface for KYC face verification.
+
+    ``enroll`` finds the face on the identity document and returns what has
+    to be kept with the session to verify selfies against it later;
+    ``verify`` compares a selfie with the enrolled document face.
+    """
+
+    name = ""
+
+    async def enroll(self, image: bytes) -> Dict[str, Any]:
+        """
+        Find the document face.
+
+        Returns:
+            Dict with ``session`` (fields stored with the session), ``debug``
+            (raw responses by name) and optionally ``session_id``
+
+        Raises:
+            FaceNotFoundError: If the document has no face
+        """
+        raise NotImplementedError
+
+    async def verify(self, image: bytes, session: Dict[str, Any], detect_first: bool = False) -> Dict[str, Any]:
+        """
+        Compare a selfie with the enrolled document face.
+
+        Args:
+            image: Selfie image
+            session: Session record created from ``enroll``
+            detect_first: Detect the selfie separately to return landmarks (remote only)
+
+        Returns:
+            Dict with verified, confidence (0-100, higher is more similar),
+            threshold, backend and backend-specific details
+
+        Raises:
+            FaceNotFoundError: If the selfie has no face
+            BackendUnavailableError: If this backend cannot verify the session now
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class LocalBackend(VerificationBackend):
+    """Verification with dlib encodings computed in the worker pool."""
+
+    name = "local"
+
+    def __init__(self, threshold: float = 0.5):
+        """
+        Args:
+            threshold: Encoding distance at or below which faces match
+        """
+        self.threshold = threshold
+
+    async def encode(self, image: bytes, label: str) -> Any:
+        _, encodings, _ = await get_faces(image)
+        if not len(encodings):
+            raise FaceNotFoundError(f"No face found in {label}")
+        return encodings[0]
+
+    async def enroll(self, image: bytes) -> Dict[str, Any]:
+        with stage("local_encode"):
+            encoding = await self.encode(image, "document")
+        return {"session": {"document_encoding": encoding.tolist()}, "debug": {}}
+
+    async def distance(self, image: bytes, session: Dict[str, Any]) -> float:
+        """Encoding distance between the selfie and the enrolled document face."""
+        if session.get("document_encoding") is None:
+            raise BackendUnavailableError("Session has no local document encoding")
+        with stage("local_verify"):
+            encoding = await self.encode(image, "selfie")
+        return face_distance(encoding, session["document_encoding"])
+
+    def result(self, distance: float, threshold: float) -> Dict[str, Any]:
+        return {
+            "verified": distance <= threshold,
+            "confidence": round(100 * (1 - distance), 2),
+            "threshold": round(100 * (1 - threshold), 2),
+            "distance": distance,
+            "distance_threshold": threshold,
+            "backend": self.name,
+        }
+
+    async def verify(self, image: bytes, session: Dict[str, Any], detect_first: bool = False) -> Dict[str, Any]:
+        result = self.result(await self.distance(image, session), self.threshold)
+        verifications.inc(self.name, "primary")
+        return result
+
+
+class FaceppBackend(VerificationBackend):
+    """
+    Verification with the Face++ detect and compare APIs.
+
+    Calls go through a circuit breaker: timeouts, connection errors, 5xx
+    answers and persistent concurrency errors count as failures, and while
+    the circuit is open calls fail fast with CircuitOpenError.
+    """
+
+    name = "remote"
+
+    def __init__(self, client: FaceppClient, base_url: str, breaker: Optional[CircuitBreaker] = None):
+        self.client = client
+        self.detect_url = f"{base_url}/facepp/v3/detect"
+        self.compare_url = f"{base_url}/facepp/v3/compare"
+        self.breaker = breaker or CircuitBreaker("facepp")
+        # Retries and double submits of the same image share one detect call
+        self.detect_flight = SingleFlight("facepp_detect")
+
+    async def call(self, fn: Callable[[], Awaitable[httpx.Response]], label: str) -> Dict[str, Any]:
+        """
+        Make a Face++ call through the circuit breaker.
+
+        Returns:
+            The decoded response
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            FaceppResponseError: If Face++ answers with an error
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Face++ circuit is open", retry_after=self.breaker.retry_after())
+        try:
+            resp = await fn()
+        except (httpx.HTTPError, FaceppBusyError):
+            self.breaker.record_failure()
+            raise
+        if resp.status_code == 200:
+            self.breaker.record_success()
+            return resp.json()
+        error = FaceppResponseError(label, resp.status_code, resp.text)
+        if error.overloaded or resp.status_code >= 500:
+            self.breaker.record_failure()
+        raise error
+
+    async def detect(self, image: bytes) -> Dict[str, Any]:
+        """
+        Detect faces with Face++ (more accurate model, landmarks for debugging).
+
+        Concurrent calls for the same image share one request.
+        """
+        async def detect():
+            return await self.call(lambda: self.client.detect(
+                self.detect_url,
+                image,
+                return_landmark=1,
+                return_attributes='none',
+                model='detection_02',
+            ), "Face++ error")
+        with stage("facepp_detect"):
+            return await self.detect_flight.do(content_key(image, model='detection_02', return_landmark=1), detect)
+
+    async def enroll(self, image: bytes) -> Dict[str, Any]:
+        data = await self.detect(image)
+        faces = data.get('faces', [])
+        if not faces:
+            raise FaceNotFoundError("No face found in document")
+        face_token = faces[0]['face_token']
+        return {
+            "session_id": face_token,
+            "session": {"document_face_token": face_token},
+            "debug": {"document_detect_response": data},  # Full detect response for debugging
+        }
+
+    async def verify(self, image: bytes, session: Dict[str, Any], detect_first: bool = False) -> Dict[str, Any]:
+        document_face_token = session.get("document_face_token")
+        if document_face_token is None:
+            raise BackendUnavailableError("Session has no Face++ document face token")
+        detect_data = None
+        if detect_first:
+            # Detect face in selfie to get face_token (use more accurate model)
+            detect_data = await self.detect(image)
+            faces = detect_data.get('faces', [])
+            if not faces:
+                raise FaceNotFoundError("No face found in selfie")
+            selfie_face_token = faces[0]['face_token']
+
+            # Compare document and selfie face_token
+            with stage("facepp_compare"):
+                result = await self.call(lambda: self.client.compare(
+                    self.compare_url,
+                    face_token1=document_face_token,
+                    face_token2=selfie_face_token
+                ), "Face++ compare error")
+        else:
+            # Fast path: compare the stored document face_token against the raw selfie
+            with stage("facepp_compare"):
+                result = await self.call(lambda: self.client.compare(
+                    self.compare_url,
+                    files={'image_file2': image},
+                    face_token1=document_face_token
+                ), "Face++ compare error")
+            faces = result.get('faces2', [])
+            if not faces:
+                raise FaceNotFoundError("No face found in selfie")
+            selfie_face_token = faces[0]['face_token']
+
+        confidence = result.get('confidence', 0)
+        response = {
+            "verified": confidence >= FACEPP_MATCH_THRESHOLD,
+            "confidence": confidence,
+            "threshold": FACEPP_MATCH_THRESHOLD,
+            "backend": self.name,
+            "selfie_face_token": selfie_face_token,
+            "compare_debug": result,  # Full compare response for debugging
+        }
+        if detect_data is not None:
+            response["detect_debug"] = detect_data  # Includes selfie landmarks
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "circuit": self.breaker.stats()}
+
+
+class HybridBackend(VerificationBackend):
+    """
+    Local and Face++ verification combined.
+
+    Documents are enrolled with both backends at once; a failed local
+    enrollment is logged and the session is verified by Face++ alone. With
+    ``local_first`` a selfie is decided locally unless its encoding distance
+    falls in the ambiguous band between ``accept_distance`` and
+    ``reject_distance``, and only those go to Face++. Otherwise Face++
+    decides every selfie. Either way, when Face++ is unavailable (circuit
+    open, overloaded, unreachable) the local result with ``local.threshold``
+    is used instead.
+    """
+
+    def __init__(self, local: LocalBackend, remote: FaceppBackend, local_first: bool = True,
+                 accept_distance: float = 0.4, reject_distance: float = 0.6):
+        self.local = local
+        self.remote = remote
+        self.local_first = local_first
+        self.accept_distance = accept_distance
+        self.reject_distance = reject_distance
+        self.name = "hybrid" if local_first else "remote"
+
+    async def enroll(self, image: bytes) -> Dict[str, Any]:
+        local, remote = await asyncio.gather(
+            self.local.enroll(image), self.remote.enroll(image), return_exceptions=True
+        )
+        if isinstance(remote, BaseException) and facepp_unavailable(remote):
+            # Face++ is unavailable: enroll for local verification only
+            if isinstance(local, BaseException):
+                raise remote
+            return {**local, "session_id": uuid.uuid4().hex}
+        if isinstance(remote, BaseException):
+            raise remote
+        if isinstance(local, BaseException):
+            # Face++ accepted the document, so selfies can still be verified remotely
+            if not isinstance(local, FaceNotFoundError):
+                logger.warning("Local enrollment failed, session is verified by Face++ only: %r", local)
+            return remote
+        return {**remote, "session": {**remote["session"], **local["session"]}}
+
+    async def remote_or_fallback(self, image: bytes, session: Dict[str, Any], detect_first: bool,
+                                 path: str, distance: Optional[float] = None) -> Dict[str, Any]:
+        try:
+            result = await self.remote.verify(image, session, detect_first)
+        except (BackendUnavailableError, FaceppResponseError, FaceppBusyError, httpx.HTTPError) as e:
+            if not facepp_unavailable(e) or session.get("document_encoding") is None:
+                raise
+            if distance is None:
+                distance = await self.local.distance(image, session)
+            result = self.local.result(distance, self.local.threshold)
+            result["fallback_reason"] = str(e) or type(e).__name__
+            verifications.inc("local", "fallback")
+            return result
+        if distance is not None:
+            result["local_distance"] = distance
+        verifications.inc("remote", path)
+        return result
+
+    async def verify(self, image: bytes, session: Dict[str, Any], detect_first: bool = False) -> Dict[str, Any]:
+        if not self.local_first or detect_first or session.get("document_encoding") is None:
+            return await self.remote_or_fallback(image, session, detect_first, "primary")
+        try:
+            distance = await self.local.distance(image, session)
+        except FaceNotFoundError:
+            if session.get("document_face_token") is None:
+                raise
+            # Face++ may find the face dlib missed
+            return await self.remote_or_fallback(image, session, detect_first, "ambiguous")
+        if distance <= self.accept_distance or distance > self.reject_distance \
+                or session.get("document_face_token") is None:
+            result = self.local.result(distance, self.local.threshold)
+            verifications.inc("local", "primary")
+            return result
+        return await self.remote_or_fallback(image, session, detect_first, "ambiguous", distance)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "local_first": self.local_first,
+            "accept_distance": self.accept_distance,
+            "reject_distance": self.reject_distance,
+            "local_threshold": self.local.threshold,
+            "circuit": self.remote.breaker.stats(),
+        }
+
+
+def create_verification_backend(client: FaceppClient) -> VerificationBackend:
+    """Build the verification backend selected by KYC_VERIFICATION_BACKEND."""
+    backend = settings.KYC_VERIFICATION_BACKEND
+    if backend not in VERIFICATION_BACKENDS:
+        raise ValueError(f"Unknown KYC_VERIFICATION_BACKEND: {backend}")
+    local = LocalBackend(threshold=settings.KYC_LOCAL_THRESHOLD)
+    if backend == "local":
+        return local
+    remote = FaceppBackend(
+        client,
+        settings.FACEPP_BASE_URL,
+        CircuitBreaker("facepp", settings.FACEPP_BREAKER_FAILURES, settings.FACEPP_BREAKER_RESET),
+    )
+    if backend == "remote" and not settings.KYC_LOCAL_FALLBACK:
+        return remote
+    return HybridBackend(
+        local,
+        remote,
+        local_first=backend == "hybrid",
+        accept_distance=settings.KYC_HYBRID_ACCEPT_DISTANCE,
+        reject_distance=settings.KYC_HYBRID_REJECT_DISTANCE,
+    )
@@ -0,0 +1,291 @@
+"""
+Production entry point: pre-fork uvicorn workers sharing preloaded models.
+
+The master process imports OpenCV/numpy and loads the models from the model
+registry (the Haar cascade and the face_recognition/dlib models), freezes
+the garbage collector so those objects are never written to again, binds
+the listening socket and forks the workers. Workers (and the process pools
+they start, which are forked from them) share the model pages copy-on-write
+instead of loading a copy each. The application itself is imported in each
+worker after the fork, so per-process state (session store connections,
+the Face++ HTTP client, the worker pool) is never shared. State that only
+works within one process is checked up front: with several workers the
+session store defaults to SQLite, and artifact references and the
+enrollment index are refused.
+
+CPU is budgeted per worker: every worker gets ``cores / workers`` pool
+processes, and OpenCV/BLAS/OpenMP threads are capped so workers times pool
+processes times threads does not exceed the core count. The master restarts
+workers that die and periodically logs the RSS/PSS of every worker and its
+pool processes, for sizing instances.
+
+    python -m face_detection.serve --host 0.0.0.0 --port 8000 --workers 4
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+APP = "face_detection.api.main:app"
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+logger = logging.getLogger("face_detection.serve")
+
+
+def cpu_budget(cores: int, workers: int, pool_processes: int = 0, threads: int = 0) -> Dict[str, int]:
+    """
+    Split the cores between server workers, their pool processes and threads.
+
+    Args:
+        cores: Cores available to this instance
+        workers: Server worker processes
+        pool_processes: Pool processes per worker (0 = cores / workers)
+        threads: OpenCV/BLAS threads per process (0 = whatever is left per process)
+
+    Returns:
+        Dict with pool_processes and threads per process
+    """
+    pool_processes = pool_processes or max(1, cores // workers)
+    threads = threads or max(1, cores // (workers * pool_processes))
+    return {"pool_processes": pool_processes, "threads": threads}
+
+
+def apply_thread_budget(threads: int, pool_processes: int) -> None:
+    """
+    Cap native thread pools; must run before numpy or OpenCV are imported.
+
+    Values already set in the environment are kept.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+    os.environ.setdefault("WORKER_PROCESSES", str(pool_processes))
+
+
+def shared_state_errors(workers: int) -> List[str]:
+    """
+    Settings that keep state in one process and so break with several workers.
+
+    With more than one worker the session store defaults to SQLite, since a
+    selfie upload may reach a different worker than its document upload.
+    Must run before the settings are first imported.
+
+    Returns:
+        A description of every conflicting setting
+    """
+    os.environ["SERVER_WORKERS"] = str(workers)
+    if workers > 1:
+        os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    from .core.config import settings
+
+    errors = []
+    if workers > 1 and settings.SESSION_BACKEND == "memory":
+        errors.append("SESSION_BACKEND=memory keeps KYC sessions per worker; use sqlite or --workers 1")
+    if workers > 1 and settings.KYC_DUPLICATE_CHECK:
+        errors.append("KYC_DUPLICATE_CHECK uses a per-worker enrollment index; disable it or use --workers 1")
+    return errors
+
+
+def preload_models(names: List[str]) -> None:
+    """Load models in the master so forked workers share them."""
+    from .core.models import models
+
+    for name in names:
+        start = time.perf_counter()
+        try:
+            models.get(name)
+        except Exception as e:
+            # Workers will try again lazily and report the failure on /ready
+            logger.warning("Could not preload %s: %s", name, e)
+            continue
+        logger.info("Preloaded %s in %.0f ms", name, (time.perf_counter() - start) * 1000)
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of a process (Linux), e.g. a worker's pool processes."""
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def format_memory(usage: Optional[Dict[str, int]]) -> str:
+    if not usage:
+        return "n/a"
+    return " ".join(f"{kind} {value / 2 ** 20:.1f}MB" for kind, value in usage.items())
+
+
+def run_worker(sock: socket.socket, threads: int, args: argparse.Namespace) -> None:
+    """Body of a forked worker: serve the app on the shared socket until told to stop."""
+    import cv2
+    import uvicorn
+
+    # Own process group, inherited by the pool processes, so the master can
+    # clean up after a worker that died without stopping its pool
+    os.setpgid(0, 0)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    cv2.setNumThreads(threads)
+    config = uvicorn.Config(
+        APP,
+        log_level=args.log_level,
+        timeout_keep_alive=args.keep_alive,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    """Forks the workers, restarts the ones that die and reports their memory."""
+
+    def __init__(self, sock: socket.socket, workers: int, threads: int, args: argparse.Namespace):
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.args = args
+        self.pids: Dict[int, int] = {}  # pid -> worker number
+        self.stopping = False
+
+    def spawn(self, number: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, self.threads, self.args)
+            except BaseException:
+                logger.exception("Worker %d crashed", number)
+                code = 1
+            finally:
+                os._exit(code)
+        self.pids[pid] = number
+        logger.info("Started worker %d (pid %d)", number, pid)
+
+    def stop(self, signum: int, frame: object) -> None:
+        self.stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report_memory(self) -> None:
+        from .core.metrics import process_memory
+
+        total_pss = 0
+        lines = [f"master pid {os.getpid()}: {format_memory(process_memory(os.getpid()))}"]
+        for pid, number in sorted(self.pids.items(), key=lambda item: item[1]):
+            usage = process_memory(pid)
+            total_pss += (usage or {}).get("pss", 0)
+            line = f"worker {number} pid {pid}: {format_memory(usage)}"
+            for child in child_pids(pid):
+                child_usage = process_memory(child)
+                total_pss += (child_usage or {}).get("pss", 0)
+                line += f"\n    pool pid {child}: {format_memory(child_usage)}"
+            lines.append(line)
+        lines.append(f"total worker PSS {total_pss / 2 ** 20:.1f}MB")
+        logger.info("Memory per process:\n  %s", "\n  ".join(lines))
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for number in range(self.workers):
+            self.spawn(number)
+        next_report = time.monotonic() + self.args.memory_report_interval
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                number = self.pids.pop(pid, None)
+                if number is None:
+                    continue
+                try:
+                    os.killpg(pid, signal.SIGKILL)  # orphaned pool processes
+                except (ProcessLookupError, PermissionError):
+                    pass
+                if not self.stopping:
+                    logger.warning("Worker %d (pid %d) exited with status %d, restarting",
+                                   number, pid, os.waitstatus_to_exitcode(status))
+                    time.sleep(1)  # do not spin if workers die at startup
+                    self.spawn(number)
+                continue
+            if self.args.memory_report_interval and time.monotonic() >= next_report:
+                self.report_memory()
+                next_report = time.monotonic() + self.args.memory_report_interval
+            time.sleep(0.2)
+        logger.info("All workers stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")),
+                        help="Server worker processes (default: WEB_CONCURRENCY, or one per core)")
+    parser.add_argument("--pool-processes", type=int, default=0,
+                        help="Image worker pool processes per server worker (default: cores / workers)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="OpenCV/BLAS threads per process (default: what is left of the cores)")
+    parser.add_argument("--preload", default="haar_cascade,face_recognition,shape_predictor,face_encoder",
+                        help="Comma-separated models to load before forking")
+    parser.add_argument("--memory-report-interval", type=float, default=60.0,
+                        help="Seconds between per-worker memory reports (0 disables)")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Keep-alive timeout in seconds")
+    parser.add_argument("--forwarded-allow-ips", default="127.0.0.1")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    workers = args.workers or cores
+    for error in shared_state_errors(workers):
+        parser.error(error)
+    budget = cpu_budget(cores, workers, args.pool_processes, args.threads)
+    apply_thread_budget(budget["threads"], budget["pool_processes"])
+    logger.info("%d cores: %d workers x %d pool processes, %d thread(s) per process",
+                cores, workers, budget["pool_processes"], budget["threads"])
+
+    # Only now import OpenCV/numpy, with the thread limits in place
+    import cv2
+    cv2.setNumThreads(budget["threads"])
+    preload_models([name.strip() for name in args.preload.split(",") if name.strip()])
+
+    sock = bind_socket(args.host, args.port)
+    # Move everything loaded so far out of the collector's reach: collections
+    # would otherwise touch (and so copy) the shared pages in every worker
+    gc.collect()
+    gc.freeze()
+    logger.info("Listening on %s:%d", args.host, args.port)
+    Master(sock, workers, budget["threads"], args).run()
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Local stand-in for the Face++ detect and compare endpoints.
+
+Lets the KYC flow be exercised and load-tested without Face++ credentials or
+quota. Responses have the same shape as Face++ v3; face tokens are derived
+from the image bytes, so the same image always yields the same token.
+Latency follows a configurable distribution, and CONCURRENCY_LIMIT_EXCEEDED
+errors can be injected at random and/or above a concurrency cap, like the
+real free tier.
+
+    python facepp_mock.py --port 9000 --latency lognormal --latency-ms 300 --max-concurrency 10
+    FACEPP_BASE_URL=http://localhost:9000 FACEPP_API_KEY=mock FACEPP_API_SECRET=mock python run.py
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Form, File, UploadFile
+from fastapi.responses import JSONResponse
+import uvicorn
+
+CONCURRENCY_ERROR = "CONCURRENCY_LIMIT_EXCEEDED"
+
+
+class MockConfig:
+    """Behaviour of the mock; defaults can be set through FACEPP_MOCK_* environment variables."""
+
+    def __init__(self):
+        self.latency = os.getenv("FACEPP_MOCK_LATENCY", "lognormal")  # fixed, uniform, normal or lognormal
+        self.latency_ms = float(os.getenv("FACEPP_MOCK_LATENCY_MS", "250"))
+        self.latency_sigma = float(os.getenv("FACEPP_MOCK_LATENCY_SIGMA", "0.35"))
+        self.error_rate = float(os.getenv("FACEPP_MOCK_ERROR_RATE", "0"))
+        self.max_concurrency = int(os.getenv("FACEPP_MOCK_MAX_CONCURRENCY", "0"))  # 0 = unlimited
+        self.confidence = float(os.getenv("FACEPP_MOCK_CONFIDENCE", "92.5"))
+        self.no_face_rate = float(os.getenv("FACEPP_MOCK_NO_FACE_RATE", "0"))
+        self.seed = int(os.getenv("FACEPP_MOCK_SEED", "0"))
+
+
+config = MockConfig()
+rng = random.Random(config.seed)
+app = FastAPI(title="Face++ mock")
+in_flight = 0
+counters = {"detect": 0, "compare": 0, "concurrency_errors": 0}
+
+
+def sample_latency() -> float:
+    """Return one simulated service time in seconds."""
+    mean = config.latency_ms / 1000
+    if config.latency == "fixed" or mean <= 0:
+        return max(mean, 0.0)
+    if config.latency == "uniform":
+        return rng.uniform(0, 2 * mean)
+    if config.latency == "normal":
+        return max(0.0, rng.gauss(mean, mean * config.latency_sigma))
+    # lognormal with the requested mean
+    mu = math.log(mean) - config.latency_sigma ** 2 / 2
+    return rng.lognormvariate(mu, config.latency_sigma)
+
+
+def face_token(image: bytes) -> str:
+    return hashlib.sha1(image).hexdigest()
+
+
+def has_face(token: str) -> bool:
+    # Deterministic per image: the same upload always has (or lacks) a face
+    return int(token[:8], 16) / 0xFFFFFFFF >= config.no_face_rate
+
+
+def face_entry(token: str, landmarks: bool = False) -> Dict[str, Any]:
+    seed = int(token[:8], 16)
+    face = {
+        "face_token": token,
+        "face_rectangle": {"top": 80 + seed % 40, "left": 60 + seed % 30, "width": 180, "height": 180},
+    }
+    if landmarks:
+        face["landmark"] = {
+            "left_eye_center": {"x": 110, "y": 140},
+            "right_eye_center": {"x": 190, "y": 140},
+            "nose_tip": {"x": 150, "y": 185},
+            "mouth_left_corner": {"x": 120, "y": 225},
+            "mouth_right_corner": {"x": 180, "y": 225},
+        }
+    return face
+
+
+async def simulate_call(kind: str) -> Optional[JSONResponse]:
+    """Wait for the simulated service time; return an error response if one is injected."""
+    global in_flight
+    counters[kind] += 1
+    overloaded = config.max_concurrency and in_flight >= config.max_concurrency
+    if overloaded or rng.random() < config.error_rate:
+        counters["concurrency_errors"] += 1
+        await asyncio.sleep(0.005)
+        return JSONResponse(status_code=403, content={
+            "request_id": uuid.uuid4().hex,
+            "time_used": 5,
+            "error_message": CONCURRENCY_ERROR,
+        })
+    in_flight += 1
+    try:
+        await asyncio.sleep(sample_latency())
+    finally:
+        in_flight -= 1
+    return None
+
+
+@app.post("/facepp/v3/detect")
+async def detect(
+    api_key: str = Form(...),
+    api_secret: str = Form(...),
+    image_file: UploadFile = File(...),
+    return_landmark: int = Form(0),
+    return_attributes: Optional[str] = Form(None),
+    model: Optional[str] = Form(None),
+):
+    start = time.perf_counter()
+    image = await image_file.read()
+    error = await simulate_call("detect")
+    if error is not None:
+        return error
+    token = face_token(image)
+    faces = [face_entry(token, landmarks=bool(return_landmark))] if has_face(token) else []
+    return {
+        "request_id": uuid.uuid4().hex,
+        "time_used": int((time.perf_counter() - start) * 1000),
+        "image_id": hashlib.md5(image).hexdigest(),
+        "face_num": len(faces),
+        "faces": faces,
+    }
+
+
+@app.post("/facepp/v3/compare")
+async def compare(
+    api_key: str = Form(...),
+    api_secret: str = Form(...),
+    face_token1: Optional[str] = Form(None),
+    face_token2: Optional[str] = Form(None),
+    image_file1: Optional[UploadFile] = File(None),
+    image_file2: Optional[UploadFile] = File(None),
+):
+    start = time.perf_counter()
+    image1 = await image_file1.read() if image_file1 is not None else None
+    image2 = await image_file2.read() if image_file2 is not None else None
+    error = await simulate_call("compare")
+    if error is not None:
+        return error
+    token1 = face_token1 or (face_token(image1) if image1 is not None else None)
+    token2 = face_token2 or (face_token(image2) if image2 is not None else None)
+    if token1 is None or token2 is None:
+        return JSONResponse(status_code=400, content={"error_message": "MISSING_ARGUMENTS: face_token1, face_token2"})
+    result: Dict[str, Any] = {
+        "request_id": uuid.uuid4().hex,
+        "time_used": int((time.perf_counter() - start) * 1000),
+        "thresholds": {"1e-3": 62.327, "1e-4": 69.101, "1e-5": 73.975},
+    }
+    # Face++ lists the faces it found in uploaded images, none for tokens
+    if image1 is not None:
+        result["faces1"] = [face_entry(token1)] if has_face(token1) else []
+    if image2 is not None:
+        result["faces2"] = [face_entry(token2)] if has_face(token2) else []
+    if result.get("faces1") == [] or result.get("faces2") == []:
+        return result
+    result["confidence"] = config.confidence
+    return result
+
+
+@app.get("/stats")
+def stats() -> Dict[str, Any]:
+    return {**counters, "in_flight": in_flight, "config": vars(config)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "normal", "lognormal"], default=config.latency,
+                        help="Service time distribution")
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="Mean service time")
+    parser.add_argument("--latency-sigma", type=float, default=config.latency_sigma,
+                        help="Spread: log-space sigma for lognormal, relative stddev for normal")
+    parser.add_argument("--error-rate", type=float, default=config.error_rate,
+                        help="Fraction of calls answered with CONCURRENCY_LIMIT_EXCEEDED")
+    parser.add_argument("--max-concurrency", type=int, default=config.max_concurrency,
+                        help="Answer CONCURRENCY_LIMIT_EXCEEDED above this many calls in flight (0 = unlimited)")
+    parser.add_argument("--confidence", type=float, default=config.confidence, help="Compare confidence returned")
+    parser.add_argument("--no-face-rate", type=float, default=config.no_face_rate,
+                        help="Fraction of images (chosen deterministically by content) without a face")
+    parser.add_argument("--seed", type=int, default=config.seed)
+    args = parser.parse_args()
+
+    for name in ("latency", "latency_ms", "latency_sigma", "error_rate", "max_concurrency",
+                 "confidence", "no_face_rate", "seed"):
+        setattr(config, name, getattr(args, name))
+    rng.seed(config.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+End-to-end load generator for the KYC flow.
+
+Each flow uploads a document, uploads a selfie for the returned session and
+reads the session back, like a real onboarding. Flows are started open-loop
+at a target rate (so a slow server cannot slow the arrival rate down) and
+the run reports latency percentiles and error rates per step.
+
+With --ramp, the rate is stepped up until the service stops keeping up. The
+highest step whose error rate and p95 flow latency stay within the limits
+is reported as the maximum sustainable throughput.
+
+Run the API against the Face++ mock (facepp_mock.py) to load-test without
+Face++ quota:
+
+    python facepp_mock.py --port 9000 &
+    FACEPP_BASE_URL=http://localhost:9000 FACEPP_API_KEY=mock FACEPP_API_SECRET=mock python run.py &
+    python kyc_load_test.py --rps 5 --duration 30
+    python kyc_load_test.py --ramp 2,4,8,16,32 --step-duration 20 --max-error-rate 0.01 --max-p95-ms 3000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import cv2
+import httpx
+
+STEPS = ("document", "selfie", "session", "flow")
+
+
+def base_images(images_dir: Optional[str]) -> List[bytes]:
+    """Images flows are built from: files from images_dir, or one synthetic face photo."""
+    if images_dir:
+        images = []
+        for name in sorted(os.listdir(images_dir)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(images_dir, name), "rb") as f:
+                    images.append(f.read())
+        if images:
+            return images
+    from face_detection.core import FaceDetector
+    img, _ = FaceDetector.create_test_scene(640, 480, num_faces=1)
+    return [cv2.imencode(".jpg", img)[1].tobytes()]
+
+
+def unique_image(base: bytes) -> bytes:
+    """
+    Make an upload unique without re-encoding it.
+
+    Bytes after the JPEG/PNG end marker are ignored by decoders but change
+    the content hash, so every flow gets its own Face++ token and session.
+    """
+    return base + uuid.uuid4().bytes
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects per-step latencies and outcomes."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self.outcomes: Dict[str, Counter] = {step: Counter() for step in STEPS}
+        self.dropped = 0
+
+    def record(self, step: str, start: float, outcome: str) -> None:
+        self.outcomes[step][outcome] += 1
+        if outcome == "ok":
+            self.latencies[step].append((time.perf_counter() - start) * 1000)
+
+    def summary(self, elapsed: float) -> Dict:
+        steps = {}
+        for step in STEPS:
+            values = sorted(self.latencies[step])
+            total = sum(self.outcomes[step].values())
+            errors = total - self.outcomes[step]["ok"]
+            steps[step] = {
+                "requests": total,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "outcomes": dict(self.outcomes[step]),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "max_ms": round(values[-1], 1) if values else 0.0,
+            }
+        completed = self.outcomes["flow"]["ok"]
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "completed_flows": completed,
+            "throughput_flows_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+            "dropped_flows": self.dropped,
+            "steps": steps,
+        }
+
+
+async def timed_request(client: httpx.AsyncClient, recorder: Recorder, step: str, method: str,
+                        url: str, **kwargs) -> Optional[httpx.Response]:
+    start = time.perf_counter()
+    try:
+        resp = await client.request(method, url, **kwargs)
+    except httpx.TimeoutException:
+        recorder.record(step, start, "timeout")
+        return None
+    except httpx.HTTPError as e:
+        recorder.record(step, start, type(e).__name__)
+        return None
+    recorder.record(step, start, "ok" if resp.status_code == 200 else str(resp.status_code))
+    return resp if resp.status_code == 200 else None
+
+
+async def run_flow(client: httpx.AsyncClient, recorder: Recorder, api_url: str, document: bytes,
+                   selfie: bytes) -> None:
+    start = time.perf_counter()
+    resp = await timed_request(
+        client, recorder, "document", "POST", f"{api_url}/kyc/upload-document",
+        files={"document": ("document.jpg", document, "image/jpeg")},
+    )
+    if resp is None:
+        recorder.record("flow", start, "failed")
+        return
+    session_id = resp.json()["session_id"]
+    resp = await timed_request(
+        client, recorder, "selfie", "POST", f"{api_url}/kyc/upload-selfie",
+        params={"session_id": session_id},
+        files={"selfie": ("selfie.jpg", selfie, "image/jpeg")},
+    )
+    if resp is None:
+        recorder.record("flow", start, "failed")
+        return
+    resp = await timed_request(client, recorder, "session", "GET", f"{api_url}/kyc/session/{session_id}")
+    recorder.record("flow", start, "ok" if resp is not None else "failed")
+
+
+async def run_load(api_url: str, rps: float, duration: float, images: List[bytes],
+                   max_in_flight: int = 1000, timeout: float = 30.0) -> Dict:
+    """
+    Start flows at a fixed rate for ``duration`` seconds and wait for them to finish.
+
+    Args:
+        api_url: Base URL of the API, e.g. http://localhost:8000/api/v1
+        rps: Flows started per second
+        duration: Seconds to keep starting flows
+        images: Images used for documents and selfies
+        max_in_flight: Flows allowed at once; arrivals beyond it are dropped and counted
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        Run summary with per-step latency percentiles and error rates
+    """
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    tasks = set()
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        n = 0
+        while True:
+            # Schedule against the ideal arrival time so the rate does not drift
+            next_arrival = start + n / rps
+            if next_arrival - start >= duration:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            base = images[n % len(images)]
+            if len(tasks) >= max_in_flight:
+                recorder.dropped += 1
+            else:
+                task = asyncio.create_task(run_flow(client, recorder, api_url, unique_image(base), unique_image(base)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            n += 1
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - start
+    summary = recorder.summary(elapsed)
+    summary["target_rps"] = rps
+    summary["started_flows"] = n
+    return summary
+
+
+def print_summary(summary: Dict) -> None:
+    print(f"target {summary['target_rps']:.1f} flows/s: {summary['completed_flows']}/{summary['started_flows']} "
+          f"flows completed in {summary['elapsed_s']:.1f}s ({summary['throughput_flows_per_s']:.2f}/s), "
+          f"{summary['dropped_flows']} dropped")
+    print(f"  {'step':9} {'requests':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for step, s in summary["steps"].items():
+        print(f"  {step:9} {s['requests']:8d} {s['error_rate']:7.2%} {s['p50_ms']:8.0f} {s['p95_ms']:8.0f} "
+              f"{s['p99_ms']:8.0f} {s['max_ms']:8.0f}")
+        errors = {k: v for k, v in s["outcomes"].items() if k != "ok"}
+        if errors:
+            print(f"  {'':9} errors: {errors}")
+
+
+def sustainable(summary: Dict, max_error_rate: float, max_p95_ms: float) -> bool:
+    flow = summary["steps"]["flow"]
+    return (
+        flow["error_rate"] <= max_error_rate
+        and flow["p95_ms"] <= max_p95_ms
+        and summary["dropped_flows"] == 0
+        and summary["started_flows"] > 0
+    )
+
+
+async def main_async(args) -> None:
+    images = base_images(args.images)
+    results = []
+    rates = [float(r) for r in args.ramp.split(",")] if args.ramp else [args.rps]
+    duration = args.step_duration if args.ramp else args.duration
+    best = None
+    for rps in rates:
+        summary = await run_load(args.api_url, rps, duration, images, args.max_in_flight, args.timeout)
+        results.append(summary)
+        print_summary(summary)
+        if args.ramp:
+            if not sustainable(summary, args.max_error_rate, args.max_p95_ms):
+                print(f"  not sustainable (limits: {args.max_error_rate:.1%} errors, p95 {args.max_p95_ms:.0f} ms)")
+                break
+            best = summary
+    if args.ramp:
+        if best:
+            print(f"\nMax sustainable throughput: {best['throughput_flows_per_s']:.2f} flows/s "
+                  f"(target {best['target_rps']:.1f}, flow p95 {best['steps']['flow']['p95_ms']:.0f} ms)")
+        else:
+            print("\nNo step was sustainable")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"steps": results, "max_sustainable": best and best["target_rps"]}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--rps", type=float, default=2.0, help="Flows started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--ramp", help="Comma-separated rates to step through, e.g. 2,4,8,16")
+    parser.add_argument("--step-duration", type=float, default=20.0, help="Seconds per ramp step")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Sustainable limit for flow errors")
+    parser.add_argument("--max-p95-ms", type=float, default=5000.0, help="Sustainable limit for flow p95 latency")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--images", help="Directory of face photos (default: a synthetic test face)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
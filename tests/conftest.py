@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Let `pytest tests/` import the face_detection package from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
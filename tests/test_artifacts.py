@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+
+from face_detection.api.main import app
+from face_detection.core.artifacts import ArtifactStore, artifact_store
+
+
+def hand_png():
+    img = np.full((300, 400, 3), 225, np.uint8)
+    for x in (120, 200, 280):
+        cv2.rectangle(img, (x - 20, 40), (x + 20, 260), (70, 60, 55), -1)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def test_store_evicts_oldest_over_budget():
+    store = ArtifactStore(max_bytes=10)
+    first = store.put(b"12345", "image/png")
+    second = store.put(b"67890", "image/png")
+    assert store.get(first) == (b"12345", "image/png")
+    third = store.put(b"abc", "image/png")
+    assert store.get(first) is None
+    assert store.get(second) is not None and store.get(third) is not None
+
+
+def test_store_expires_entries():
+    store = ArtifactStore(ttl=-1)
+    assert store.get(store.put(b"data", "image/png")) is None
+
+
+def test_ref_artifacts_can_be_fetched():
+    client = TestClient(app)
+    response = client.post(
+        "/api/v1/fingerprint/extract-fingers",
+        params={"artifacts": "ref", "outputs": "crops", "format": "png"},
+        files={"image": ("hand.png", hand_png(), "image/png")},
+    )
+    assert response.status_code == 200
+    refs = response.json()["fingers"]
+    assert len(refs) == 3
+    for ref in refs:
+        artifact = client.get(ref["url"])
+        assert artifact.status_code == 200
+        assert artifact.headers["content-type"] == "image/png"
+
+
+def test_ref_artifacts_too_large_for_the_store(monkeypatch):
+    monkeypatch.setattr(artifact_store, "max_bytes", 100)
+    stored = artifact_store.stats()["stored"]
+    response = TestClient(app).post(
+        "/api/v1/fingerprint/extract-fingers",
+        params={"artifacts": "ref", "outputs": "crops", "format": "png"},
+        files={"image": ("hand.png", hand_png(), "image/png")},
+    )
+    assert response.status_code == 413
+    # Nothing was stored that could evict live artifacts
+    assert artifact_store.stats()["stored"] == stored
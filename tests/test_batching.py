@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from face_detection.core.batching import MicroBatcher
+from face_detection.core.executor import PoolSaturatedError
+
+
+def test_concurrent_items_share_batches():
+    batches = []
+
+    async def double(items):
+        batches.append(list(items))
+        await asyncio.sleep(0.01)
+        return [item * 2 for item in items]
+
+    async def main():
+        batcher = MicroBatcher("test_share", double, max_batch=4)
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == [i * 2 for i in range(10)]
+    assert sorted(item for batch in batches for item in batch) == list(range(10))
+    assert max(len(batch) for batch in batches) == 4
+    assert len(batches) < 10
+
+
+def test_single_item_is_dispatched_without_waiting():
+    async def identity(items):
+        return items
+
+    async def main():
+        batcher = MicroBatcher("test_idle", identity, max_batch=8)
+        try:
+            return await asyncio.wait_for(batcher.submit("x"), 1.0)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == "x"
+
+
+def test_max_wait_lets_a_batch_fill():
+    batches = []
+
+    async def identity(items):
+        batches.append(list(items))
+        return items
+
+    async def main():
+        batcher = MicroBatcher("test_wait", identity, max_batch=3, max_wait=5.0)
+        try:
+            first = asyncio.ensure_future(batcher.submit(1))
+            await asyncio.sleep(0.01)
+            # A full batch is sent without waiting out max_wait
+            return await asyncio.wait_for(asyncio.gather(first, batcher.submit(2), batcher.submit(3)), 1.0)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == [1, 2, 3]
+    assert batches == [[1, 2, 3]]
+
+
+def test_item_errors_fail_only_that_item():
+    async def check(items):
+        return [ValueError(item) if item < 0 else item for item in items]
+
+    async def main():
+        batcher = MicroBatcher("test_item_error", check, max_batch=4)
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in (1, -1, 2)), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    ok, error, ok2 = asyncio.run(main())
+    assert (ok, ok2) == (1, 2)
+    assert isinstance(error, ValueError)
+
+
+def test_batch_error_fails_every_item():
+    async def broken(items):
+        raise RuntimeError("model crashed")
+
+    async def main():
+        batcher = MicroBatcher("test_batch_error", broken, max_batch=4)
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+
+def test_full_queue_is_refused():
+    release = None
+
+    async def slow(items):
+        await release.wait()
+        return items
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        batcher = MicroBatcher("test_full", slow, max_batch=1, max_queue=2)
+        try:
+            running = [asyncio.ensure_future(batcher.submit(0))]
+            await asyncio.sleep(0.01)  # the first item is in the running batch
+            running += [asyncio.ensure_future(batcher.submit(i)) for i in (1, 2)]
+            await asyncio.sleep(0.01)  # two items wait for the busy slot
+            with pytest.raises(PoolSaturatedError):
+                await batcher.submit(3)
+            release.set()
+            return await asyncio.wait_for(asyncio.gather(*running), 1.0)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == [0, 1, 2]
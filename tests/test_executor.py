@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from face_detection.api.main import app
+from face_detection.core.config import settings
+from face_detection.core.executor import PoolSaturatedError, ProcessPool, process_pool
+
+
+def test_pool_refuses_work_beyond_backlog():
+    pool = ProcessPool(workers=2, max_queue=3, retry_after=7)
+
+    async def main():
+        # Two tasks run and three wait, which fills the pool
+        busy = [asyncio.ensure_future(pool.run(time.sleep, 0.3)) for _ in range(pool.workers + pool.max_queue)]
+        await asyncio.sleep(0.05)
+        assert pool.stats()["running"] == 2
+        assert pool.stats()["queued"] == 3
+        with pytest.raises(PoolSaturatedError) as excinfo:
+            await pool.run(time.sleep, 0)
+        assert excinfo.value.retry_after == 7
+        await asyncio.gather(*busy)
+        # Capacity comes back once the backlog drains
+        await pool.run(time.sleep, 0)
+        return pool.stats()
+
+    try:
+        stats = asyncio.run(main())
+    finally:
+        pool.shutdown()
+    assert stats["running"] == 0 and stats["queued"] == 0
+
+
+def test_saturated_pool_returns_503(monkeypatch):
+    monkeypatch.setattr(process_pool, "_pending", process_pool.workers + process_pool.max_queue)
+    image = cv2.imencode(".png", np.full((64, 64, 3), 255, np.uint8))[1].tobytes()
+    response = TestClient(app).post(
+        "/api/v1/fingerprint/extract-fingers", files={"image": ("hand.png", image, "image/png")}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.WORKER_RETRY_AFTER)
+    assert response.json() == {"detail": "Server is busy, please retry later"}
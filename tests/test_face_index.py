@@ -0,0 +1,80 @@
+import numpy as np
+
+from face_detection.core.face_index import FaceIndex
+
+
+def random_embeddings(n, dim=128, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_search_returns_nearest_first():
+    index = FaceIndex()
+    vectors = random_embeddings(50)
+    for i, vector in enumerate(vectors):
+        index.add(f"id{i}", vector)
+    matches = index.search(vectors[7], k=3)
+    assert matches[0] == ("id7", 0.0)
+    assert [d for _, d in matches] == sorted(d for _, d in matches)
+
+
+def test_remove_keeps_remaining_ids_searchable():
+    index = FaceIndex()
+    vectors = random_embeddings(10)
+    for i, vector in enumerate(vectors):
+        index.add(f"id{i}", vector)
+    assert index.remove("id3")
+    assert not index.remove("id3")
+    assert len(index) == 9
+    # The last row was moved into the freed slot
+    assert index.search(vectors[9], k=1)[0][0] == "id9"
+    assert all(face_id != "id3" for face_id, _ in index.search(vectors[3], k=9))
+
+
+def test_save_load_round_trip(tmp_path):
+    index = FaceIndex()
+    vectors = random_embeddings(20)
+    for i, vector in enumerate(vectors):
+        index.add(f"id{i}", vector)
+    index.save(str(tmp_path))
+
+    loaded = FaceIndex.load(str(tmp_path))
+    assert len(loaded) == 20
+    for i in (0, 11, 19):
+        assert loaded.search(vectors[i], k=1)[0][0] == f"id{i}"
+
+
+def test_save_after_load_into_same_directory(tmp_path):
+    # The loaded arrays are memory-mapped from the files being overwritten
+    index = FaceIndex()
+    vectors = random_embeddings(30)
+    for i, vector in enumerate(vectors[:20]):
+        index.add(f"id{i}", vector)
+    index.save(str(tmp_path))
+
+    loaded = FaceIndex.load(str(tmp_path))
+    loaded.save(str(tmp_path))
+    for i, vector in enumerate(vectors[20:], start=20):
+        loaded.add(f"id{i}", vector)
+    loaded.save(str(tmp_path))
+
+    reloaded = FaceIndex.load(str(tmp_path), mmap=False)
+    assert len(reloaded) == 30
+    for i, vector in enumerate(vectors):
+        face_id, distance = reloaded.search(vector, k=1)[0]
+        assert face_id == f"id{i}"
+        assert distance < 1e-2
+
+
+def test_partitioned_round_trip(tmp_path):
+    index = FaceIndex(ivf_threshold=200, nprobe=64)
+    vectors = random_embeddings(300)
+    for i, vector in enumerate(vectors):
+        index.add(f"id{i}", vector)
+    assert index.stats()["partitioned"]
+    index.save(str(tmp_path))
+
+    loaded = FaceIndex.load(str(tmp_path), nprobe=64)
+    assert loaded.stats()["partitioned"]
+    loaded.add("extra", vectors[0] + 0.01)
+    for i in (0, 150, 299):
+        assert loaded.search(vectors[i], k=1)[0][0] == f"id{i}"
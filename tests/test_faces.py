@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from face_detection.core import faces
+
+
+def test_batched_encoding_matches_face_recognition():
+    face_recognition = pytest.importorskip("face_recognition")
+    image = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    locations = [(40, 200, 160, 80), (20, 300, 120, 200)]
+
+    chips = faces.align(image, locations)
+    assert [chip.shape for chip in chips] == [(150, 150, 3)] * 2
+    batched = faces.encode_chips(chips)
+
+    expected = face_recognition.face_encodings(
+        image, locations, num_jitters=faces.NUM_JITTERS, model=faces.ENCODING_MODEL
+    )
+    np.testing.assert_allclose(batched, expected, atol=1e-4)
+
+
+def test_face_distance():
+    assert faces.face_distance(np.zeros(128), np.full(128, 0.5)) == pytest.approx(np.sqrt(128) * 0.5)
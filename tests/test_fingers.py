@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+import pytest
+
+from face_detection.core.fingers import ENGINES, render_artifacts, segment
+
+
+def hand(width=800, height=600):
+    """Palm with four separate fingers and a thumb, dark on a light background."""
+    img = np.full((height, width, 3), 225, np.uint8)
+    cv2.ellipse(img, (400, 430), (150, 120), 0, 0, 360, (70, 60, 55), -1)
+    for x, top in ((280, 90), (360, 50), (440, 40), (520, 80)):
+        cv2.rectangle(img, (x - 22, top), (x + 22, 290), (70, 60, 55), -1)
+    cv2.ellipse(img, (190, 350), (30, 100), -35, 0, 360, (70, 60, 55), -1)
+    return img
+
+
+def random_scene(seed, width=480, height=360):
+    """Blobs with holes, islands inside the holes and small specks."""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 220, np.uint8)
+    for _ in range(int(rng.integers(3, 10))):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        axes = (int(rng.integers(10, 90)), int(rng.integers(10, 90)))
+        angle = int(rng.integers(0, 180))
+        cv2.ellipse(img, center, axes, angle, 0, 360, (50, 50, 50), -1)
+        if rng.random() < 0.5:
+            hole = (max(axes[0] // 2, 4), max(axes[1] // 2, 4))
+            cv2.ellipse(img, center, hole, angle, 0, 360, (220, 220, 220), -1)
+            if rng.random() < 0.5:
+                cv2.circle(img, center, max(min(hole) // 2, 2), (50, 50, 50), -1)
+    for _ in range(int(rng.integers(0, 200))):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(img, center, int(rng.integers(2, 9)), (40, 40, 40), -1)
+    return img
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_hand_has_five_fingers(engine):
+    assert len(segment(hand(), engine=engine).boxes) == 5
+
+
+def test_engines_agree_on_hand():
+    img = hand()
+    assert segment(img, engine="components").boxes == segment(img, engine="contour").boxes
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_engines_agree_on_random_scenes(seed):
+    img = random_scene(seed)
+    for min_area in (50, 1000):
+        contour = segment(img, min_area, engine="contour").boxes
+        components = segment(img, min_area, engine="components").boxes
+        assert components == contour
+
+
+@pytest.mark.parametrize("seed", [None, 0, 1, 2, 3])
+def test_engines_render_identical_artifacts(seed):
+    # Line overlays near crop borders differ if edges are found on a larger region
+    img = hand(1600, 1200) if seed is None else random_scene(seed)
+    outputs = ("crops", "lines", "contour")
+    contour = render_artifacts(img, segment(img, engine="contour"), outputs, "png")
+    components = render_artifacts(img, segment(img, engine="components"), outputs, "png")
+    assert len(components["finger_lines"]) == len(contour["finger_lines"])
+    assert components == contour
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        segment(hand(), engine="fast")
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+from face_detection.core.jobs import JobQueue, QueueFullError
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(**kwargs):
+        queue = JobQueue(str(tmp_path / "jobs.db"), **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def test_claim_takes_highest_priority_then_oldest(make_queue):
+    queue = make_queue()
+    low = queue.submit("extract_fingers", {}, {"image": b"low"}, priority=0)
+    first = queue.submit("extract_fingers", {}, {"image": b"first"}, priority=5)
+    second = queue.submit("extract_fingers", {}, {"image": b"second"}, priority=5)
+    high = queue.submit("verify_faces", {"x": 1}, {"image1": b"a", "image2": b"b"}, priority=10)
+    assert queue.get(low)["queue_position"] == 3
+
+    job = queue.claim()
+    assert job["job_id"] == high
+    assert job["params"] == {"x": 1}
+    assert job["inputs"] == {"image1": b"a", "image2": b"b"}
+    assert queue.get(high)["status"] == "running"
+    assert [queue.claim()["job_id"] for _ in range(3)] == [first, second, low]
+    assert queue.claim() is None
+
+
+def test_complete_stores_result_and_artifacts(make_queue):
+    queue = make_queue()
+    job_id = queue.submit("extract_fingers", {}, {"image": b"img"})
+    queue.claim()
+    queue.complete(job_id, {"num_fingers": 2}, {"fingers": [b"f1", b"f2"], "contour_img": b"c"}, "image/jpeg")
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    metadata, artifacts, media_type = queue.result(job)
+    assert metadata == {"num_fingers": 2}
+    assert artifacts == {"fingers": [b"f1", b"f2"], "contour_img": b"c"}
+    assert media_type == "image/jpeg"
+
+
+def test_fail_and_release(make_queue):
+    queue = make_queue()
+    job_id = queue.submit("extract_fingers", {}, {"image": b"img"})
+    queue.claim()
+    queue.release(job_id)
+    job = queue.get(job_id)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    queue.claim()
+    queue.fail(job_id, "bad image")
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "bad image"
+
+
+def test_submit_refused_when_full(make_queue):
+    queue = make_queue(max_queued=2)
+    queue.submit("extract_fingers", {}, {})
+    queue.submit("extract_fingers", {}, {})
+    with pytest.raises(QueueFullError):
+        queue.submit("extract_fingers", {}, {})
+    queue.claim()
+    queue.submit("extract_fingers", {}, {})
+
+
+def test_sweep_requeues_expired_lease_then_fails(make_queue):
+    queue = make_queue(lease=0, max_attempts=2)
+    job_id = queue.submit("extract_fingers", {}, {"image": b"img"})
+
+    queue.claim()
+    time.sleep(0.01)
+    assert queue.sweep() == {"requeued": 1, "failed": 0, "expired": 0}
+    job = queue.claim()
+    assert job["job_id"] == job_id
+    assert job["inputs"] == {"image": b"img"}
+
+    time.sleep(0.01)
+    assert queue.sweep() == {"requeued": 0, "failed": 1, "expired": 0}
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+
+
+def test_sweep_leaves_live_leases_alone(make_queue):
+    queue = make_queue(lease=300)
+    job_id = queue.submit("extract_fingers", {}, {})
+    queue.claim()
+    assert queue.sweep() == {"requeued": 0, "failed": 0, "expired": 0}
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_sweep_deletes_expired_results(make_queue):
+    queue = make_queue(result_ttl=0)
+    job_id = queue.submit("extract_fingers", {}, {})
+    queue.claim()
+    queue.complete(job_id, {}, {}, "image/jpeg")
+    time.sleep(0.01)
+    assert queue.get(job_id) is None
+    assert queue.sweep()["expired"] == 1
+    assert queue.counts()["done"] == 0
+
+
+def test_queue_is_shared_between_connections(make_queue):
+    producer, worker = make_queue(), make_queue()
+    job_id = producer.submit("extract_fingers", {}, {"image": b"img"})
+    assert worker.claim()["job_id"] == job_id
+    assert producer.claim() is None
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from face_detection.core.session_store import MemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make(**kwargs):
+        if request.param == "memory":
+            store = MemorySessionStore(**kwargs)
+        else:
+            store = SQLiteSessionStore(str(tmp_path / "sessions.db"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_put_get_update(make_store):
+    store = make_store()
+    assert store.get("missing") is None
+    store.put("s1", {"document_face_token": "abc"})
+    assert store.get("s1") == {"document_face_token": "abc"}
+    assert store.update("s1", verified=True)
+    assert store.get("s1") == {"document_face_token": "abc", "verified": True}
+    assert not store.update("missing", verified=True)
+
+
+def test_delete_drops_record_and_debug(make_store):
+    store = make_store()
+    store.put("s1", {"a": 1})
+    store.put_debug("s1", "detect", {"faces": []})
+    store.delete("s1")
+    assert store.get("s1") is None
+    assert store.get_debug("s1") == {}
+
+
+def test_debug_payloads_are_kept_apart(make_store):
+    store = make_store()
+    store.put("s1", {"a": 1})
+    store.put_debug("s1", "compare_debug", {"confidence": 91.5})
+    assert store.get("s1") == {"a": 1}
+    assert store.get_debug("s1") == {"compare_debug": {"confidence": 91.5}}
+
+
+def test_debug_payloads_disabled(make_store):
+    store = make_store(store_debug=False)
+    store.put("s1", {"a": 1})
+    store.put_debug("s1", "compare_debug", {"confidence": 91.5})
+    assert store.get_debug("s1") == {}
+
+
+def test_expired_sessions_are_gone(make_store):
+    store = make_store(ttl=-1)
+    store.put("s1", {"a": 1})
+    assert store.get("s1") is None
+    assert not store.update("s1", verified=True)
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_entries=2)
+    store.put("s1", {})
+    store.put("s2", {})
+    store.get("s1")
+    store.put("s3", {})
+    assert store.get("s2") is None
+    assert store.get("s1") == {} and store.get("s3") == {}
+
+
+def test_sqlite_store_is_shared_and_swept(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    writer = SQLiteSessionStore(path, ttl=3600)
+    reader = SQLiteSessionStore(path, ttl=3600)
+    try:
+        writer.put("s1", {"a": 1})
+        assert reader.get("s1") == {"a": 1}
+        writer.ttl = -1
+        writer.put("s2", {"b": 2})
+        writer.put_debug("s2", "detect", {})
+        time.sleep(0.01)
+        assert writer.sweep() == 1
+        assert reader.get("s1") == {"a": 1}
+        assert reader.get_debug("s2") == {}
+    finally:
+        writer.close()
+        reader.close()
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from face_detection.core.ingest import content_key
+from face_detection.core.singleflight import SingleFlight
+
+
+def test_content_key_depends_on_data_and_params():
+    key = content_key(b"image", max_side=640, model="hog")
+    assert key == content_key(b"image", model="hog", max_side=640)
+    assert key != content_key(b"image", max_side=320, model="hog")
+    assert key != content_key(b"other", max_side=640, model="hog")
+
+
+def test_concurrent_calls_share_one_computation():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"faces": 1}
+
+    async def main():
+        flight = SingleFlight("test_share")
+        results = await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+        # Finished calls are forgotten, so a later call computes again
+        results.append(await flight.do("key", compute))
+        return results
+
+    results = asyncio.run(main())
+    assert calls == 2
+    assert all(result is results[0] for result in results[:5])
+
+
+def test_distinct_keys_run_separately():
+    async def main():
+        flight = SingleFlight("test_keys")
+
+        async def compute(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: compute(1)), flight.do("b", lambda: compute(2)))
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_exception_is_shared():
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("no face")
+
+    async def main():
+        flight = SingleFlight("test_error")
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        flight = SingleFlight("test_cancel")
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        follower = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "done"
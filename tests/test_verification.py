@@ -0,0 +1,223 @@
+import asyncio
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+from face_detection.core.config import settings
+from face_detection.core.facepp import FaceppBusyError, CONCURRENCY_ERROR
+from face_detection.core.faces import FaceNotFoundError
+from face_detection.core.verification import (
+    BackendUnavailableError,
+    CircuitBreaker,
+    CircuitOpenError,
+    FaceppBackend,
+    FaceppResponseError,
+    HybridBackend,
+    LocalBackend,
+    create_verification_backend,
+    facepp_unavailable,
+)
+
+DOCUMENT = np.zeros(128, dtype=np.float32)
+
+
+def selfie_at(distance):
+    """Selfie encoding at the given distance from the document encoding."""
+    encoding = np.zeros(128, dtype=np.float32)
+    encoding[0] = distance
+    return encoding
+
+
+class StubLocal(LocalBackend):
+    """Local backend returning canned encodings instead of running dlib."""
+
+    def __init__(self, encodings, threshold=0.5):
+        super().__init__(threshold)
+        self.encodings = encodings
+
+    async def encode(self, image, label):
+        encoding = self.encodings.get(image)
+        if isinstance(encoding, BaseException):
+            raise encoding
+        if encoding is None:
+            raise FaceNotFoundError(f"No face found in {label}")
+        return encoding
+
+
+class StubRemote:
+    """Face++ backend answering with a canned result or error."""
+
+    name = "remote"
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.breaker = CircuitBreaker("test_remote")
+        self.calls = 0
+
+    async def enroll(self, image):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"session_id": "token", "session": {"document_face_token": "token"}, "debug": {"detect": {}}}
+
+    async def verify(self, image, session, detect_first=False):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return dict(self.result)
+
+
+REMOTE_MATCH = {"verified": True, "confidence": 92.0, "threshold": 80, "backend": "remote"}
+SESSION = {"document_face_token": "token", "document_encoding": DOCUMENT.tolist()}
+
+
+def hybrid(distance, remote):
+    local = StubLocal({b"document": DOCUMENT, b"selfie": selfie_at(distance)})
+    return HybridBackend(local, remote, accept_distance=0.4, reject_distance=0.6)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test_open", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert 1 <= breaker.retry_after() <= 31
+
+
+def test_breaker_half_opens_after_reset_timeout():
+    breaker = CircuitBreaker("test_half_open", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    # One failed trial call reopens the circuit
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_facepp_call_records_failures_and_fails_fast():
+    remote = FaceppBackend(None, "http://facepp", CircuitBreaker("test_call", failure_threshold=2))
+    calls = 0
+
+    async def timeout():
+        nonlocal calls
+        calls += 1
+        raise httpx.ConnectTimeout("timed out")
+
+    async def bad_request():
+        return httpx.Response(400, text="INVALID_IMAGE_SIZE")
+
+    async def main():
+        # Rejected requests are the caller's fault and do not open the circuit
+        for _ in range(3):
+            with pytest.raises(FaceppResponseError):
+                await remote.call(bad_request, "detect")
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectTimeout):
+                await remote.call(timeout, "detect")
+        with pytest.raises(CircuitOpenError):
+            await remote.call(timeout, "detect")
+
+    asyncio.run(main())
+    assert calls == 2
+
+
+@pytest.mark.parametrize("error, unavailable", [
+    (CircuitOpenError("open"), True),
+    (BackendUnavailableError("no token"), True),
+    (FaceppBusyError(1), True),
+    (httpx.ConnectError("refused"), True),
+    (httpx.ReadTimeout("slow"), True),
+    (FaceppResponseError("compare", 403, CONCURRENCY_ERROR), True),
+    (FaceppResponseError("compare", 400, "INVALID_IMAGE_SIZE"), False),
+    (FaceppResponseError("compare", 401, "AUTHENTICATION_ERROR"), False),
+    (FaceppResponseError("compare", 500, "INTERNAL_ERROR"), False),
+    (ValueError("bad"), False),
+])
+def test_facepp_unavailable(error, unavailable):
+    assert facepp_unavailable(error) is unavailable
+
+
+@pytest.mark.parametrize("distance, verified", [(0.3, True), (0.7, False)])
+def test_hybrid_decides_clear_cases_locally(distance, verified):
+    remote = StubRemote(REMOTE_MATCH)
+    result = asyncio.run(hybrid(distance, remote).verify(b"selfie", SESSION))
+    assert remote.calls == 0
+    assert result["backend"] == "local"
+    assert result["verified"] is verified
+    assert result["distance"] == pytest.approx(distance)
+
+
+def test_hybrid_sends_ambiguous_band_to_facepp():
+    remote = StubRemote(REMOTE_MATCH)
+    result = asyncio.run(hybrid(0.5, remote).verify(b"selfie", SESSION))
+    assert remote.calls == 1
+    assert result["backend"] == "remote"
+    assert result["local_distance"] == pytest.approx(0.5)
+
+
+def test_hybrid_falls_back_when_facepp_is_unavailable():
+    remote = StubRemote(error=CircuitOpenError("Face++ circuit is open"))
+    result = asyncio.run(hybrid(0.45, remote).verify(b"selfie", SESSION))
+    assert result["backend"] == "local"
+    assert result["verified"] is True
+    assert result["fallback_reason"] == "Face++ circuit is open"
+
+
+def test_hybrid_does_not_bypass_facepp_errors():
+    remote = StubRemote(error=FaceppResponseError("compare", 401, "AUTHENTICATION_ERROR"))
+    with pytest.raises(FaceppResponseError):
+        asyncio.run(hybrid(0.5, remote).verify(b"selfie", SESSION))
+
+
+def test_remote_first_without_local_encoding_reports_unavailable():
+    remote = StubRemote(error=CircuitOpenError("Face++ circuit is open"))
+    backend = HybridBackend(StubLocal({}), remote, local_first=False)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(backend.verify(b"selfie", {"document_face_token": "token"}))
+
+
+def test_enroll_ignores_local_failure():
+    backend = HybridBackend(StubLocal({b"document": RuntimeError("dlib missing")}), StubRemote(REMOTE_MATCH))
+    enrollment = asyncio.run(backend.enroll(b"document"))
+    assert enrollment["session"] == {"document_face_token": "token"}
+    assert enrollment["session_id"] == "token"
+
+
+def test_enroll_locally_only_when_facepp_is_unavailable():
+    backend = HybridBackend(StubLocal({b"document": DOCUMENT}), StubRemote(error=httpx.ConnectError("refused")))
+    enrollment = asyncio.run(backend.enroll(b"document"))
+    assert enrollment["session"] == {"document_encoding": DOCUMENT.tolist()}
+    assert enrollment["session_id"] != "token"
+
+    backend.remote = StubRemote(error=FaceppResponseError("detect", 400, "INVALID_IMAGE_SIZE"))
+    with pytest.raises(FaceppResponseError):
+        asyncio.run(backend.enroll(b"document"))
+
+
+def test_enroll_combines_both_sessions():
+    backend = HybridBackend(StubLocal({b"document": DOCUMENT}), StubRemote(REMOTE_MATCH))
+    enrollment = asyncio.run(backend.enroll(b"document"))
+    assert enrollment["session"] == SESSION
+
+
+def test_remote_backend_has_no_local_fallback_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "KYC_VERIFICATION_BACKEND", "remote")
+    assert isinstance(create_verification_backend(None), FaceppBackend)
+    monkeypatch.setattr(settings, "KYC_LOCAL_FALLBACK", True)
+    backend = create_verification_backend(None)
+    assert isinstance(backend, HybridBackend)
+    assert not backend.local_first